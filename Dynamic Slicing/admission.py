@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Modello di capacità dei link e admission control degli slice su richiesta.
+
+Ogni link dello switch è modellato per verso (full-duplex): una richiesta
+src -> dst con banda garantita viene accettata solo se esiste un percorso in
+cui ogni link ha ancora almeno quella banda riservabile. La ricerca è una BFS
+che scarta i link saturi, quindi O(switch + link): una richiesta non
+soddisfacibile viene rifiutata appena la BFS esaurisce i link utilizzabili.
+
+Eseguito come script misura il tempo di ammissione/rifiuto su richieste casuali:
+
+    python3 admission.py [numero_richieste]
+"""
+import math
+import random
+import sys
+import time
+from collections import deque, namedtuple
+
+# stessa topologia di topology.py: (switch, porta) <-> (switch, porta), banda in bps
+LINKS = [
+    ((1, 3), (2, 1), 10_000_000),  # s1 - s2 (slice superiore)
+    ((2, 2), (4, 1), 10_000_000),  # s2 - s4
+    ((1, 4), (3, 1), 1_000_000),   # s1 - s3 (slice inferiore)
+    ((3, 2), (4, 2), 1_000_000),   # s3 - s4
+]
+
+# host -> (ip, switch, porta); i link verso gli host non hanno limite di banda
+HOSTS = {
+    'h1': ('10.0.0.1', 1, 1),
+    'h2': ('10.0.0.2', 1, 2),
+    'h3': ('10.0.0.3', 4, 3),
+    'h4': ('10.0.0.4', 4, 4),
+}
+
+# quota di ogni link riservabile: il resto resta al traffico senza prenotazione
+RESERVABLE_SHARE = 0.8
+# banda minima prenotabile: il meter all'ingresso lavora in kbps
+MIN_RATE_BPS = 1000
+
+# percorso: lista di (dpid, porta di ingresso, porta di uscita)
+Reservation = namedtuple('Reservation', ['id', 'src', 'dst', 'rate_bps', 'path'])
+
+
+class AdmissionError(Exception):
+    pass
+
+
+class CapacityModel(object):
+    """Banda riservabile e prenotazioni attive su ogni link (per verso)"""
+
+    def __init__(self, links=LINKS, hosts=HOSTS, share=RESERVABLE_SHARE):
+        self.hosts = hosts
+        self.capacity = {}   # (dpid, porta di uscita) -> bps riservabili
+        self.peer = {}       # (dpid, porta di uscita) -> (dpid, porta di ingresso)
+        self.adjacent = {}   # dpid -> porte di uscita verso altri switch
+        self.reserved = {}   # (dpid, porta di uscita) -> bps già riservati
+        self.reservations = {}
+        self.pairs = {}      # (src, dst) -> id della prenotazione attiva
+        self._next_id = 1
+        for a, b, bw in links:
+            for out, into in ((a, b), (b, a)):
+                self.capacity[out] = bw * share
+                self.peer[out] = into
+                self.reserved[out] = 0
+                self.adjacent.setdefault(out[0], []).append(out[1])
+
+    def residual(self, dpid, port):
+        return self.capacity[(dpid, port)] - self.reserved[(dpid, port)]
+
+    def find_path(self, src, dst, rate_bps):
+        """Percorso con meno salti in cui ogni link ha `rate_bps` liberi, None se non esiste"""
+        _, src_dpid, src_port = self.hosts[src]
+        _, dst_dpid, dst_port = self.hosts[dst]
+        # BFS sugli switch: prev[dpid] = (switch precedente, sua porta di uscita, porta di ingresso)
+        prev = {src_dpid: None}
+        queue = deque([src_dpid])
+        while queue and dst_dpid not in prev:
+            dpid = queue.popleft()
+            for port in self.adjacent.get(dpid, ()):
+                if self.residual(dpid, port) < rate_bps:
+                    continue
+                next_dpid, in_port = self.peer[(dpid, port)]
+                if next_dpid not in prev:
+                    prev[next_dpid] = (dpid, port, in_port)
+                    queue.append(next_dpid)
+        if dst_dpid not in prev:
+            return None
+
+        path, dpid, out_port = [], dst_dpid, dst_port
+        while prev[dpid] is not None:
+            prev_dpid, prev_out, in_port = prev[dpid]
+            path.append((dpid, in_port, out_port))
+            dpid, out_port = prev_dpid, prev_out
+        path.append((src_dpid, src_port, out_port))
+        path.reverse()
+        return path
+
+    def reserve(self, src, dst, rate_bps):
+        """Riserva `rate_bps` da src a dst; AdmissionError se la capacità non basta.
+
+        Le regole di una prenotazione sono identificate dalla coppia di IP: per
+        ogni coppia src -> dst può esserci una sola prenotazione attiva.
+        """
+        for host in (src, dst):
+            if host not in self.hosts:
+                raise ValueError(f"Host sconosciuto: {host}")
+        if src == dst or not math.isfinite(rate_bps) or rate_bps <= 0:
+            raise ValueError("Richiesta non valida")
+        if rate_bps < MIN_RATE_BPS:
+            raise ValueError(f"Banda minima prenotabile: {MIN_RATE_BPS / 1000:.0f} kbps")
+        if (src, dst) in self.pairs:
+            raise AdmissionError(f"Esiste già la prenotazione {self.pairs[(src, dst)]} da {src} a {dst}")
+        path = self.find_path(src, dst, rate_bps)
+        if path is None:
+            raise AdmissionError(f"Banda insufficiente per {rate_bps / 1e6:.2f} Mbps da {src} a {dst}")
+        for dpid, _, out_port in path[:-1]:
+            self.reserved[(dpid, out_port)] += rate_bps
+        reservation = Reservation(self._next_id, src, dst, rate_bps, path)
+        self.reservations[reservation.id] = reservation
+        self.pairs[(src, dst)] = reservation.id
+        self._next_id += 1
+        return reservation
+
+    def restore(self, data):
+        """Ripristina le prenotazioni salvate con pack_reservations"""
+        for reservation_id, src, dst, rate_bps, path in data:
+            path = [tuple(hop) for hop in path]
+            for dpid, _, out_port in path[:-1]:
+                self.reserved[(dpid, out_port)] += rate_bps
+            self.reservations[reservation_id] = Reservation(reservation_id, src, dst, rate_bps, path)
+            self.pairs[(src, dst)] = reservation_id
+            self._next_id = max(self._next_id, reservation_id + 1)
+
+    def release(self, reservation_id):
+        """Libera una prenotazione; KeyError se non esiste"""
+        reservation = self.reservations.pop(reservation_id)
+        del self.pairs[(reservation.src, reservation.dst)]
+        for dpid, _, out_port in reservation.path[:-1]:
+            self.reserved[(dpid, out_port)] -= reservation.rate_bps
+        return reservation
+
+
+def pack_reservations(reservations):
+    """Prenotazioni in forma serializzabile in JSON (per lo snapshot del controller)"""
+    return [[r.id, r.src, r.dst, r.rate_bps, [list(hop) for hop in r.path]]
+            for r in reservations.values()]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rnd = random.Random(1)
+    model = CapacityModel()
+    hosts = sorted(HOSTS)
+    accepted, rejected = [], []
+    for _ in range(n):
+        src, dst = rnd.sample(hosts, 2)
+        rate = rnd.choice((500_000, 1_000_000, 2_000_000, 4_000_000))
+        if (src, dst) in model.pairs:
+            # una sola prenotazione per coppia: la nuova sostituisce la vecchia
+            model.release(model.pairs[(src, dst)])
+        start = time.perf_counter()
+        try:
+            r = model.reserve(src, dst, rate)
+            accepted.append(time.perf_counter() - start)
+        except AdmissionError:
+            rejected.append(time.perf_counter() - start)
+            continue
+        if rnd.random() < 0.3 and model.reservations:
+            model.release(rnd.choice(list(model.reservations)))
+    for name, times in (('accettate', accepted), ('rifiutate', rejected)):
+        if times:
+            times.sort()
+            print(f"{name:<10} {len(times):>7}  media {sum(times) / len(times) * 1e6:7.1f} us  "
+                  f"p99 {times[int(len(times) * 0.99)] * 1e6:7.1f} us")
+
+
+if __name__ == '__main__':
+    main()
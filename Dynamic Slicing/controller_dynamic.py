@@ -4,33 +4,175 @@ from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
 from ryu.lib.packet import packet
-from ryu.lib.packet import ethernet, ipv4, udp
+from ryu.lib.packet import ethernet, ipv4, tcp, udp
 from ryu.lib import hub
+from ryu.app.wsgi import WSGIApplication
+from flow_sync import FlowEntry, flow_key, match_key, entries_from_stats, diff_flows, send_flow_mods
+from snapshot import StateSnapshot, pack_mac_table, unpack_mac_table, pack_port_stats, unpack_port_stats
+from forecast import SlicePolicy, TrendForecaster, BANDWIDTH_THRESHOLD
+from flow_setup import FlowSetup
+from elephants import FlowClassifier
+from sflow_collector import SFlowCollector, SFLOW_PORT
+from admission import CapacityModel, HOSTS, pack_reservations
+from slice_api import SliceRestController, SLICE_API_INSTANCE
 import time
 
 UDP_PORT_STREAMING = 9999
-BANDWIDTH_THRESHOLD = 8_000_000
+SNAPSHOT_PATH = 'controller_dynamic.snapshot'
+BASELINE_MAX_AGE = 30  # secondi oltre i quali le statistiche salvate non sono più utili
+PREDICTIVE = True      # sposta il best-effort in anticipo usando la previsione del carico
+
+# packet-in bufferizzati: lo switch trattiene il pacchetto e manda al
+# controller solo i primi MISS_SEND_LEN byte (le intestazioni), il packet-out
+# lo rilascia con il buffer_id. Gli switch senza buffer ricevono NO_BUFFER
+PACKET_IN_BUFFERED = True
+MISS_SEND_LEN = 128
+
+# regole installate dai packet-in. Il video ha una regola dedicata più
+# prioritaria, e PRIORITY_VIDEO_MISS manda al controller il video non ancora
+# installato, così le regole best-effort (per coppia di MAC) non lo catturano.
+# Le regole best-effort hanno un cookie proprio e vengono cancellate quando la
+# politica sposta il best-effort da un link all'altro
+PRIORITY_FLOW = 10
+PRIORITY_VIDEO_MISS = 50
+PRIORITY_VIDEO_FLOW = 60
+COOKIE_BEST_EFFORT = 0xbe
+FLOW_IDLE_TIMEOUT = 5
+FLOW_HARD_TIMEOUT = 30
+FLOW_SETUP_REPORT_INTERVAL = 10  # secondi tra due report di packet-in duplicati/scartati
+
+# best-effort per flusso: sugli switch di bordo TCP e UDP passano da
+# PRIORITY_L4_MISS al controller, che installa una regola per 5-tupla sul link
+# superiore (bassa latenza). Solo gli elefanti (vedi elephants.py) passano al
+# link inferiore quando la politica lo richiede, con una MODIFY_STRICT sulla
+# regola dello switch d'ingresso; s2 e s3 inoltrano il best-effort con regole
+# di transito, quindi lo spostamento non genera packet-in
+PRIORITY_TRANSIT = 5
+PRIORITY_L4_MISS = 20
+PRIORITY_L4_FLOW = 30
+ELEPHANT_POLL_INTERVAL = 2  # secondi tra due letture delle flow stats best-effort
+UPLINKS = {1: (3, 4), 4: (1, 2)}  # switch di bordo -> (porta link superiore, porta link inferiore)
+
+# campionamento sFlow (vedi sflow_collector.py e Environment.enable_sflow): i
+# contatori delle interfacce inviati dagli switch sostituiscono le
+# OFPPortStatsRequest; uno switch torna a essere interrogato se per
+# SFLOW_STALE secondi non arrivano suoi contatori. I campioni di flusso sono
+# contati solo sulle porte verso gli host (EDGE_PORTS)
+SFLOW_COLLECTOR = True
+SFLOW_STALE = 3
+EDGE_PORTS = {(1, 1), (1, 2), (4, 3), (4, 4)}
+SFLOW_TOP_FLOWS = 10
+
+# slice su richiesta (REST /slices): regole per (in_port, ip sorgente, ip
+# destinazione) lungo il percorso riservato, con un meter all'ingresso che
+# limita il traffico alla banda prenotata (meter_id = id della prenotazione)
+PRIORITY_RESERVED = 200
+COOKIE_RESERVED = 0x5e
 
 class RyuController(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+    _CONTEXTS = {'wsgi': WSGIApplication}
 
     def __init__(self, *args, **kwargs):
         super(RyuController, self).__init__(*args, **kwargs)
         self.mac_to_port = {}         # tabella MAC → porta
         self.datapaths = {}
+        self.buffered = {}         # dpid -> True se i packet-in arrivano troncati e bufferizzati
         self.port_stats = {}       # stato attuale
         self.port_stats_prev = {}  # stato precedente
+        self.static_flows = {}     # dpid -> {chiave: FlowEntry}
+        self.flow_stats_body = {}  # dpid -> risposte multipart ancora incomplete
+        self.flow_setup = FlowSetup()  # installazioni in corso + limite di packet-in per switch
+        self.flow_rates = FlowClassifier()  # (dpid, flusso) -> byte rate e classe elefante/topo
+        self.flow_ports = {}       # (dpid, flusso) -> porta di uscita della regola d'ingresso
+        self.flow_rate_requests = {}  # dpid -> (xid, risposte multipart ancora incomplete)
+        self.admission = CapacityModel()  # banda riservabile sui link e slice prenotati
+        self.sflow = SFlowCollector(classify=_service_of, edge_ports=EDGE_PORTS,
+                                    on_counters=self._update_port_stats)
+        kwargs['wsgi'].register(SliceRestController, {SLICE_API_INSTANCE: self})
+        # decide a ogni statistica di s1 se il best-effort può usare il link superiore
+        self.slice_policy = SlicePolicy(BANDWIDTH_THRESHOLD,
+                                        TrendForecaster() if PREDICTIVE else None)
+        self.snapshot = StateSnapshot(SNAPSHOT_PATH)
+        self._restore_snapshot()
         self.monitor_thread = hub.spawn(self._monitor)
-        
+        self.snapshot_thread = hub.spawn(self._snapshot_loop)
+        self.flow_setup_thread = hub.spawn(self._flow_setup_loop)
+        self.elephant_thread = hub.spawn(self._elephant_loop)
+        if SFLOW_COLLECTOR:
+            self.sflow_thread = hub.spawn(self._sflow_loop)
+
+    # ---- Snapshot / warm restart ----
+    def _restore_snapshot(self):
+        state = self.snapshot.load()
+        self.mac_to_port = unpack_mac_table(state.get('mac_to_port', {}))
+        # le statistiche servono da base per il calcolo della banda solo se recenti
+        if time.time() - state.get('saved_at', 0) < BASELINE_MAX_AGE:
+            self.port_stats = unpack_port_stats(state.get('port_stats', []))
+        # gli slice prenotati valgono finché non vengono rilasciati, qualunque sia l'età dello snapshot
+        self.admission.restore(state.get('reservations', []))
+        if state:
+            self.logger.info(f"[SNAPSHOT] Ripristinati {len(self.mac_to_port)} switch da {SNAPSHOT_PATH}")
+
+    def _snapshot_state(self):
+        return {
+            'mac_to_port': pack_mac_table(self.mac_to_port),
+            'port_stats': pack_port_stats(self.port_stats),
+            'reservations': pack_reservations(self.admission.reservations),
+            'saved_at': int(time.time()),
+        }
+
+    def _snapshot_loop(self):
+        """Thread periodico che salva lo stato appreso su disco"""
+        while True:
+            hub.sleep(self.snapshot.interval)
+            self._save_snapshot()
+
+    def _save_snapshot(self):
+        try:
+            self.snapshot.save(self._snapshot_state())
+        except OSError as e:
+            self.logger.warning(f"[SNAPSHOT] Salvataggio fallito: {e}")
+
+    def _flow_setup_loop(self):
+        """Riporta periodicamente i packet-in coalescati e scartati"""
+        while True:
+            hub.sleep(FLOW_SETUP_REPORT_INTERVAL)
+            for dpid, c in self.flow_setup.report().items():
+                self.logger.info(f"[FLOW SETUP] dpid={dpid}: packet-in={c['packet_in']} "
+                                 f"coalescati={c['coalesced']} scartati={c['dropped']}")
+
+    def flow_setup_stats(self):
+        """Contatori cumulativi per switch: packet-in, coalescati, scartati"""
+        return self.flow_setup.stats()
+
+    def _sflow_loop(self):
+        """Collector sFlow: se la porta non è disponibile resta il polling delle statistiche"""
+        self.logger.info(f"[SFLOW] Collector in ascolto su udp/{SFLOW_PORT}")
+        try:
+            self.sflow.serve(port=SFLOW_PORT)
+        except OSError as e:
+            self.logger.warning(f"[SFLOW] Collector non avviato: {e}")
+
+    def sflow_stats(self):
+        """Rate stimati dai campioni sFlow: per slice e flussi più pesanti"""
+        return {
+            'slices': self.sflow.slice_rates(),
+            'flows': [dict(key._asdict(), bps=bps) for key, bps in self.sflow.flow_rates(SFLOW_TOP_FLOWS)],
+        }
+
     def _monitor(self):
         """Thread periodico per chiedere statistiche"""
         while True:
             for dp in self.datapaths.values():
-                parser = dp.ofproto_parser
-                req = parser.OFPPortStatsRequest(dp, 0, dp.ofproto.OFPP_ANY)
-                dp.send_msg(req)
+                if self.sflow.fresh(dp.id, SFLOW_STALE):
+                    continue  # contatori già ricevuti via sFlow
+                self._request_port_stats(dp)
             hub.sleep(1)  # ogni secondo
 
+    def _request_port_stats(self, dp):
+        dp.send_msg(dp.ofproto_parser.OFPPortStatsRequest(dp, 0, dp.ofproto.OFPP_ANY))
+
     def add_flow(self, datapath, priority, match, actions, idle_timeout=0, flag=0):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
@@ -46,16 +188,86 @@ class RyuController(app_manager.RyuApp):
     def port_stats_reply_handler(self, ev):
         """Salva le statistiche correnti"""
         dp = ev.msg.datapath
-        dpid = dp.id
         now = time.time()
-
         for stat in ev.msg.body:
-            port_no = stat.port_no
-            rx = stat.rx_bytes
-            tx = stat.tx_bytes
-            prev = self.port_stats.get((dpid, port_no))
-            self.port_stats_prev[(dpid, port_no)] = prev
-            self.port_stats[(dpid, port_no)] = (rx, tx, now)
+            self._update_port_stats(dp.id, stat.port_no, stat.rx_bytes, stat.tx_bytes, now)
+
+    def _update_port_stats(self, dpid, port_no, rx, tx, now):
+        """Contatori di una porta, da OFPPortStatsReply o dal collector sFlow"""
+        prev = self.port_stats.get((dpid, port_no))
+        self.port_stats_prev[(dpid, port_no)] = prev
+        self.port_stats[(dpid, port_no)] = (rx, tx, now)
+
+        if (dpid, port_no) == (1, 3):
+            on_upper = self.slice_policy.on_upper
+            self.slice_policy.update(self.get_port_bandwidth(1, 3))
+            if self.slice_policy.on_upper != on_upper:
+                self._place_elephants()
+
+    # ---- Elefanti e topi ----
+    def _elephant_loop(self):
+        """Thread periodico che legge i contatori delle regole best-effort sugli switch di bordo"""
+        while True:
+            hub.sleep(ELEPHANT_POLL_INTERVAL)
+            for dpid in UPLINKS:
+                dp = self.datapaths.get(dpid)
+                if dp is not None:
+                    self._request_flow_rates(dp)
+
+    def _request_flow_rates(self, dp):
+        """Chiede i contatori delle sole regole best-effort (cookie) dello switch"""
+        req = dp.ofproto_parser.OFPFlowStatsRequest(
+            dp, cookie=COOKIE_BEST_EFFORT, cookie_mask=0xffffffffffffffff)
+        dp.set_xid(req)
+        self.flow_rate_requests[dp.id] = (req.xid, [])
+        dp.send_msg(req)
+
+    def _update_flow_rates(self, datapath, body):
+        """Aggiorna il byte rate dei flussi che entrano nella rete da questo switch"""
+        dpid = datapath.id
+        seen = set()
+        for stat in body:
+            flow = match_key(stat.match)
+            out_port = _output_port(stat.instructions)
+            if stat.priority != PRIORITY_L4_FLOW or out_port not in UPLINKS[dpid]:
+                continue  # regola verso un host: il flusso è contato dallo switch d'ingresso
+            key = (dpid, flow)
+            seen.add(key)
+            self.flow_ports[key] = out_port
+            elephant = self.flow_rates.update(key, stat.byte_count,
+                                              stat.duration_sec + stat.duration_nsec / 1e9)
+            if elephant is not None:
+                self.logger.info(f"[ELEPHANT][SW{dpid}] {dict(flow)}: "
+                                 f"{'elefante' if elephant else 'topo'} "
+                                 f"({self.flow_rates.rate(key) / 1e6:.2f} Mbps)")
+                self._place_flow(datapath, key)
+        for key in self.flow_rates.prune(dpid, seen):
+            self.flow_ports.pop(key, None)
+
+    def _place_elephants(self):
+        """La politica è cambiata: si spostano solo gli elefanti, i topi restano dove sono"""
+        for key in self.flow_rates.elephants():
+            datapath = self.datapaths.get(key[0])
+            if datapath is not None:
+                self._place_flow(datapath, key)
+
+    def _uplink(self, dpid, elephant):
+        """Porta verso il link superiore, o verso l'inferiore per gli elefanti se la politica lo chiede"""
+        lower = elephant and not self.slice_policy.on_upper
+        return UPLINKS[dpid][1 if lower else 0]
+
+    def _place_flow(self, datapath, key):
+        """Porta la regola d'ingresso del flusso sul link giusto con una MODIFY_STRICT"""
+        out_port = self._uplink(datapath.id, self.flow_rates.is_elephant(key))
+        if self.flow_ports.get(key) == out_port:
+            return
+        parser = datapath.ofproto_parser
+        entry = self._flow_entry(datapath, PRIORITY_L4_FLOW, parser.OFPMatch(**dict(key[1])),
+                                 [parser.OFPActionOutput(out_port)],
+                                 idle_timeout=FLOW_IDLE_TIMEOUT, cookie=COOKIE_BEST_EFFORT)
+        send_flow_mods(datapath, modify=[entry])
+        self.flow_ports[key] = out_port
+        self.logger.info(f"[ELEPHANT][SW{datapath.id}] {dict(key[1])} → porta {out_port}")
         
     def get_port_bandwidth(self, dpid, port_no):
         """Ritorna la banda stimata (bps) su una porta"""
@@ -66,26 +278,136 @@ class RyuController(app_manager.RyuApp):
         rx_diff = current[0] - prev[0]
         tx_diff = current[1] - prev[1]
         t_diff = current[2] - prev[2]
-        if t_diff <= 0:
+        if t_diff <= 0 or rx_diff < 0 or tx_diff < 0:  # contatori azzerati (switch riavviato)
             return 0
         return (rx_diff + tx_diff) * 8 / t_diff
                
+    def _flow_entry(self, datapath, priority, match, actions,
+                    idle_timeout=0, hard_timeout=0, cookie=0):
+        parser = datapath.ofproto_parser
+        inst = [parser.OFPInstructionActions(datapath.ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        return FlowEntry(0, priority, match, inst, idle_timeout, hard_timeout, cookie)
+
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
         dp = ev.msg.datapath
         self.datapaths[dp.id] = dp
         datapath = ev.msg.datapath
-        ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
         dpid = datapath.id
 
         self.logger.info(f"[FEATURES HANDLER] dpid={dpid}")
 
+        self.flow_setup.forget(dpid)
+        self.buffered[dpid] = PACKET_IN_BUFFERED and ev.msg.n_buffers > 0
+        self._set_miss_send_len(datapath)
+        for reservation in self.admission.reservations.values():
+            if reservation.path[0][0] == dpid:
+                self._send_meter(datapath, reservation, reinstall=True)
+
+        # le regole non vengono inviate subito: prima si legge la flow table
+        # dello switch e si installano solo le differenze (vedi _reconcile)
+        self.static_flows[dpid] = {
+            flow_key(e): e for e in self._static_flows(datapath)
+        }
+        self.flow_stats_body[dpid] = []
+        datapath.send_msg(parser.OFPFlowStatsRequest(datapath))
+
+    def _miss_send_len(self, dpid):
+        if self.buffered.get(dpid):
+            return MISS_SEND_LEN
+        return ofproto_v1_3.OFPCML_NO_BUFFER
+
+    def _set_miss_send_len(self, datapath):
+        ofproto = datapath.ofproto
+        datapath.send_msg(datapath.ofproto_parser.OFPSetConfig(
+            datapath, ofproto.OFPC_FRAG_NORMAL, self._miss_send_len(datapath.id)))
+
+    def _disable_buffering(self, datapath):
+        """Torna ai packet-in completi: lo switch ha esaurito (o non ha) i buffer"""
+        dpid = datapath.id
+        self.logger.warning(f"[BUFFERING] dpid={dpid}: packet-in troncato senza buffer, uso NO_BUFFER")
+        self.buffered[dpid] = False
+        self._set_miss_send_len(datapath)
+        self._update_static_flows(datapath)
+
+    def _update_static_flows(self, datapath):
+        """Ricalcola le regole statiche dello switch e invia solo le differenze"""
+        dpid = datapath.id
+        static_flows = {flow_key(e): e for e in self._static_flows(datapath)}
+        add, modify, delete = diff_flows(static_flows, self.static_flows.get(dpid, {}))
+        self.static_flows[dpid] = static_flows
+        send_flow_mods(datapath, add, modify, delete)
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def flow_stats_reply_handler(self, ev):
+        msg = ev.msg
+        dpid = msg.datapath.id
+        request = self.flow_rate_requests.get(dpid)
+        if request is not None and request[0] == msg.xid:
+            request[1].extend(msg.body)
+            if not msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE:
+                del self.flow_rate_requests[dpid]
+                self._update_flow_rates(msg.datapath, request[1])
+            return
+        if dpid not in self.flow_stats_body:
+            return
+        self.flow_stats_body[dpid].extend(msg.body)
+        if msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE:
+            return
+        self._reconcile(msg.datapath, self.flow_stats_body.pop(dpid))
+
+    def _reconcile(self, datapath, body):
+        """Allinea la flow table dello switch alle regole statiche senza svuotarla"""
+        dpid = datapath.id
+        installed = entries_from_stats(body)
+        add, modify, delete = diff_flows(self.static_flows.get(dpid, {}), installed,
+                                         adopt=self._adopt_flow)
+        send_flow_mods(datapath, add, modify, delete)
+        self.logger.info(f"[RECONCILE] dpid={dpid}: installati={len(installed)} "
+                         f"add={len(add)} modify={len(modify)} delete={len(delete)}")
+
+    def _adopt_flow(self, entry):
+        """Mantiene le regole apprese dai packet-in e quelle degli slice ancora prenotati.
+
+        Le regole apprese scadono da sole (idle timeout): cancellarle alla
+        riconnessione manderebbe al controller tutti i flussi attivi.
+        """
+        if entry.priority in (PRIORITY_FLOW, PRIORITY_VIDEO_FLOW, PRIORITY_L4_FLOW):
+            return True
+        if entry.cookie == COOKIE_RESERVED:
+            fields = dict(entry.match.items())
+            pairs = {(HOSTS[r.src][0], HOSTS[r.dst][0]) for r in self.admission.reservations.values()}
+            return (fields.get('ipv4_src'), fields.get('ipv4_dst')) in pairs
+        return False
+
+    def _static_flows(self, datapath):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        dpid = datapath.id
+        flows = []
+
         # regola di default: manda tutto al controller
         match = parser.OFPMatch()
         actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
-                                          ofproto.OFPCML_NO_BUFFER)]
-        self.add_flow(datapath, priority=0, match=match, actions=actions)
+                                          self._miss_send_len(dpid))]
+        flows.append(self._flow_entry(datapath, 0, match, actions))
+
+        # video senza regola dedicata: al controller prima delle regole best-effort
+        match = parser.OFPMatch(eth_type=0x0800, ip_proto=17, udp_dst=UDP_PORT_STREAMING)
+        flows.append(self._flow_entry(datapath, PRIORITY_VIDEO_MISS, match, actions))
+
+        if dpid in UPLINKS:
+            # TCP/UDP best-effort senza regola per flusso: al controller
+            for ip_proto in (6, 17):
+                match = parser.OFPMatch(eth_type=0x0800, ip_proto=ip_proto)
+                flows.append(self._flow_entry(datapath, PRIORITY_L4_MISS, match, actions))
+        else:
+            # s2 e s3 hanno due sole porte: il best-effort in transito non passa dal controller
+            for in_port, out_port in ((1, 2), (2, 1)):
+                match = parser.OFPMatch(in_port=in_port)
+                flows.append(self._flow_entry(datapath, PRIORITY_TRANSIT, match,
+                                              [parser.OFPActionOutput(out_port)]))
 
         # impostazioni specifiche per UDP:9999 (piano "up")
         if dpid == 1:
@@ -97,7 +419,7 @@ class RyuController(app_manager.RyuApp):
                     udp_dst=UDP_PORT_STREAMING
                 )
                 actions = [parser.OFPActionOutput(3)]  # verso s2
-                self.add_flow(datapath, priority=100, match=match, actions=actions)
+                flows.append(self._flow_entry(datapath, 100, match, actions))
 
         elif dpid == 2:
             # s2: riceve UDP da s1 e manda a s4
@@ -108,7 +430,7 @@ class RyuController(app_manager.RyuApp):
                 udp_dst=UDP_PORT_STREAMING
             )
             actions = [parser.OFPActionOutput(2)]  # verso s4
-            self.add_flow(datapath, priority=100, match=match, actions=actions)
+            flows.append(self._flow_entry(datapath, 100, match, actions))
             
             # s2: riceve UDP da s4 e manda a s1
             match = parser.OFPMatch(
@@ -118,7 +440,7 @@ class RyuController(app_manager.RyuApp):
                 udp_dst=UDP_PORT_STREAMING
             )
             actions = [parser.OFPActionOutput(1)]  # verso s4
-            self.add_flow(datapath, priority=100, match=match, actions=actions)
+            flows.append(self._flow_entry(datapath, 100, match, actions))
 
         elif dpid == 3:
             # s3 non inoltra traffico UDP
@@ -134,7 +456,73 @@ class RyuController(app_manager.RyuApp):
                     udp_dst=UDP_PORT_STREAMING
                 )
                 actions = [parser.OFPActionOutput(1)]  # verso s2
-                self.add_flow(datapath, priority=100, match=match, actions=actions)
+                flows.append(self._flow_entry(datapath, 100, match, actions))
+
+        flows.extend(self._reservation_flows(datapath))
+        return flows
+
+    # ---- Slice su richiesta con banda garantita ----
+    def reserve_slice(self, src, dst, rate_bps):
+        """Ammette e installa uno slice; AdmissionError se la banda non basta"""
+        reservation = self.admission.reserve(src, dst, rate_bps)
+        self.logger.info(f"[ADMISSION] slice {reservation.id}: {src}->{dst} "
+                         f"{rate_bps / 1e6:.2f} Mbps via {[d for d, _, _ in reservation.path]}")
+        # il meter deve esistere prima della regola che lo usa
+        ingress = self.datapaths.get(reservation.path[0][0])
+        if ingress is not None:
+            self._send_meter(ingress, reservation)
+        self._update_path(reservation)
+        self._save_snapshot()  # una prenotazione accettata deve sopravvivere a un riavvio
+        return reservation
+
+    def release_slice(self, reservation_id):
+        """Rimuove uno slice; KeyError se non esiste"""
+        reservation = self.admission.release(reservation_id)
+        self.logger.info(f"[ADMISSION] slice {reservation.id} rilasciato")
+        self._update_path(reservation)
+        ingress = self.datapaths.get(reservation.path[0][0])
+        if ingress is not None:
+            ofproto = ingress.ofproto
+            ingress.send_msg(ingress.ofproto_parser.OFPMeterMod(
+                ingress, command=ofproto.OFPMC_DELETE, meter_id=reservation.id))
+        self._save_snapshot()
+        return reservation
+
+    def _update_path(self, reservation):
+        for dpid, _, _ in reservation.path:
+            datapath = self.datapaths.get(dpid)
+            if datapath is not None:
+                self._update_static_flows(datapath)
+
+    def _send_meter(self, datapath, reservation, reinstall=False):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        if reinstall:
+            # alla riconnessione il meter potrebbe essere ancora presente
+            datapath.send_msg(parser.OFPMeterMod(
+                datapath, command=ofproto.OFPMC_DELETE, meter_id=reservation.id))
+        bands = [parser.OFPMeterBandDrop(rate=int(reservation.rate_bps / 1000))]
+        datapath.send_msg(parser.OFPMeterMod(
+            datapath, command=ofproto.OFPMC_ADD, flags=ofproto.OFPMF_KBPS,
+            meter_id=reservation.id, bands=bands))
+
+    def _reservation_flows(self, datapath):
+        parser = datapath.ofproto_parser
+        ofproto = datapath.ofproto
+        flows = []
+        for reservation in self.admission.reservations.values():
+            ipv4_src, ipv4_dst = HOSTS[reservation.src][0], HOSTS[reservation.dst][0]
+            for hop, (dpid, in_port, out_port) in enumerate(reservation.path):
+                if dpid != datapath.id:
+                    continue
+                match = parser.OFPMatch(in_port=in_port, eth_type=0x0800,
+                                        ipv4_src=ipv4_src, ipv4_dst=ipv4_dst)
+                inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+                                                     [parser.OFPActionOutput(out_port)])]
+                if hop == 0:
+                    inst.insert(0, parser.OFPInstructionMeter(reservation.id))
+                flows.append(FlowEntry(0, PRIORITY_RESERVED, match, inst, cookie=COOKIE_RESERVED))
+        return flows
 
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def _packet_in_handler(self, ev):
@@ -145,6 +533,10 @@ class RyuController(app_manager.RyuApp):
         dpid = datapath.id
         in_port = msg.match['in_port']
 
+        # picco di packet-in: lo switch viene servito al massimo al ritmo del token bucket
+        if not self.flow_setup.admit(dpid):
+            return
+
         pkt = packet.Packet(msg.data)
         eth = pkt.get_protocol(ethernet.ethernet)
         if eth is None:
@@ -177,32 +569,49 @@ class RyuController(app_manager.RyuApp):
             4: {2}       # s4 -> s3
         }
 
-        actions = []
-
-        # scelta dei link da usare
-        link_set = up_links.get(dpid, set())
-        
         ip4 = pkt.get_protocol(ipv4.ipv4)
         udp_pkt = pkt.get_protocol(udp.udp)
+        tcp_pkt = pkt.get_protocol(tcp.tcp)
         
         bw_bps = self.get_port_bandwidth(1, 3)
         bw_mbps = bw_bps / 1_000_000
+        pred_mbps = self.slice_policy.predicted_bps / 1_000_000
         
         udp_video = ip4 and ip4.proto == 17 and udp_pkt and udp_pkt.dst_port == UDP_PORT_STREAMING
-        
-        if udp_video:
-            link_set = up_links.get(dpid, set())
-        elif bw_bps < BANDWIDTH_THRESHOLD:
-                self.logger.info(f"[DEBUG][SW{dpid}] Banda {bw_mbps:.2f} Mbps < soglia → uso link superiore {link_set}")
-                link_set = up_links.get(dpid, set())  
-        else:
-            self.logger.info(f"[DEBUG][SW{dpid}] Banda {bw_mbps:.2f} Mbps > soglia → uso link inferiore {link_set}")
-            link_set = dw_links.get(dpid, set())  
 
+        # best-effort TCP/UDP: regola per 5-tupla; un flusso nuovo è un topo
+        # e usa il link superiore, un elefante già noto (regola scaduta e
+        # ricreata) riparte dal link che la politica gli assegna
+        flow_match = flow = None
+        if ip4 and not udp_video and (tcp_pkt or udp_pkt):
+            l4, l4_pkt = ('tcp', tcp_pkt) if tcp_pkt else ('udp', udp_pkt)
+            flow_match = parser.OFPMatch(eth_type=0x0800, ip_proto=ip4.proto,
+                                         ipv4_src=ip4.src, ipv4_dst=ip4.dst,
+                                         **{f'{l4}_src': l4_pkt.src_port, f'{l4}_dst': l4_pkt.dst_port})
+            flow = match_key(flow_match)
+        elephant = flow is not None and self.flow_rates.is_elephant((dpid, flow))
+        lower = elephant and not self.slice_policy.on_upper
+        link_set = (dw_links if lower else up_links).get(dpid, set())
+
+        # la regola si installa solo se la destinazione è nota; se è già stata
+        # inviata il packet-in è un duplicato: solo packet-out, senza log
+        install = dst in self.mac_to_port[dpid]
+        coalesced = install and not self.flow_setup.start(dpid, (in_port, src, dst, bool(udp_video), flow))
+
+        if not udp_video and not coalesced:
+            kind = 'elefante' if elephant else 'topo'
+            self.logger.info(f"[DEBUG][SW{dpid}] Banda {bw_mbps:.2f} Mbps (prevista {pred_mbps:.2f}), "
+                             f"{kind} → uso link {'inferiore' if lower else 'superiore'} {link_set}")
 
-        # ora flood controllato solo se dobbiamo andare sul link inferiore
         actions = []
-        if link_set == dw_links.get(dpid, set()):
+        if dst in self.mac_to_port[dpid]:
+            # MAC learning normale
+            out_port = self.mac_to_port[dpid][dst]
+            if dpid in UPLINKS and out_port not in host_ports[dpid]:
+                # destinazione remota: il link lo sceglie la classe del flusso, non la porta appresa
+                out_port = self._uplink(dpid, elephant)
+            actions = [parser.OFPActionOutput(out_port)]
+        else:
             # flood controllato su host + link_set
             for p in host_ports.get(dpid, set()):
                 if p != in_port:
@@ -210,28 +619,58 @@ class RyuController(app_manager.RyuApp):
             for p in link_set:
                 if p != in_port:
                     actions.append(parser.OFPActionOutput(p))
-        else:
-            # MAC learning normale
-            if dst in self.mac_to_port[dpid]:
-                out_port = self.mac_to_port[dpid][dst]
-                actions = [parser.OFPActionOutput(out_port)]
+
+        # regola per i pacchetti successivi dello stesso flusso
+        if install and not coalesced and actions:
+            if udp_video:
+                match = parser.OFPMatch(in_port=in_port, eth_src=src, eth_dst=dst, eth_type=0x0800,
+                                        ip_proto=17, udp_dst=UDP_PORT_STREAMING)
+                entry = self._flow_entry(datapath, PRIORITY_VIDEO_FLOW, match, actions,
+                                         idle_timeout=FLOW_IDLE_TIMEOUT)
+            elif flow_match is not None:
+                # niente hard timeout: gli spostamenti sono MODIFY_STRICT (vedi _place_flow)
+                entry = self._flow_entry(datapath, PRIORITY_L4_FLOW, flow_match, actions,
+                                         idle_timeout=FLOW_IDLE_TIMEOUT,
+                                         cookie=COOKIE_BEST_EFFORT)
+                if dpid in UPLINKS and actions[0].port in UPLINKS[dpid]:
+                    self.flow_ports[(dpid, flow)] = actions[0].port
             else:
-                # se non conosciamo ancora il MAC, possiamo fare flood controllato anche sul link superiore
-                for p in host_ports.get(dpid, set()):
-                    if p != in_port:
-                        actions.append(parser.OFPActionOutput(p))
-                for p in link_set:
-                    if p != in_port:
-                       actions.append(parser.OFPActionOutput(p))
+                match = parser.OFPMatch(in_port=in_port, eth_src=src, eth_dst=dst)
+                entry = self._flow_entry(datapath, PRIORITY_FLOW, match, actions,
+                                         idle_timeout=FLOW_IDLE_TIMEOUT,
+                                         hard_timeout=FLOW_HARD_TIMEOUT,
+                                         cookie=COOKIE_BEST_EFFORT)
+            send_flow_mods(datapath, add=[entry])
        
-        # invio pacchetto
+        # invio pacchetto: se è nel buffer dello switch basta il buffer_id
+        data = None
+        if msg.buffer_id == datapath.ofproto.OFP_NO_BUFFER:
+            if len(msg.data) < msg.total_len:
+                # troncato ma non bufferizzato: il pacchetto non è recuperabile
+                self._disable_buffering(datapath)
+                return
+            data = msg.data
         out = parser.OFPPacketOut(
             datapath=datapath,
             buffer_id=msg.buffer_id,
             in_port=in_port,
             actions=actions,
-            data=msg.data
+            data=data
         )
         datapath.send_msg(out)
 
 
+def _output_port(instructions):
+    """Prima porta di uscita delle istruzioni di una regola (None se non inoltra)"""
+    for inst in instructions:
+        for action in getattr(inst, 'actions', ()):
+            if hasattr(action, 'port'):
+                return action.port
+    return None
+
+
+def _service_of(key):
+    """Slice di un flusso campionato via sFlow"""
+    if key.ip_proto == 17 and key.dst_port == UDP_PORT_STREAMING:
+        return 'video'
+    return 'best-effort'
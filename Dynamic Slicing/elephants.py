@@ -0,0 +1,102 @@
+"""Classificazione dei flussi best-effort in elefanti e topi dal byte rate.
+
+Il byte rate di ogni regola per flusso si ricava da due letture successive
+delle flow stats (byte_count e durata della regola). Un flusso diventa
+elefante dopo ELEPHANT_SAMPLES letture consecutive sopra ELEPHANT_RATE e
+torna topo dopo altrettante sotto MOUSE_RATE: con l'isteresi un flusso
+vicino alla soglia non viene spostato avanti e indietro tra i link.
+
+Un elefante la cui regola è scaduta (idle timeout) resta noto per
+ELEPHANT_GRACE secondi: se il flusso riprende, la nuova regola parte già dal
+link assegnato agli elefanti.
+"""
+import time
+
+ELEPHANT_RATE = 500_000  # bps oltre i quali un flusso è candidato elefante
+MOUSE_RATE = 100_000     # bps sotto i quali un elefante è candidato topo
+ELEPHANT_SAMPLES = 2     # letture consecutive necessarie per cambiare classe
+ELEPHANT_GRACE = 30      # secondi per cui un elefante senza regola viene ricordato
+
+
+class _FlowRate(object):
+    __slots__ = ('byte_count', 'duration', 'rate', 'streak', 'elephant', 'missing')
+
+    def __init__(self, byte_count, duration, elephant=False):
+        self.byte_count = byte_count
+        self.duration = duration
+        self.rate = 0.0
+        self.streak = 0
+        self.elephant = elephant
+        self.missing = None  # istante da cui la regola non compare più nelle letture
+
+
+class FlowClassifier(object):
+    """Byte rate e classe (elefante/topo) per chiave (dpid, flusso)"""
+
+    def __init__(self, elephant_rate=ELEPHANT_RATE, mouse_rate=MOUSE_RATE,
+                 samples=ELEPHANT_SAMPLES, grace=ELEPHANT_GRACE, clock=time.monotonic):
+        self.elephant_rate = elephant_rate
+        self.mouse_rate = mouse_rate
+        self.samples = samples
+        self.grace = grace
+        self.clock = clock
+        self.flows = {}
+
+    def update(self, key, byte_count, duration):
+        """Nuova lettura dei contatori della regola.
+
+        Ritorna True se il flusso è appena diventato elefante, False se è
+        appena tornato topo, None se la classe non cambia.
+        """
+        flow = self.flows.get(key)
+        if flow is None or duration < flow.duration or byte_count < flow.byte_count:
+            # regola nuova o reinstallata: il rate si calcola dalla prossima lettura
+            self.flows[key] = _FlowRate(byte_count, duration, flow is not None and flow.elephant)
+            return None
+        flow.missing = None
+        elapsed = duration - flow.duration
+        if elapsed <= 0:
+            return None
+        flow.rate = (byte_count - flow.byte_count) * 8 / elapsed
+        flow.byte_count = byte_count
+        flow.duration = duration
+        if flow.elephant:
+            crossing = flow.rate < self.mouse_rate
+        else:
+            crossing = flow.rate >= self.elephant_rate
+        flow.streak = flow.streak + 1 if crossing else 0
+        if flow.streak < self.samples:
+            return None
+        flow.elephant = not flow.elephant
+        flow.streak = 0
+        return flow.elephant
+
+    def is_elephant(self, key):
+        flow = self.flows.get(key)
+        return flow is not None and flow.elephant
+
+    def rate(self, key):
+        flow = self.flows.get(key)
+        return flow.rate if flow is not None else 0.0
+
+    def elephants(self):
+        """Elefanti con una regola installata"""
+        return [key for key, flow in self.flows.items() if flow.elephant and flow.missing is None]
+
+    def prune(self, dpid, seen):
+        """Dimentica i flussi dello switch non più presenti; ritorna le chiavi rimosse.
+
+        Gli elefanti restano per `grace` secondi dalla prima lettura in cui mancano.
+        """
+        now = self.clock()
+        removed = []
+        for key, flow in self.flows.items():
+            if key[0] != dpid or key in seen:
+                continue
+            if flow.missing is None:
+                flow.missing = now
+            if not flow.elephant or now - flow.missing >= self.grace:
+                removed.append(key)
+        for key in removed:
+            del self.flows[key]
+        return removed
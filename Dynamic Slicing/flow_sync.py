@@ -0,0 +1,100 @@
+from collections import namedtuple
+
+# descrizione di un flusso indipendente dal messaggio OpenFlow che lo installa
+FlowEntry = namedtuple('FlowEntry', [
+    'table_id', 'priority', 'match', 'instructions',
+    'idle_timeout', 'hard_timeout', 'cookie'
+])
+FlowEntry.__new__.__defaults__ = (0, 0, 0)
+
+_ACTION_FIELDS = ('port', 'max_len', 'key', 'value', 'group_id', 'queue_id')
+
+
+def match_key(match):
+    """Chiave hashable di un OFPMatch (campi ordinati per nome)"""
+    return tuple(sorted(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in match.items()
+    ))
+
+
+def flow_key(entry):
+    """Identità di un flusso per lo switch: tabella, priorità e match"""
+    return (entry.table_id, entry.priority, match_key(entry.match))
+
+
+def _action_key(action):
+    return (action.type,) + tuple(
+        getattr(action, f) for f in _ACTION_FIELDS if hasattr(action, f))
+
+
+def instructions_key(instructions):
+    """Chiave hashable delle istruzioni di un flusso"""
+    key = []
+    for inst in instructions:
+        if hasattr(inst, 'actions'):
+            key.append((inst.type, tuple(_action_key(a) for a in inst.actions)))
+        elif hasattr(inst, 'table_id'):
+            key.append((inst.type, inst.table_id))
+        elif hasattr(inst, 'metadata'):
+            key.append((inst.type, inst.metadata, inst.metadata_mask))
+        elif hasattr(inst, 'meter_id'):
+            key.append((inst.type, inst.meter_id))
+        else:
+            key.append((inst.type,))
+    return tuple(key)
+
+
+def entries_from_stats(body):
+    """Converte il corpo di una OFPFlowStatsReply in {chiave: FlowEntry}"""
+    installed = {}
+    for stat in body:
+        entry = FlowEntry(stat.table_id, stat.priority, stat.match,
+                          stat.instructions, stat.idle_timeout,
+                          stat.hard_timeout, stat.cookie)
+        installed[flow_key(entry)] = entry
+    return installed
+
+
+def diff_flows(desired, installed, adopt=None):
+    """Calcola le differenze tra flussi desiderati e installati.
+
+    desired e installed sono dict {chiave: FlowEntry}; adopt(entry) permette
+    di mantenere flussi installati non previsti (es. appresi a runtime).
+    Ritorna le liste (add, modify, delete).
+    """
+    add, modify, delete = [], [], []
+    for key, entry in desired.items():
+        current = installed.get(key)
+        if current is None:
+            add.append(entry)
+        elif instructions_key(current.instructions) != instructions_key(entry.instructions):
+            modify.append(entry)
+    for key, entry in installed.items():
+        if key in desired:
+            continue
+        if adopt is not None and adopt(entry):
+            continue
+        delete.append(entry)
+    return add, modify, delete
+
+
+def send_flow_mods(datapath, add=(), modify=(), delete=()):
+    """Invia allo switch le FlowMod necessarie ad applicare un diff"""
+    ofproto = datapath.ofproto
+    parser = datapath.ofproto_parser
+    for command, entries in ((ofproto.OFPFC_ADD, add),
+                             (ofproto.OFPFC_MODIFY_STRICT, modify)):
+        for e in entries:
+            datapath.send_msg(parser.OFPFlowMod(
+                datapath=datapath, table_id=e.table_id, command=command,
+                priority=e.priority, match=e.match, instructions=e.instructions,
+                idle_timeout=e.idle_timeout, hard_timeout=e.hard_timeout,
+                cookie=e.cookie
+            ))
+    for e in delete:
+        datapath.send_msg(parser.OFPFlowMod(
+            datapath=datapath, table_id=e.table_id,
+            command=ofproto.OFPFC_DELETE_STRICT, priority=e.priority,
+            match=e.match, out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY
+        ))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Previsione del carico sul link superiore a partire dallo storico delle statistiche.
+
+Il forecaster lineare è una regressione ai minimi quadrati sulle ultime
+WINDOW misure: la previsione a HORIZON passi è una combinazione lineare fissa
+della finestra, quindi i pesi sono calcolati una volta e ogni previsione è un
+prodotto scalare (oppure un prodotto matrice-vettore su tutte le finestre di
+una serie, vedi predict_series).
+
+Eseguito come script confronta, su una traccia registrata o sintetica, quante
+violazioni della soglia produce la politica reattiva attuale e quante quella
+predittiva:
+
+    python3 forecast.py [traccia.csv]     # colonne: video_bps,best_effort_bps
+"""
+import csv
+import sys
+from collections import deque
+
+import numpy as np
+
+BANDWIDTH_THRESHOLD = 8_000_000  # bps sul link superiore oltre cui il best-effort va spostato
+WINDOW = 10   # campioni (uno al secondo) usati per la previsione
+HORIZON = 3   # intervalli di anticipo
+BEST_EFFORT_DECAY = 0.9  # per intervallo: la stima del best-effort spostato invecchia
+
+
+def trend_weights(window=WINDOW, horizon=HORIZON):
+    """Pesi w tali che w @ finestra = previsione lineare a `horizon` passi"""
+    t = np.arange(window, dtype=float)
+    X = np.column_stack([np.ones(window), t])
+    x_pred = np.array([1.0, window - 1 + horizon])
+    return x_pred @ np.linalg.pinv(X)
+
+
+def predict_series(series, window=WINDOW, horizon=HORIZON):
+    """Previsioni per ogni finestra completa della serie (vettorizzato).
+
+    L'elemento i è la previsione fatta dopo aver osservato series[i + window - 1].
+    """
+    series = np.asarray(series, dtype=float)
+    if len(series) < window:
+        return np.empty(0)
+    windows = np.lib.stride_tricks.sliding_window_view(series, window)
+    return np.maximum(windows @ trend_weights(window, horizon), 0.0)
+
+
+class TrendForecaster(object):
+    """Previsione lineare incrementale su una finestra scorrevole"""
+
+    def __init__(self, window=WINDOW, horizon=HORIZON):
+        self.window = window
+        self.horizon = horizon
+        self.history = deque(maxlen=window)
+        self._weights = trend_weights(window, horizon)
+
+    def update(self, value):
+        self.history.append(value)
+
+    def predict(self):
+        """Carico previsto fra `horizon` intervalli (0 se lo storico è insufficiente)"""
+        if len(self.history) < self.window:
+            return 0.0
+        return max(float(self._weights @ np.fromiter(self.history, float, self.window)), 0.0)
+
+
+class HoltForecaster(object):
+    """Smoothing esponenziale doppio (Holt): livello + trend, O(1) per campione"""
+
+    def __init__(self, alpha=0.5, beta=0.3, horizon=HORIZON):
+        self.alpha = alpha
+        self.beta = beta
+        self.horizon = horizon
+        self.level = None
+        self.trend = 0.0
+
+    def update(self, value):
+        if self.level is None:
+            self.level = value
+            return
+        prev = self.level
+        self.level = self.alpha * value + (1 - self.alpha) * (self.level + self.trend)
+        self.trend = self.beta * (self.level - prev) + (1 - self.beta) * self.trend
+
+    def predict(self):
+        if self.level is None:
+            return 0.0
+        return max(self.level + self.horizon * self.trend, 0.0)
+
+
+class SlicePolicy(object):
+    """Decide, a ogni misura del link superiore, se il best-effort può usarlo.
+
+    Senza forecaster è la politica reattiva del controller: confronta solo la
+    banda misurata con la soglia, quindi appena il best-effort viene spostato
+    la misura scende e lo riporta sul link superiore. Con un forecaster la
+    decisione usa il carico offerto (misura + best-effort stimato dal calo di
+    banda osservato allo spostamento) e la sua previsione a `horizon` passi.
+    """
+
+    def __init__(self, threshold, forecaster=None):
+        self.threshold = threshold
+        self.forecaster = forecaster
+        self.on_upper = True
+        self.best_effort_bps = 0.0  # stima della banda best-effort spostata
+        self.predicted_bps = 0.0
+        self._before_move = None
+
+    def update(self, upper_bps):
+        """Nuova misura (bps) del link superiore; ritorna True se il best-effort può usarlo"""
+        if self._before_move is not None:
+            self.best_effort_bps = max(self._before_move - upper_bps, 0.0)
+            self._before_move = None
+        else:
+            self.best_effort_bps *= BEST_EFFORT_DECAY
+        if self.forecaster is None:
+            estimate = upper_bps
+        else:
+            offered = upper_bps + (0.0 if self.on_upper else self.best_effort_bps)
+            self.forecaster.update(offered)
+            self.predicted_bps = self.forecaster.predict()
+            estimate = max(offered, self.predicted_bps)
+        on_upper = estimate < self.threshold
+        if self.on_upper and not on_upper:
+            self._before_move = upper_bps
+        self.on_upper = on_upper
+        return on_upper
+
+
+# ---- Replay: politica reattiva vs predittiva ----
+
+def replay(video, best_effort, policy):
+    """Applica la politica a una traccia (un campione per intervallo di monitor).
+
+    Nell'intervallo t il link superiore porta il video più il best-effort se
+    la decisione presa alla fine di t-1 lo consente; si ha una violazione quando
+    questo carico supera la soglia. Ritorna (violazioni, intervalli sul link inferiore).
+    """
+    violations = moved = 0
+    for v, be in zip(video, best_effort):
+        on_upper = policy.on_upper
+        upper = v + (be if on_upper else 0.0)
+        if upper > policy.threshold:
+            violations += 1
+        if not on_upper:
+            moved += 1
+        policy.update(upper)
+    return violations, moved
+
+
+def synthetic_trace(seconds=3600, seed=1):
+    """Video con rampe lente + best-effort a raffiche"""
+    rnd = np.random.default_rng(seed)
+    t = np.arange(seconds)
+    video = 3e6 + 3e6 * np.clip(np.sin(2 * np.pi * t / 300), 0, None) + rnd.normal(0, 1e5, seconds)
+    bursts = (rnd.random(seconds) < 0.01).astype(float)
+    best_effort = 1.5e6 + 2.5e6 * np.convolve(bursts, np.ones(15), 'same').clip(0, 1)
+    return np.clip(video, 0, None), best_effort
+
+
+def load_trace(path):
+    video, best_effort = [], []
+    with open(path) as f:
+        for row in csv.DictReader(f):
+            video.append(float(row['video_bps']))
+            best_effort.append(float(row['best_effort_bps']))
+    return np.array(video), np.array(best_effort)
+
+
+if __name__ == '__main__':
+    video, best_effort = load_trace(sys.argv[1]) if len(sys.argv) > 1 else synthetic_trace()
+    policies = [('reattiva', SlicePolicy(BANDWIDTH_THRESHOLD)),
+                ('trend lineare', SlicePolicy(BANDWIDTH_THRESHOLD, TrendForecaster())),
+                ('holt', SlicePolicy(BANDWIDTH_THRESHOLD, HoltForecaster()))]
+    print(f"{len(video)} intervalli, soglia {BANDWIDTH_THRESHOLD / 1e6:.1f} Mbps")
+    print(f"{'politica':<15} {'violazioni':>10} {'evitate':>8} {'s su link inferiore':>20}")
+    baseline = None
+    for name, policy in policies:
+        violations, moved = replay(video, best_effort, policy)
+        baseline = violations if baseline is None else baseline
+        print(f"{name:<15} {violations:>10} {baseline - violations:>8} {moved:>20}")
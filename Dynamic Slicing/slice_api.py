@@ -0,0 +1,75 @@
+import json
+import math
+
+from ryu.app.wsgi import ControllerBase, Response, route
+
+from admission import AdmissionError
+
+SLICE_API_INSTANCE = 'slice_api_app'
+
+
+def _json(body, status=200):
+    return Response(content_type='application/json', text=json.dumps(body), status=status)
+
+
+def _reservation_dict(reservation):
+    return {
+        'id': reservation.id,
+        'src': reservation.src,
+        'dst': reservation.dst,
+        'rate_mbps': reservation.rate_bps / 1e6,
+        'path': [{'dpid': d, 'in_port': i, 'out_port': o} for d, i, o in reservation.path],
+    }
+
+
+class SliceRestController(ControllerBase):
+    """REST API degli slice con banda garantita.
+
+    POST   /slices        {"src": "h1", "dst": "h3", "rate_mbps": 2}
+    GET    /slices
+    GET    /slices/<id>
+    DELETE /slices/<id>
+    """
+
+    def __init__(self, req, link, data, **config):
+        super(SliceRestController, self).__init__(req, link, data, **config)
+        self.app = data[SLICE_API_INSTANCE]
+
+    @route('slices', '/slices', methods=['GET'])
+    def list_slices(self, req, **kwargs):
+        return _json([_reservation_dict(r) for r in self.app.admission.reservations.values()])
+
+    @route('slices', '/slices/{slice_id}', methods=['GET'], requirements={'slice_id': r'\d+'})
+    def get_slice(self, req, slice_id, **kwargs):
+        reservation = self.app.admission.reservations.get(int(slice_id))
+        if reservation is None:
+            return _json({'error': f"Slice {slice_id} inesistente"}, status=404)
+        return _json(_reservation_dict(reservation))
+
+    @route('slices', '/slices', methods=['POST'])
+    def create_slice(self, req, **kwargs):
+        try:
+            body = req.json if req.body else {}
+            src, dst = body['src'], body['dst']
+            if not (isinstance(src, str) and isinstance(dst, str)):
+                raise TypeError(src, dst)
+            rate_bps = float(body['rate_mbps']) * 1e6
+            if not math.isfinite(rate_bps):
+                raise ValueError(rate_bps)
+        except (ValueError, KeyError, TypeError):
+            return _json({'error': "Attesi src, dst e rate_mbps"}, status=400)
+        try:
+            reservation = self.app.reserve_slice(src, dst, rate_bps)
+        except AdmissionError as e:
+            return _json({'error': str(e)}, status=409)
+        except ValueError as e:
+            return _json({'error': str(e)}, status=400)
+        return _json(_reservation_dict(reservation), status=201)
+
+    @route('slices', '/slices/{slice_id}', methods=['DELETE'], requirements={'slice_id': r'\d+'})
+    def delete_slice(self, req, slice_id, **kwargs):
+        try:
+            reservation = self.app.release_slice(int(slice_id))
+        except KeyError:
+            return _json({'error': f"Slice {slice_id} inesistente"}, status=404)
+        return _json(_reservation_dict(reservation))
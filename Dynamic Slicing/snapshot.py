@@ -0,0 +1,59 @@
+import json
+import os
+import zlib
+
+SNAPSHOT_INTERVAL = 10  # secondi tra due salvataggi
+
+
+class StateSnapshot(object):
+    """Snapshot compatto (JSON compresso) dello stato appreso dal controller"""
+
+    def __init__(self, path, interval=SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._last_crc = None
+
+    def load(self):
+        """Ritorna lo stato salvato, dict vuoto se assente o corrotto"""
+        try:
+            with open(self.path, 'rb') as f:
+                raw = zlib.decompress(f.read())
+            state = json.loads(raw.decode())
+        except (OSError, ValueError, zlib.error):
+            return {}
+        self._last_crc = zlib.crc32(raw)
+        return state
+
+    def save(self, state):
+        """Scrive lo stato in modo atomico; False se invariato dall'ultimo salvataggio"""
+        raw = json.dumps(state, separators=(',', ':'), sort_keys=True).encode()
+        crc = zlib.crc32(raw)
+        if crc == self._last_crc:
+            return False
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(zlib.compress(raw))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._last_crc = crc
+        return True
+
+
+# ---- conversioni da/verso strutture serializzabili in JSON ----
+
+def pack_mac_table(mac_to_port):
+    return {str(dpid): dict(macs) for dpid, macs in mac_to_port.items()}
+
+
+def unpack_mac_table(data):
+    return {int(dpid): dict(macs) for dpid, macs in data.items()}
+
+
+def pack_port_stats(port_stats):
+    return [[dpid, port] + list(value)
+            for (dpid, port), value in port_stats.items() if value]
+
+
+def unpack_port_stats(data):
+    return {(row[0], row[1]): tuple(row[2:]) for row in data}
@@ -1,4 +1,5 @@
 
+import sys
 import threading
 import random
 import time
@@ -49,6 +50,19 @@ class Environment(object):
         self.net.build()
         self.net.start()
         
+    def enable_sflow(self, target='127.0.0.1:6343', sampling=64, polling=1, header=128):
+        """Esporta verso il collector sFlow 1 pacchetto ogni `sampling` e i contatori ogni `polling` s"""
+        info(f"[NET-DEF] sFlow verso {target}: campionamento 1/{sampling}, contatori ogni {polling} s\n")
+        cmd = (f'ovs-vsctl -- --id=@sflow create sflow agent=lo target="\\"{target}\\"" '
+               f'header={header} sampling={sampling} polling={polling}')
+        for sw in self.net.switches:
+            cmd += f' -- set bridge {sw.name} sflow=@sflow'
+        self.net.switches[0].cmd(cmd)
+
+    def disable_sflow(self):
+        for sw in self.net.switches:
+            sw.cmd(f'ovs-vsctl clear bridge {sw.name} sflow')
+
     def stop(self):
         """Ferma la rete e pulisce eventuali residui"""
         if hasattr(self, 'net'):
@@ -64,6 +78,8 @@ if __name__ == '__main__':
     info('[MAIN] Starting the environment\n')
     
     env = Environment()
+    if '--sflow' in sys.argv:
+        env.enable_sflow()
 
     info("[MAIN] Running CLI\n")
     CLI(env.net)
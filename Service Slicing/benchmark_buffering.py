@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Byte sul canale di controllo e latenza dei packet-in, con e senza buffering.
+
+Per ogni dimensione di frame costruisce i messaggi reali (packet-in con match
+in_port + metadata, packet-out con un'azione di output) e misura il costo di
+parsing lato controller con il parser OpenFlow di Ryu. La latenza sotto
+carico è simulata con arrivi di Poisson su un canale di controllo full-duplex
+di banda CHANNEL_BPS: coda sul verso switch -> controller, elaborazione,
+coda sul verso controller -> switch.
+
+    python3 benchmark_buffering.py [banda_canale_mbps]
+"""
+import random
+import struct
+import sys
+import time
+
+from ryu.lib.packet import packet
+from ryu.ofproto import ofproto_parser
+from ryu.ofproto import ofproto_v1_3 as ofproto
+from ryu.ofproto import ofproto_v1_3_parser as parser
+
+from controller_serv import MISS_SEND_LEN, UDP_PORT_STREAMING
+
+CHANNEL_BPS = 100_000_000
+FRAME_SIZES = (64, 512, 1500)
+LOADS = (1000, 5000, 10000)  # packet-in al secondo
+EVENTS = 20000
+
+
+class _Datapath(object):
+    ofproto = ofproto
+    ofproto_parser = parser
+    id = 1
+
+
+def _frame(size):
+    eth = bytes.fromhex('000000000003' '000000000001') + struct.pack('!H', 0x0800)
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, size - 14, 0, 0, 64, 17, 0,
+                     bytes([10, 0, 0, 1]), bytes([10, 0, 0, 3]))
+    udp = struct.pack('!HHHH', 40000, UDP_PORT_STREAMING, size - 34, 0)
+    return eth + ip + udp + bytes(size - 42)
+
+
+def _packet_in(data, total_len, buffer_id):
+    match = parser.OFPMatch(in_port=1, metadata=1)
+    buf = bytearray(ofproto.OFP_HEADER_SIZE + 16)
+    match_len = match.serialize(buf, len(buf))
+    buf += bytes(2) + data
+    struct.pack_into(ofproto.OFP_HEADER_PACK_STR, buf, 0, ofproto.OFP_VERSION,
+                     ofproto.OFPT_PACKET_IN, len(buf), 0)
+    struct.pack_into('!IHBBQ', buf, ofproto.OFP_HEADER_SIZE, buffer_id, total_len,
+                     ofproto.OFPR_NO_MATCH, 1, 0)
+    assert len(buf) == ofproto.OFP_HEADER_SIZE + 16 + match_len + 2 + len(data)
+    return bytes(buf)
+
+
+def _packet_out(msg):
+    datapath = _Datapath()
+    out = parser.OFPPacketOut(
+        datapath=datapath,
+        buffer_id=msg.buffer_id,
+        in_port=msg.match['in_port'],
+        actions=[parser.OFPActionOutput(2)],
+        data=None if msg.buffer_id != ofproto.OFP_NO_BUFFER else msg.data
+    )
+    out.set_xid(0)
+    out.serialize()
+    return out.buf
+
+
+def _handle(buf):
+    """Parsing del packet-in e costruzione del packet-out, come nel controller"""
+    version, msg_type, msg_len, xid = struct.unpack_from(ofproto.OFP_HEADER_PACK_STR, buf)
+    msg = ofproto_parser.msg(_Datapath(), version, msg_type, msg_len, xid, buf)
+    packet.Packet(msg.data)
+    return _packet_out(msg)
+
+
+def measure(size, buffered, repeat=2000):
+    """(byte packet-in, byte packet-out, tempo di elaborazione in s)"""
+    data = _frame(size)
+    if buffered:
+        pin = _packet_in(data[:MISS_SEND_LEN], len(data), 1)
+    else:
+        pin = _packet_in(data, len(data), ofproto.OFP_NO_BUFFER)
+    pout = _handle(pin)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _handle(pin)
+    return len(pin), len(pout), (time.perf_counter() - start) / repeat
+
+
+def simulate(rate, up_bytes, down_bytes, service, bps, seed=1):
+    """Latenze (s) di EVENTS packet-in con tre code FIFO in serie"""
+    rnd = random.Random(seed)
+    t = up_free = cpu_free = down_free = 0.0
+    latencies = []
+    for _ in range(EVENTS):
+        t += rnd.expovariate(rate)
+        up_free = max(t, up_free) + up_bytes * 8 / bps
+        cpu_free = max(up_free, cpu_free) + service
+        down_free = max(cpu_free, down_free) + down_bytes * 8 / bps
+        latencies.append(down_free - t)
+    latencies.sort()
+    return sum(latencies) / len(latencies), latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    bps = float(sys.argv[1]) * 1e6 if len(sys.argv) > 1 else CHANNEL_BPS
+    print(f"canale di controllo {bps / 1e6:.0f} Mbps, miss_send_len={MISS_SEND_LEN}")
+    print(f"{'frame':>6} {'modalità':<10} {'pkt-in B':>9} {'pkt-out B':>10} {'elab. us':>9} "
+          f"{'carico/s':>9} {'canale %':>9} {'lat. media ms':>14} {'p99 ms':>8}")
+    for size in FRAME_SIZES:
+        for buffered in (False, True):
+            up, down, service = measure(size, buffered)
+            name = 'buffer' if buffered else 'no-buffer'
+            for rate in LOADS:
+                util = rate * max(up, down) * 8 / bps
+                if util >= 1 or rate * service >= 1:
+                    mean = p99 = float('inf')
+                else:
+                    mean, p99 = simulate(rate, up, down, service, bps)
+                print(f"{size:>6} {name:<10} {up:>9} {down:>10} {service * 1e6:>9.1f} "
+                      f"{rate:>9} {util * 100:>8.1f}% {mean * 1e3:>14.3f} {p99 * 1e3:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
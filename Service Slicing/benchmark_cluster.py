@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Benchmark del throughput di packet-in al variare del numero di istanze.
+
+Ogni istanza è un processo separato con un RyuController di controller_serv
+in modalità cluster sullo stesso store sqlite. Gli switch sono simulati: i
+messaggi inviati dal controller vengono serializzati e scartati, quelli
+ricevuti sono costruiti in byte e analizzati con il parser di Ryu come farebbe
+il Datapath. Dopo l'handshake (features, role reply, flow table vuota) ogni
+istanza elabora con _packet_in_handler i packet-in degli switch di cui è
+master, con il limite di packet-in per switch disattivato.
+
+    python3 benchmark_cluster.py [max_istanze]
+"""
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+from ryu.controller import ofp_event
+from ryu.lib import hub
+from ryu.ofproto import ofproto_parser, ofproto_v1_3 as ofproto, ofproto_v1_3_parser as parser
+
+import controller_serv
+from cluster import ShardManager
+from flow_setup import FlowSetup
+from state_store import SqliteStore
+
+NUM_SWITCHES = 64
+NUM_HOSTS = 256
+EVENTS_PER_SWITCH = 4000
+UDP_PORT_STREAMING = 9999
+
+
+def _mac(i):
+    return struct.pack('!HI', 0, i + 1)
+
+
+def _frame(src, dst, udp_dst):
+    eth = _mac(dst) + _mac(src) + struct.pack('!H', 0x0800)
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 28, 0, 0, 64, 17, 0,
+                     bytes([10, 0, src >> 8, src & 0xff]), bytes([10, 0, dst >> 8, dst & 0xff]))
+    return eth + ip + struct.pack('!HHHH', 40000, udp_dst, 8, 0)
+
+
+def _workload(dpid):
+    # ogni host è raggiungibile da una porta fissa dello switch
+    rnd = random.Random(dpid)
+    events = []
+    for _ in range(EVENTS_PER_SWITCH):
+        src, dst = rnd.randrange(NUM_HOSTS), rnd.randrange(NUM_HOSTS)
+        udp_dst = UDP_PORT_STREAMING if rnd.random() < 0.3 else 5001
+        events.append(((src + dpid) % 4 + 1, _frame(src, dst, udp_dst)))
+    return events
+
+
+class _Datapath(object):
+    """Switch simulato: i messaggi inviati vengono solo serializzati"""
+    ofproto = ofproto
+    ofproto_parser = parser
+
+    def __init__(self, dpid):
+        self.id = dpid
+        self.xid = 0
+        self.sent = 0
+
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send_msg(self, msg):
+        if msg.xid is None:
+            self.set_xid(msg)
+        msg.serialize()
+        self.sent += 1
+
+
+def _packet_in(in_port, data):
+    match = parser.OFPMatch(in_port=in_port)
+    buf = bytearray(ofproto.OFP_HEADER_SIZE + 16)
+    match.serialize(buf, len(buf))
+    buf += bytes(2) + data
+    struct.pack_into(ofproto.OFP_HEADER_PACK_STR, buf, 0, ofproto.OFP_VERSION,
+                     ofproto.OFPT_PACKET_IN, len(buf), 0)
+    struct.pack_into('!IHBBQ', buf, ofproto.OFP_HEADER_SIZE, ofproto.OFP_NO_BUFFER, len(data),
+                     ofproto.OFPR_NO_MATCH, controller_serv.TABLE_SOURCE, 0)
+    return bytes(buf)
+
+
+def _controller(instance_id, db_path):
+    controller_serv.CLUSTER_STORE = f'sqlite:///{db_path}'
+    controller_serv.INSTANCE_ID = instance_id
+    spawn = hub.spawn
+    hub.spawn = lambda *args, **kwargs: None  # niente heartbeat periodico né report
+    try:
+        app = controller_serv.RyuController()
+    finally:
+        hub.spawn = spawn
+    # si misura l'elaborazione, non il token bucket
+    app.flow_setup = FlowSetup(rate=float('inf'), burst=float('inf'))
+    return app
+
+
+def _connect(app, dpid):
+    """Handshake di uno switch: features, ruolo confermato, flow table vuota"""
+    dp = _Datapath(dpid)
+    app.switch_features_handler(ofp_event.EventOFPSwitchFeatures(
+        parser.OFPSwitchFeatures(dp, datapath_id=dpid, n_buffers=0, n_tables=254)))
+    pending = app.role_requests.get(dpid)
+    if pending is not None:
+        master, xid = pending
+        reply = parser.OFPRoleReply(
+            dp, ofproto.OFPCR_ROLE_MASTER if master else ofproto.OFPCR_ROLE_SLAVE, 0)
+        reply.xid = xid
+        app.role_reply_handler(ofp_event.EventOFPRoleReply(reply))
+    if app.roles.get(dpid):
+        stats = parser.OFPFlowStatsReply(dp)
+        stats.body, stats.flags = [], 0
+        app.flow_stats_reply_handler(ofp_event.EventOFPFlowStatsReply(stats))
+    return dp
+
+
+def _instance(instance_id, db_path, barrier, results):
+    app = _controller(instance_id, db_path)
+    barrier.wait()  # tutte le istanze registrate prima di calcolare gli shard
+    app.shards.heartbeat()
+    dps = {dpid: _connect(app, dpid) for dpid in range(1, NUM_SWITCHES + 1)}
+    owned = [dpid for dpid in dps if app.roles.get(dpid)]
+    events = [(dps[dpid], _packet_in(in_port, data))
+              for dpid in owned for in_port, data in _workload(dpid)]
+    barrier.wait()
+
+    start = time.perf_counter()
+    for dp, buf in events:
+        version, msg_type, msg_len, xid = ofproto_parser.header(buf)
+        msg = ofproto_parser.msg(dp, version, msg_type, msg_len, xid, buf)
+        app._packet_in_handler(ofp_event.EventOFPPacketIn(msg))
+    elapsed = time.perf_counter() - start
+    app._publish_stats()
+    results.put((instance_id, len(owned), len(events), elapsed))
+
+
+def run(n_instances):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'cluster.db')
+        SqliteStore(db_path)
+        barrier = multiprocessing.Barrier(n_instances)
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_instance,
+                                         args=(f'bench-{i}', db_path, barrier, results))
+                 for i in range(n_instances)]
+        for p in procs:
+            p.start()
+        rows = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+        # failover: un'istanza smette di mandare heartbeat, i suoi shard si spostano
+        store = SqliteStore(db_path)
+        shards = ShardManager(store, 'bench-0', timeout=60)
+        before = shards.assignment(range(1, NUM_SWITCHES + 1))
+        store.hdel('cluster:members', f'bench-{n_instances - 1}')
+        after = shards.assignment(range(1, NUM_SWITCHES + 1))
+        moved = sum(1 for d in before if before[d] != after[d])
+    total = sum(r[2] for r in rows)
+    wall = max(r[3] for r in rows)
+    return total, wall, moved
+
+
+def main():
+    max_instances = int(sys.argv[1]) if len(sys.argv) > 1 else min(4, os.cpu_count() or 1)
+    print(f"{'istanze':>8} {'packet-in':>10} {'tempo (s)':>10} {'pkt-in/s':>12} {'speedup':>8} {'shard spostati':>15}")
+    base = None
+    for n in range(1, max_instances + 1):
+        total, wall, moved = run(n)
+        rate = total / wall
+        base = base or rate
+        print(f"{n:>8} {total:>10} {wall:>10.3f} {rate:>12.0f} {rate / base:>8.2f} {moved if n > 1 else '-':>15}")
+
+
+if __name__ == '__main__':
+    main()
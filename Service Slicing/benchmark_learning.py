@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Confronto tra il learning per coppia (in_port, src, dst) e quello a due tabelle.
+
+Simula lo slice best-effort (s1 - s3 - s4) con N host divisi tra s1 e s4 e
+traffico tra tutte le coppie di host, in ordine casuale e con risposta.
+Per ciascun approccio conta i packet-in e le regole installate, riproducendo
+la logica del controller:
+
+- per coppia: al packet-in si apprende la sorgente e, se l'uscita è univoca,
+  si installa una regola (in_port, eth_src, eth_dst) -> porta;
+- due tabelle: al packet-in (sorgente sconosciuta) si installa la regola
+  sorgente (in_port, eth_src) e quella di inoltro eth_dst -> porta; le
+  destinazioni sconosciute fanno flood sullo switch senza controller.
+
+    python3 benchmark_learning.py [numero_host ...]
+"""
+import random
+import sys
+
+# topologia dello slice inferiore: (switch, porta) <-> (switch, porta)
+LINKS = {(1, 4): (3, 1), (3, 1): (1, 4), (3, 2): (4, 2), (4, 2): (3, 2)}
+SLICE_LINKS = {1: {4}, 3: {1, 2}, 4: {2}}
+FIRST_HOST_PORT = 5
+PACKETS_PER_PAIR = 3
+
+
+class PairLearning(object):
+    """Comportamento precedente: una regola per (in_port, src, dst)"""
+
+    def __init__(self, host_ports):
+        self.host_ports = host_ports
+        self.tables = {dpid: {} for dpid in SLICE_LINKS}
+        self.mac_to_port = {dpid: {} for dpid in SLICE_LINKS}
+        self.packet_in = 0
+
+    def forward(self, dpid, in_port, src, dst):
+        out = self.tables[dpid].get((in_port, src, dst))
+        if out is not None:
+            return [out]
+        self.packet_in += 1
+        self.mac_to_port[dpid][src] = in_port
+        if dst in self.mac_to_port[dpid]:
+            ports = [self.mac_to_port[dpid][dst]]
+        else:
+            ports = [p for p in sorted(self.host_ports.get(dpid, set()) | SLICE_LINKS[dpid])
+                     if p != in_port]
+        if len(ports) == 1:
+            self.tables[dpid][(in_port, src, dst)] = ports[0]
+        return ports
+
+    def rules(self):
+        return {dpid: len(t) for dpid, t in self.tables.items()}
+
+
+class TwoTableLearning(object):
+    """Tabella sorgenti (in_port, src) + tabella inoltro dst"""
+
+    def __init__(self, host_ports):
+        self.host_ports = host_ports
+        self.sources = {dpid: set() for dpid in SLICE_LINKS}
+        self.forwarding = {dpid: {} for dpid in SLICE_LINKS}
+        self.packet_in = 0
+
+    def forward(self, dpid, in_port, src, dst):
+        if (in_port, src) not in self.sources[dpid]:
+            self.packet_in += 1
+            self.sources[dpid].add((in_port, src))
+            self.forwarding[dpid][src] = in_port
+        out = self.forwarding[dpid].get(dst)
+        if out is not None:
+            return [out]
+        return [p for p in sorted(self.host_ports.get(dpid, set()) | SLICE_LINKS[dpid])
+                if p != in_port]
+
+    def rules(self):
+        return {dpid: len(self.sources[dpid]) + len(self.forwarding[dpid]) for dpid in SLICE_LINKS}
+
+
+def send(model, hosts, src, dst):
+    """Percorre la rete a partire dall'host sorgente seguendo le uscite del modello"""
+    dpid, port = hosts[src]
+    frontier = [(dpid, port)]
+    while frontier:
+        dpid, in_port = frontier.pop()
+        for out in model.forward(dpid, in_port, src, dst):
+            if (dpid, out) in LINKS:
+                frontier.append(LINKS[(dpid, out)])
+
+
+def run(n_hosts, seed=1):
+    hosts, host_ports = {}, {1: set(), 4: set()}
+    for i in range(n_hosts):
+        dpid = 1 if i % 2 == 0 else 4
+        port = FIRST_HOST_PORT + i // 2
+        hosts[f"00:00:00:00:{i >> 8:02x}:{i & 0xff:02x}"] = (dpid, port)
+        host_ports[dpid].add(port)
+
+    macs = list(hosts)
+    pairs = [(a, b) for a in macs for b in macs if a != b] * PACKETS_PER_PAIR
+    random.Random(seed).shuffle(pairs)
+
+    results = []
+    for model in (PairLearning(host_ports), TwoTableLearning(host_ports)):
+        for src, dst in pairs:
+            send(model, hosts, src, dst)
+            send(model, hosts, dst, src)
+        rules = model.rules()
+        results.append((type(model).__name__, model.packet_in, sum(rules.values()), max(rules.values())))
+    return results
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [4, 16, 64, 128]
+    print(f"{'host':>5} {'approccio':<18} {'packet-in':>10} {'regole':>8} {'max/switch':>11}")
+    for n in sizes:
+        for name, packet_in, rules, max_rules in run(n):
+            print(f"{n:>5} {name:<18} {packet_in:>10} {rules:>8} {max_rules:>11}")
+
+
+if __name__ == '__main__':
+    main()
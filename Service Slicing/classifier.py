@@ -0,0 +1,96 @@
+import ipaddress
+
+# campi di trasporto che accettano un valore singolo o un intervallo (min, max)
+PORT_FIELDS = {
+    'udp_dst': 17, 'udp_src': 17,
+    'tcp_dst': 6, 'tcp_src': 6,
+}
+IP_FIELDS = ('ipv4_src', 'ipv4_dst')
+
+
+def port_range_masks(lo, hi):
+    """Copre l'intervallo [lo, hi] con il minimo numero di coppie (valore, maschera).
+
+    Un valore singolo è restituito senza maschera, così da funzionare anche
+    sugli switch che non supportano il match mascherato delle porte.
+    """
+    result = []
+    while lo <= hi:
+        size = lo & -lo if lo else 1 << 16
+        while size > hi - lo + 1:
+            size >>= 1
+        if size == 1:
+            result.append(lo)
+        else:
+            result.append((lo, 0xffff & ~(size - 1)))
+        lo += size
+    return result
+
+
+def _prefix(value):
+    net = ipaddress.ip_network(value, strict=False)
+    if net.prefixlen == 32:
+        return str(net.network_address)
+    return (str(net.network_address), str(net.netmask))
+
+
+def compile_class(service_class):
+    """Traduce una classe di servizio nella lista di match OpenFlow equivalenti.
+
+    Tutti i criteri della classe sono in AND; un intervallo di porte o una
+    lista di valori DSCP produce più match (in OR).
+    """
+    base = {'eth_type': 0x0800}
+    variants = [{}]
+    for field, value in service_class.items():
+        if field in ('name', 'slice'):
+            continue
+        if field in PORT_FIELDS:
+            proto = PORT_FIELDS[field]
+            if base.get('ip_proto', proto) != proto:
+                raise ValueError(f"Classe {service_class['name']}: protocolli in conflitto")
+            base['ip_proto'] = proto
+            values = port_range_masks(*value) if isinstance(value, tuple) else [value]
+        elif field == 'ip_dscp':
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        elif field in IP_FIELDS:
+            values = [_prefix(value)]
+        else:
+            raise ValueError(f"Classe {service_class['name']}: campo non supportato {field}")
+        variants = [dict(v, **{field: x}) for v in variants for x in values]
+    return [dict(base, **v) for v in variants]
+
+
+def _field_matches(expected, actual):
+    if actual is None:
+        return False
+    if isinstance(expected, tuple):
+        value, mask = expected
+        if isinstance(value, str):
+            value, mask, actual = (int(ipaddress.ip_address(x)) for x in (value, mask, actual))
+        return actual & mask == value & mask
+    if isinstance(expected, str):
+        return ipaddress.ip_address(expected) == ipaddress.ip_address(actual)
+    return actual == expected
+
+
+class Classifier(object):
+    """Insieme ordinato di classi di servizio: la prima che corrisponde vince"""
+
+    def __init__(self, service_classes, slice_ids, default_slice):
+        self.slice_ids = slice_ids
+        self.default_slice = default_slice
+        self.rules = []  # (priorità, nome classe, slice, campi del match)
+        n = len(service_classes)
+        for i, service_class in enumerate(service_classes):
+            if service_class['slice'] not in slice_ids:
+                raise ValueError(f"Classe {service_class['name']}: slice sconosciuto {service_class['slice']}")
+            for fields in compile_class(service_class):
+                self.rules.append((n - i, service_class['name'], service_class['slice'], fields))
+
+    def classify(self, headers):
+        """Slice di un pacchetto dati i suoi campi (stessi nomi dei campi OpenFlow)"""
+        for _, _, slice_name, fields in self.rules:
+            if all(_field_matches(v, headers.get(k)) for k, v in fields.items()):
+                return slice_name
+        return self.default_slice
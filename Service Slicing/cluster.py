@@ -0,0 +1,51 @@
+import time
+import zlib
+
+HEARTBEAT_INTERVAL = 1   # secondi tra due heartbeat
+HEARTBEAT_TIMEOUT = 3    # oltre questo ritardo un'istanza è considerata morta
+
+MEMBERS_KEY = 'cluster:members'
+CLUSTER_KEY = 'cluster'
+
+
+class ShardManager(object):
+    """Assegna i dpid alle istanze vive del cluster.
+
+    Ogni istanza pubblica un heartbeat nello store condiviso; la proprietà di
+    un dpid è decisa con rendezvous hashing sulle istanze vive, così che la
+    caduta di un'istanza sposti solo i suoi shard e tutte le istanze arrivino
+    alla stessa assegnazione senza coordinarsi.
+    """
+
+    def __init__(self, store, instance_id, timeout=HEARTBEAT_TIMEOUT):
+        self.store = store
+        self.instance_id = instance_id
+        self.timeout = timeout
+
+    def heartbeat(self):
+        self.store.hset(MEMBERS_KEY, self.instance_id, time.time())
+
+    def leave(self):
+        self.store.hdel(MEMBERS_KEY, self.instance_id)
+
+    def live_members(self):
+        now = time.time()
+        members = [m for m, ts in self.store.hgetall(MEMBERS_KEY).items()
+                   if now - ts <= self.timeout]
+        if self.instance_id not in members:
+            members.append(self.instance_id)
+        return sorted(members)
+
+    @staticmethod
+    def owner(dpid, members):
+        """Istanza proprietaria di un dpid (rendezvous hashing)"""
+        return max(members, key=lambda m: (zlib.crc32(f"{m}/{dpid}".encode()), m))
+
+    def assignment(self, dpids):
+        """Ritorna {dpid: istanza proprietaria} per i dpid indicati"""
+        members = self.live_members()
+        return {dpid: self.owner(dpid, members) for dpid in dpids}
+
+    def next_generation(self):
+        """generation_id crescente per le OFPRoleRequest di tutto il cluster"""
+        return self.store.hincrby(CLUSTER_KEY, 'generation')
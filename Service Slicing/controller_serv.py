@@ -1,12 +1,79 @@
 from ryu.base import app_manager
 from ryu.controller import ofp_event
-from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
+from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
 from ryu.lib.packet import packet
-from ryu.lib.packet import ethernet, ipv4, udp
+from ryu.lib.packet import ethernet, ipv4, tcp, udp
+from ryu.lib import hub
+from classifier import Classifier
+from flow_sync import FlowEntry, flow_key, entries_from_stats, diff_flows, send_flow_mods
+from snapshot import StateSnapshot, pack_mac_table, unpack_mac_table
+from state_store import open_store
+from cluster import ShardManager, HEARTBEAT_INTERVAL
+from flow_setup import FlowSetup
+import os
+import socket
 
 UDP_PORT_STREAMING = 9999
+SNAPSHOT_PATH = 'controller_serv.snapshot'
+PRIORITY_LEARNED = 1
+PRIORITY_CLASS = 100
+
+# pipeline: la tabella 0 classifica il traffico scrivendo lo slice nel
+# metadata, la tabella 1 riconosce le sorgenti già apprese (le altre vanno al
+# controller), la tabella 2 inoltra in base a slice + MAC di destinazione e
+# fa flood nello slice se la destinazione non è ancora nota
+TABLE_CLASSIFY = 0
+TABLE_SOURCE = 1
+TABLE_FORWARD = 2
+METADATA_MASK = 0xff
+
+# packet-in bufferizzati: lo switch trattiene il pacchetto e manda al
+# controller solo i primi MISS_SEND_LEN byte (le intestazioni), il packet-out
+# lo rilascia con il buffer_id. Gli switch senza buffer ricevono NO_BUFFER
+PACKET_IN_BUFFERED = True
+MISS_SEND_LEN = 128
+
+FLOW_SETUP_REPORT_INTERVAL = 10  # secondi tra due report di packet-in duplicati/scartati
+
+SLICE_IDS = {'up': 1, 'down': 2}
+DEFAULT_SLICE = 'down'
+
+# classi di servizio -> slice, in ordine di priorità (la prima che corrisponde vince).
+# Campi: udp_dst/udp_src/tcp_dst/tcp_src (valore o intervallo (min, max)),
+# ip_dscp (valore o lista), ipv4_src/ipv4_dst (prefisso "a.b.c.d/len")
+SERVICE_CLASSES = [
+    {'name': 'video', 'slice': 'up', 'udp_dst': UDP_PORT_STREAMING},
+    # {'name': 'rtp', 'slice': 'up', 'udp_dst': (16384, 16511)},
+    # {'name': 'voce', 'slice': 'up', 'ip_dscp': 46},
+    # {'name': 'backup', 'slice': 'down', 'ipv4_dst': '10.0.0.0/30', 'tcp_dst': 873},
+]
+
+# definizione porte host
+HOST_PORTS = {
+    1: {1, 2},   # h1,h2
+    4: {3, 4}    # h3,h4
+}
+
+# link usati da ogni slice su ciascuno switch
+SLICE_LINKS = {
+    'up': {          # s1 - s2 - s4
+        1: {3},
+        2: {1, 2},
+        4: {1}
+    },
+    'down': {        # s1 - s3 - s4
+        1: {4},
+        3: {1, 2},
+        4: {2}
+    },
+}
+
+# modalità cluster: più istanze si dividono i dpid condividendo lo stato
+# es. SLICING_CLUSTER_STORE=sqlite:///tmp/slicing.db oppure redis://host:6379/0
+CLUSTER_STORE = os.environ.get('SLICING_CLUSTER_STORE')
+INSTANCE_ID = os.environ.get('SLICING_INSTANCE_ID', f"{socket.gethostname()}-{os.getpid()}")
 
 class RyuController(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
@@ -14,91 +81,377 @@ class RyuController(app_manager.RyuApp):
     def __init__(self, *args, **kwargs):
         super(RyuController, self).__init__(*args, **kwargs)
         self.mac_to_port = {}
+        self.sources = {}          # dpid -> {mac: porte da cui la sorgente è riconosciuta}
+        self.classifier = Classifier(SERVICE_CLASSES, SLICE_IDS, DEFAULT_SLICE)
+        self.slice_names = {v: k for k, v in SLICE_IDS.items()}
+        self.static_flows = {}     # dpid -> {chiave: FlowEntry}
+        self.flow_stats_body = {}  # dpid -> risposte multipart ancora incomplete
+        self.datapaths = {}
+        self.buffered = {}         # dpid -> True se i packet-in arrivano troncati e bufferizzati
+        self.roles = {}            # dpid -> True se questa istanza è master (confermato dallo switch)
+        self.role_requests = {}    # dpid -> (master, xid) della OFPRoleRequest in attesa di risposta
+        self.packet_in_count = {}  # dpid -> packet-in non ancora pubblicati nello store
+        self.flow_setup = FlowSetup()  # installazioni in corso + limite di packet-in per switch
+        self.store = None
+        if CLUSTER_STORE:
+            # lo stato condiviso sostituisce lo snapshot locale
+            self.store = open_store(CLUSTER_STORE)
+            self.shards = ShardManager(self.store, INSTANCE_ID)
+            self.shards.heartbeat()
+            self.logger.info(f"[CLUSTER] Istanza {INSTANCE_ID} su {CLUSTER_STORE}")
+            self.cluster_thread = hub.spawn(self._cluster_loop)
+        else:
+            self.snapshot = StateSnapshot(SNAPSHOT_PATH)
+            self._restore_snapshot()
+            self.snapshot_thread = hub.spawn(self._snapshot_loop)
+        self.flow_setup_thread = hub.spawn(self._flow_setup_loop)
+
+    # ---- Snapshot / warm restart ----
+    def _restore_snapshot(self):
+        state = self.snapshot.load()
+        self.mac_to_port = unpack_mac_table(state.get('mac_to_port', {}))
+        if state:
+            self.logger.info(f"[SNAPSHOT] Ripristinati {len(self.mac_to_port)} switch da {SNAPSHOT_PATH}")
+
+    def _snapshot_state(self):
+        return {
+            'mac_to_port': pack_mac_table(self.mac_to_port),
+        }
+
+    def _snapshot_loop(self):
+        """Thread periodico che salva lo stato appreso su disco"""
+        while True:
+            hub.sleep(self.snapshot.interval)
+            try:
+                self.snapshot.save(self._snapshot_state())
+            except OSError as e:
+                self.logger.warning(f"[SNAPSHOT] Salvataggio fallito: {e}")
+
+    # ---- Packet-in duplicati / scartati ----
+    def _flow_setup_loop(self):
+        """Riporta periodicamente i packet-in coalescati e scartati"""
+        while True:
+            hub.sleep(FLOW_SETUP_REPORT_INTERVAL)
+            for dpid, c in self.flow_setup.report().items():
+                self.logger.info(f"[FLOW SETUP] dpid={dpid}: packet-in={c['packet_in']} "
+                                 f"coalescati={c['coalesced']} scartati={c['dropped']}")
+                if self.store is not None:
+                    self.store.hincrby('stats:coalesced', dpid, c['coalesced'])
+                    self.store.hincrby('stats:dropped', dpid, c['dropped'])
+
+    def flow_setup_stats(self):
+        """Contatori cumulativi per switch: packet-in, coalescati, scartati"""
+        return self.flow_setup.stats()
+
+    # ---- Cluster ----
+    def _cluster_loop(self):
+        """Heartbeat, riassegnazione degli shard e pubblicazione statistiche"""
+        while True:
+            try:
+                self.shards.heartbeat()
+                self._update_roles()
+                self._publish_stats()
+            except Exception as e:
+                self.logger.warning(f"[CLUSTER] Errore store condiviso: {e}")
+            hub.sleep(HEARTBEAT_INTERVAL)
+
+    def _update_roles(self):
+        """Richiede il ruolo master/slave per ogni switch in base agli shard"""
+        for dpid, owner in self.shards.assignment(list(self.datapaths)).items():
+            master = owner == INSTANCE_ID
+            pending = self.role_requests.get(dpid)
+            if self.roles.get(dpid) == master or (pending is not None and pending[0] == master):
+                continue
+            dp = self.datapaths[dpid]
+            ofproto = dp.ofproto
+            role = ofproto.OFPCR_ROLE_MASTER if master else ofproto.OFPCR_ROLE_SLAVE
+            req = dp.ofproto_parser.OFPRoleRequest(dp, role, self.shards.next_generation())
+            dp.set_xid(req)
+            self.role_requests[dpid] = (master, req.xid)
+            dp.send_msg(req)
+            self.logger.info(f"[CLUSTER] dpid={dpid} richiesto {'MASTER' if master else 'SLAVE'}")
+
+    def _load_shared_state(self, dpid):
+        self.mac_to_port[dpid] = self.store.hgetall(f'mac:{dpid}')
+
+    def _publish_stats(self):
+        counts, self.packet_in_count = self.packet_in_count, {}
+        for dpid, n in counts.items():
+            self.store.hincrby('stats:packet_in', dpid, n)
+
+    @set_ev_cls(ofp_event.EventOFPRoleReply, MAIN_DISPATCHER)
+    def role_reply_handler(self, ev):
+        """Il ruolo vale solo quando lo switch lo conferma"""
+        msg = ev.msg
+        dp = msg.datapath
+        dpid = dp.id
+        pending = self.role_requests.get(dpid)
+        if pending is not None and pending[1] == msg.xid:
+            del self.role_requests[dpid]
+        master = msg.role == dp.ofproto.OFPCR_ROLE_MASTER
+        was_master = self.roles.get(dpid)
+        self.roles[dpid] = master
+        self.logger.info(f"[CLUSTER] dpid={dpid} -> {'MASTER' if master else 'SLAVE'} "
+                         f"generation={msg.generation_id}")
+        if master and not was_master:
+            # nuovo shard (avvio o failover): stato dallo store, poi riconciliazione
+            self._load_shared_state(dpid)
+            self._request_flow_table(dp)
+
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, MAIN_DISPATCHER)
+    def error_msg_handler(self, ev):
+        msg = ev.msg
+        dpid = msg.datapath.id
+        if msg.type != msg.datapath.ofproto.OFPET_ROLE_REQUEST_FAILED:
+            return
+        # generation superata da un'altra istanza (o ruolo rifiutato): non si è master
+        # finché lo switch non conferma; il prossimo heartbeat ripete la richiesta
+        self.role_requests.pop(dpid, None)
+        self.roles.pop(dpid, None)
+        self.logger.warning(f"[CLUSTER] dpid={dpid}: richiesta di ruolo rifiutata (code={msg.code})")
+
+    @set_ev_cls(ofp_event.EventOFPStateChange, DEAD_DISPATCHER)
+    def state_change_handler(self, ev):
+        dpid = ev.datapath.id
+        if dpid is not None:
+            self.datapaths.pop(dpid, None)
+            self.roles.pop(dpid, None)
+            self.role_requests.pop(dpid, None)
+            self.flow_setup.forget(dpid)
 
-    def add_flow(self, datapath, priority, match, actions, idle_timeout=0, flag=0):
+    def _learn_mac(self, dpid, mac, port):
+        """Registra la porta di un MAC; ritorna la porta precedente"""
+        macs = self.mac_to_port.setdefault(dpid, {})
+        prev = macs.get(mac)
+        if prev != port:
+            macs[mac] = port
+            if self.store is not None:
+                self.store.hset(f'mac:{dpid}', mac, port)
+        return prev
+
+    def _learn_source(self, dpid, mac, port):
+        """Aggiunge una porta di ingresso per il MAC; ritorna le porte da dimenticare.
+
+        Un host remoto arriva legittimamente da un link diverso per ogni slice,
+        quindi solo un cambio che coinvolge una porta host è uno spostamento.
+        """
+        ports = self.sources.setdefault(dpid, {}).setdefault(mac, set())
+        host_ports = HOST_PORTS.get(dpid, set())
+        stale = set()
+        if port in host_ports or ports & host_ports:
+            stale = ports - {port}
+            ports.clear()
+        ports.add(port)
+        self._learn_mac(dpid, mac, port)
+        return stale
+
+    def add_flow(self, datapath, priority, match, actions, idle_timeout=0, flag=0, table_id=0):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
         inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
         mod = parser.OFPFlowMod(
-            datapath=datapath, priority=priority,
+            datapath=datapath, table_id=table_id, priority=priority,
             match=match, instructions=inst,
             idle_timeout=idle_timeout, flags=flag
         )
         datapath.send_msg(mod)
 
+    def _flow_entry(self, datapath, priority, match, actions, table_id=0):
+        parser = datapath.ofproto_parser
+        inst = [parser.OFPInstructionActions(datapath.ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        return FlowEntry(table_id, priority, match, inst)
+
+    def _classify_entry(self, datapath, priority, match, slice_name):
+        """Regola della tabella di classificazione: scrive lo slice e passa all'inoltro"""
+        parser = datapath.ofproto_parser
+        inst = [parser.OFPInstructionWriteMetadata(SLICE_IDS[slice_name], METADATA_MASK),
+                parser.OFPInstructionGotoTable(TABLE_SOURCE)]
+        return FlowEntry(TABLE_CLASSIFY, priority, match, inst)
+
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
         datapath = ev.msg.datapath
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
         dpid = datapath.id
 
         self.logger.info(f"[FEATURES HANDLER] dpid={dpid}")
 
-        # regola di default: manda tutto al controller
-        match = parser.OFPMatch()
+        self.datapaths[dpid] = datapath
+        self.flow_setup.forget(dpid)
+        self.buffered[dpid] = PACKET_IN_BUFFERED and ev.msg.n_buffers > 0
+        self._set_miss_send_len(datapath)
+        self.static_flows[dpid] = {
+            flow_key(e): e for e in self._static_flows(datapath)
+        }
+        if self.store is None:
+            self._request_flow_table(datapath)
+        else:
+            # in cluster programma lo switch solo l'istanza master
+            self.roles.pop(dpid, None)
+            self.role_requests.pop(dpid, None)
+            self._update_roles()
+
+    def _miss_send_len(self, dpid):
+        if self.buffered.get(dpid):
+            return MISS_SEND_LEN
+        return ofproto_v1_3.OFPCML_NO_BUFFER
+
+    def _set_miss_send_len(self, datapath):
+        ofproto = datapath.ofproto
+        datapath.send_msg(datapath.ofproto_parser.OFPSetConfig(
+            datapath, ofproto.OFPC_FRAG_NORMAL, self._miss_send_len(datapath.id)))
+
+    def _disable_buffering(self, datapath):
+        """Torna ai packet-in completi: lo switch ha esaurito (o non ha) i buffer"""
+        dpid = datapath.id
+        self.logger.warning(f"[BUFFERING] dpid={dpid}: packet-in troncato senza buffer, uso NO_BUFFER")
+        self.buffered[dpid] = False
+        self._set_miss_send_len(datapath)
+        static_flows = {flow_key(e): e for e in self._static_flows(datapath)}
+        _, modify, _ = diff_flows(static_flows, self.static_flows.get(dpid, {}))
+        self.static_flows[dpid] = static_flows
+        send_flow_mods(datapath, modify=modify)
+
+    def _request_flow_table(self, datapath):
+        # le regole non vengono inviate subito: prima si legge la flow table
+        # dello switch e si installano solo le differenze (vedi _reconcile)
+        self.flow_stats_body[datapath.id] = []
+        datapath.send_msg(datapath.ofproto_parser.OFPFlowStatsRequest(datapath))
+
+    def _static_flows(self, datapath):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        flows = []
+
+        # tabella 0: una regola per classe di servizio, uguale su tutti gli switch
+        for priority, _, slice_name, fields in self.classifier.rules:
+            match = parser.OFPMatch(**fields)
+            flows.append(self._classify_entry(datapath, PRIORITY_CLASS + priority, match, slice_name))
+        flows.append(self._classify_entry(datapath, 0, parser.OFPMatch(), DEFAULT_SLICE))
+
+        # tabella 1: sorgente non ancora appresa -> controller
         actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
-                                          ofproto.OFPCML_NO_BUFFER)]
-        self.add_flow(datapath, priority=0, match=match, actions=actions)
-
-        # impostazioni specifiche per UDP:9999 (piano "up")
-        if dpid == 1:
-            for host_port in [1, 2]:  # h1,h2
-                match = parser.OFPMatch(
-                    in_port=host_port,
-                    eth_type=0x0800,
-                    ip_proto=17,
-                    udp_dst=UDP_PORT_STREAMING
-                )
-                actions = [parser.OFPActionOutput(3)]  # verso s2
-                self.add_flow(datapath, priority=100, match=match, actions=actions)
-
-        elif dpid == 2:
-            # s2: riceve UDP da s1 e manda a s4
-            match = parser.OFPMatch(
-                in_port=1,
-                eth_type=0x0800,
-                ip_proto=17,
-                udp_dst=UDP_PORT_STREAMING
-            )
-            actions = [parser.OFPActionOutput(2)]  # verso s4
-            self.add_flow(datapath, priority=100, match=match, actions=actions)
-            
-            # s2: riceve UDP da s4 e manda a s1
-            match = parser.OFPMatch(
-                in_port=2,
-                eth_type=0x0800,
-                ip_proto=17,
-                udp_dst=UDP_PORT_STREAMING
-            )
-            actions = [parser.OFPActionOutput(1)]  # verso s4
-            self.add_flow(datapath, priority=100, match=match, actions=actions)
-
-        elif dpid == 3:
-            # s3 non inoltra traffico UDP
-            pass
-
-        elif dpid == 4:
-            # s4: inoltra UDP verso s2
-            for host_port in [3, 4]:  # h3,h4
-                match = parser.OFPMatch(
-                    in_port=host_port,
-                    eth_type=0x0800,
-                    ip_proto=17,
-                    udp_dst=UDP_PORT_STREAMING
-                )
-                actions = [parser.OFPActionOutput(1)]  # verso s2
-                self.add_flow(datapath, priority=100, match=match, actions=actions)
+                                          self._miss_send_len(datapath.id))]
+        flows.append(self._flow_entry(datapath, 0, parser.OFPMatch(), actions, TABLE_SOURCE))
+
+        # tabella 2: destinazione non ancora nota -> flood controllato nello slice
+        for slice_name, slice_id in SLICE_IDS.items():
+            ports = self._flood_ports(datapath.id, slice_name)
+            if ports:
+                actions = [parser.OFPActionOutput(p) for p in ports]
+                match = parser.OFPMatch(metadata=slice_id)
+                flows.append(self._flow_entry(datapath, 0, match, actions, TABLE_FORWARD))
+        return flows
+
+    def _flood_ports(self, dpid, slice_name):
+        # lo switch non rimanda il pacchetto sulla porta da cui è arrivato
+        return sorted(HOST_PORTS.get(dpid, set()) | SLICE_LINKS[slice_name].get(dpid, set()))
+
+    def _source_entry(self, datapath, mac, port):
+        parser = datapath.ofproto_parser
+        inst = [parser.OFPInstructionGotoTable(TABLE_FORWARD)]
+        return FlowEntry(TABLE_SOURCE, PRIORITY_LEARNED,
+                         parser.OFPMatch(in_port=port, eth_src=mac), inst)
+
+    def _forward_entries(self, datapath, mac):
+        """Al più una regola per slice verso l'host, indipendente dalle sorgenti"""
+        parser = datapath.ofproto_parser
+        flows = []
+        for slice_name, slice_id in SLICE_IDS.items():
+            out_port = self._out_port(datapath.id, slice_name, mac)
+            if out_port is not None:
+                match = parser.OFPMatch(metadata=slice_id, eth_dst=mac)
+                actions = [parser.OFPActionOutput(out_port)]
+                flows.append(self._flow_entry(datapath, PRIORITY_LEARNED, match, actions, TABLE_FORWARD))
+        return flows
+
+    def _learned_flows(self, datapath):
+        # per host e per switch: una regola sorgente per porta di ingresso
+        # (al più una per slice) e una di inoltro per slice
+        dpid = datapath.id
+        flows = []
+        for mac, port in self.mac_to_port.get(dpid, {}).items():
+            for in_port in self.sources.get(dpid, {}).get(mac) or {port}:
+                flows.append(self._source_entry(datapath, mac, in_port))
+            flows.extend(self._forward_entries(datapath, mac))
+        return flows
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def flow_stats_reply_handler(self, ev):
+        msg = ev.msg
+        dpid = msg.datapath.id
+        if dpid not in self.flow_stats_body:
+            return
+        self.flow_stats_body[dpid].extend(msg.body)
+        if msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE:
+            return
+        self._reconcile(msg.datapath, self.flow_stats_body.pop(dpid))
+
+    def _reconcile(self, datapath, body):
+        """Allinea la flow table dello switch allo stato atteso senza svuotarla"""
+        dpid = datapath.id
+        desired = dict(self.static_flows.get(dpid, {}))
+        for e in self._learned_flows(datapath):
+            desired[flow_key(e)] = e
+        installed = entries_from_stats(body)
+
+        add, modify, delete = diff_flows(desired, installed, adopt=self._adopt_flow(dpid))
+        send_flow_mods(datapath, add, modify, delete)
+        self.logger.info(f"[RECONCILE] dpid={dpid}: installati={len(installed)} "
+                         f"add={len(add)} modify={len(modify)} delete={len(delete)}")
+
+    def _adopt_flow(self, dpid):
+        """Mantiene i flussi appresi dopo l'ultimo snapshot invece di cancellarli"""
+        def adopt(entry):
+            if entry.priority != PRIORITY_LEARNED:
+                return False
+            fields = dict(entry.match.items())
+            if entry.table_id == TABLE_SOURCE and set(fields) == {'in_port', 'eth_src'}:
+                self._learn_source(dpid, fields['eth_src'], fields['in_port'])
+                return True
+            return entry.table_id == TABLE_FORWARD and set(fields) == {'metadata', 'eth_dst'}
+        return adopt
+
+    def _headers(self, pkt):
+        """Campi del pacchetto con i nomi usati dai match OpenFlow"""
+        headers = {}
+        ip4 = pkt.get_protocol(ipv4.ipv4)
+        if ip4 is None:
+            return headers
+        headers.update(eth_type=0x0800, ip_proto=ip4.proto, ip_dscp=ip4.tos >> 2,
+                       ipv4_src=ip4.src, ipv4_dst=ip4.dst)
+        udp_pkt = pkt.get_protocol(udp.udp)
+        if udp_pkt:
+            headers.update(udp_src=udp_pkt.src_port, udp_dst=udp_pkt.dst_port)
+        tcp_pkt = pkt.get_protocol(tcp.tcp)
+        if tcp_pkt:
+            headers.update(tcp_src=tcp_pkt.src_port, tcp_dst=tcp_pkt.dst_port)
+        return headers
+
+    def _out_port(self, dpid, slice_name, dst):
+        """Porta di uscita verso dst nello slice, None se va fatto flood"""
+        port = self.mac_to_port.get(dpid, {}).get(dst)
+        if port is None:
+            return None
+        if port in HOST_PORTS.get(dpid, set()):
+            return port
+        # host remoto: sugli switch di bordo lo slice ha un solo link
+        links = SLICE_LINKS[slice_name].get(dpid, set())
+        if len(links) == 1:
+            return next(iter(links))
+        return port if port in links else None
 
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def _packet_in_handler(self, ev):
         msg = ev.msg
         datapath = msg.datapath
-        ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
         dpid = datapath.id
         in_port = msg.match['in_port']
 
+        # picco di packet-in: lo switch viene servito al massimo al ritmo del token bucket
+        if not self.flow_setup.admit(dpid):
+            return
+
         pkt = packet.Packet(msg.data)
         eth = pkt.get_protocol(ethernet.ethernet)
         if eth is None:
@@ -107,68 +460,50 @@ class RyuController(app_manager.RyuApp):
         dst = eth.dst
         src = eth.src
 
-        self.mac_to_port.setdefault(dpid, {})
-        self.mac_to_port[dpid][src] = in_port
-
-        # definizione porte host
-        host_ports = {
-            1: {1, 2},   # h1,h2
-            4: {3, 4}    # h3,h4
-        }
+        self.packet_in_count[dpid] = self.packet_in_count.get(dpid, 0) + 1
 
-        # link "up" (UDP:9999)
-        up_links = {
-            1: {3},      # s1 -> s2
-            2: {2},      # s2 -> s4
-            3: set(),    # s3 non inoltra UDP
-            4: {1}       # s4 -> s2
-        }
+        # sorgente nuova su questa porta: da ora i suoi pacchetti non passano dal controller.
+        # Se le regole sono già state inviate il packet-in è un duplicato: solo packet-out
+        setup = self.flow_setup.start(dpid, (in_port, src))
+        if setup:
+            stale = self._learn_source(dpid, src, in_port)
+            add = [self._source_entry(datapath, src, in_port)] + self._forward_entries(datapath, src)
+            delete = [self._source_entry(datapath, src, p) for p in stale]
+            send_flow_mods(datapath, add=add, delete=delete)
 
-        # link "down" (traffico normale)
-        dw_links = {
-            1: {4},      # s1 -> s3
-            3: {2},      # s3 -> s4
-            4: {2}       # s4 -> s3
-        }
+        # slice già scelto dalla tabella di classificazione (metadata),
+        # altrimenti si classifica qui con le stesse regole
+        slice_name = self.slice_names.get(msg.match.get('metadata'))
+        if slice_name is None:
+            slice_name = self.classifier.classify(self._headers(pkt))
 
         actions = []
-
-        # scelta dei link da usare
-        link_set = dw_links.get(dpid, set())
-        ip4 = pkt.get_protocol(ipv4.ipv4)
-        
-        udp_video = ip4 and ip4.proto == 17 and udp_pkt and udp_pkt.dst_port == UDP_PORT_STREAMING
-        
-        if udp_video:
-            link_set = up_links.get(dpid, set())
-        
-        if dst in self.mac_to_port[dpid]:
-            out_port = self.mac_to_port[dpid][dst]
+        out_port = self._out_port(dpid, slice_name, dst)
+        if out_port is not None:
             actions = [parser.OFPActionOutput(out_port)]
-            self.logger.info(f"[LEARNING] dpid={dpid}, {src}->{dst}, out={out_port}")
+            if setup:
+                self.logger.info(f"[LEARNING] dpid={dpid}, slice={slice_name}, {src}->{dst}, out={out_port}")
         else:
-            # flood controllato su host + link_set
-            for p in host_ports.get(dpid, set()):
+            # flood controllato su host + link dello slice
+            for p in self._flood_ports(dpid, slice_name):
                 if p != in_port:
                     actions.append(parser.OFPActionOutput(p))
-            for p in link_set:
-                if p != in_port:
-                    actions.append(parser.OFPActionOutput(p))
-            self.logger.info(f"[CONTROLLED FLOOD] dpid={dpid}, {src}->{dst}, out={[a.port for a in actions]}")
-
-        # installazione flow se univoco
-        if len(actions) == 1:
-            match = parser.OFPMatch(in_port=in_port, eth_src=src, eth_dst=dst)
-            self.add_flow(datapath, priority=1, match=match, actions=actions)
+            if setup:
+                self.logger.info(f"[CONTROLLED FLOOD] dpid={dpid}, slice={slice_name}, {src}->{dst}, out={[a.port for a in actions]}")
 
-        # invio pacchetto
+        # invio pacchetto: se è nel buffer dello switch basta il buffer_id
+        data = None
+        if msg.buffer_id == datapath.ofproto.OFP_NO_BUFFER:
+            if len(msg.data) < msg.total_len:
+                # troncato ma non bufferizzato: il pacchetto non è recuperabile
+                self._disable_buffering(datapath)
+                return
+            data = msg.data
         out = parser.OFPPacketOut(
             datapath=datapath,
             buffer_id=msg.buffer_id,
             in_port=in_port,
             actions=actions,
-            data=msg.data
+            data=data
         )
         datapath.send_msg(out)
-
-
@@ -0,0 +1,128 @@
+"""Deduplicazione delle installazioni di flusso e protezione dai picchi di packet-in.
+
+Finché una FlowMod non è attiva sullo switch, gli altri pacchetti dello
+stesso flusso continuano a finire sulla regola di table-miss: PendingFlows
+ricorda per PENDING_TTL secondi i match già installati, così quei packet-in
+vengono solo inoltrati (packet-out) senza inviare di nuovo le stesse regole.
+TokenBucket limita i packet-in elaborati per switch.
+"""
+import time
+from collections import OrderedDict
+
+PENDING_TTL = 1.0       # secondi entro cui una FlowMod inviata dovrebbe essere attiva
+PACKET_IN_RATE = 1000   # packet-in al secondo elaborati per switch
+PACKET_IN_BURST = 200   # packet-in elaborabili di seguito dopo un periodo di quiete
+COUNTERS = ('packet_in', 'coalesced', 'dropped')
+
+
+class TokenBucket(object):
+    """Limitatore a secchiello: `rate` gettoni al secondo, al massimo `burst`"""
+
+    def __init__(self, rate=PACKET_IN_RATE, burst=PACKET_IN_BURST, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.last = clock()
+
+    def consume(self, n=1):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens < n:
+            return False
+        self.tokens -= n
+        return True
+
+
+class PendingFlows(object):
+    """Match per cui la FlowMod è stata inviata da meno di `ttl` secondi"""
+
+    def __init__(self, ttl=PENDING_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()  # (dpid, match) -> scadenza, in ordine di scadenza
+
+    def _expire(self, now):
+        while self.entries:
+            key, deadline = next(iter(self.entries.items()))
+            if deadline > now:
+                break
+            del self.entries[key]
+
+    def start(self, dpid, match):
+        """True se l'installazione va fatta ora, False se è già in corso"""
+        now = self.clock()
+        self._expire(now)
+        key = (dpid, match)
+        if key in self.entries:
+            return False
+        self.entries[key] = now + self.ttl
+        return True
+
+    def discard(self, dpid, match=None):
+        """Dimentica un'installazione (o tutte quelle dello switch)"""
+        if match is not None:
+            self.entries.pop((dpid, match), None)
+            return
+        for key in [k for k in self.entries if k[0] == dpid]:
+            del self.entries[key]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class FlowSetup(object):
+    """Tabella dei flussi in installazione + limitatore per switch, con contatori"""
+
+    def __init__(self, ttl=PENDING_TTL, rate=PACKET_IN_RATE, burst=PACKET_IN_BURST,
+                 clock=time.monotonic):
+        self.pending = PendingFlows(ttl, clock)
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.buckets = {}   # dpid -> TokenBucket
+        self.counters = {}  # dpid -> {contatore: valore}
+        self._reported = {}
+
+    def _count(self, dpid, name):
+        counters = self.counters.setdefault(dpid, dict.fromkeys(COUNTERS, 0))
+        counters[name] += 1
+
+    def admit(self, dpid):
+        """True se il packet-in può essere elaborato, False se va scartato"""
+        bucket = self.buckets.get(dpid)
+        if bucket is None:
+            bucket = self.buckets[dpid] = TokenBucket(self.rate, self.burst, self.clock)
+        self._count(dpid, 'packet_in')
+        if bucket.consume():
+            return True
+        self._count(dpid, 'dropped')
+        return False
+
+    def start(self, dpid, match):
+        """True se le regole per `match` vanno inviate, False se il packet-in è un duplicato"""
+        if self.pending.start(dpid, match):
+            return True
+        self._count(dpid, 'coalesced')
+        return False
+
+    def forget(self, dpid):
+        """Switch disconnesso: le installazioni in corso non sono più valide"""
+        self.pending.discard(dpid)
+        self.buckets.pop(dpid, None)
+
+    def stats(self):
+        """Contatori cumulativi per switch"""
+        return {dpid: dict(c) for dpid, c in self.counters.items()}
+
+    def report(self):
+        """Incrementi dall'ultima chiamata, solo per gli switch con duplicati o scarti"""
+        delta = {}
+        for dpid, counters in self.counters.items():
+            prev = self._reported.get(dpid, dict.fromkeys(COUNTERS, 0))
+            diff = {k: counters[k] - prev[k] for k in COUNTERS}
+            if diff['coalesced'] or diff['dropped']:
+                delta[dpid] = diff
+            self._reported[dpid] = dict(counters)
+        return delta
@@ -0,0 +1,124 @@
+import json
+import sqlite3
+import threading
+
+# Backend di stato condiviso tra più istanze del controller.
+# L'interfaccia ricalca i comandi "hash" di Redis (hset/hget/hgetall/hdel/hincrby)
+# così che la versione locale (memoria/sqlite) e quella di produzione (Redis)
+# siano intercambiabili. I valori sono serializzati in JSON.
+
+
+class MemoryStore(object):
+    """Store in memoria: condiviso solo tra thread dello stesso processo"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def hset(self, name, key, value):
+        with self._lock:
+            self._data.setdefault(name, {})[str(key)] = json.dumps(value)
+
+    def hget(self, name, key):
+        with self._lock:
+            raw = self._data.get(name, {}).get(str(key))
+        return None if raw is None else json.loads(raw)
+
+    def hgetall(self, name):
+        with self._lock:
+            items = list(self._data.get(name, {}).items())
+        return {k: json.loads(v) for k, v in items}
+
+    def hdel(self, name, key):
+        with self._lock:
+            self._data.get(name, {}).pop(str(key), None)
+
+    def hincrby(self, name, key, amount=1):
+        with self._lock:
+            table = self._data.setdefault(name, {})
+            value = json.loads(table.get(str(key), '0')) + amount
+            table[str(key)] = json.dumps(value)
+        return value
+
+
+class SqliteStore(object):
+    """Store su file sqlite: condiviso tra processi sulla stessa macchina"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS kv ('
+                         'name TEXT, key TEXT, value TEXT, PRIMARY KEY (name, key))')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def hset(self, name, key, value):
+        with self._conn() as conn:
+            conn.execute('INSERT OR REPLACE INTO kv VALUES (?, ?, ?)',
+                         (name, str(key), json.dumps(value)))
+
+    def hget(self, name, key):
+        row = self._conn().execute('SELECT value FROM kv WHERE name=? AND key=?',
+                                   (name, str(key))).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def hgetall(self, name):
+        rows = self._conn().execute('SELECT key, value FROM kv WHERE name=?', (name,))
+        return {k: json.loads(v) for k, v in rows}
+
+    def hdel(self, name, key):
+        with self._conn() as conn:
+            conn.execute('DELETE FROM kv WHERE name=? AND key=?', (name, str(key)))
+
+    def hincrby(self, name, key, amount=1):
+        # upsert in un'unica istruzione: atomico anche tra processi diversi
+        with self._conn() as conn:
+            conn.execute('INSERT INTO kv VALUES (?, ?, ?) ON CONFLICT (name, key) '
+                         'DO UPDATE SET value = CAST(value AS INTEGER) + ?',
+                         (name, str(key), json.dumps(amount), amount))
+            row = conn.execute('SELECT value FROM kv WHERE name=? AND key=?',
+                               (name, str(key))).fetchone()
+        return json.loads(row[0])
+
+
+class RedisStore(object):
+    """Store Redis (o compatibile) per l'uso in produzione"""
+
+    def __init__(self, url):
+        import redis  # dipendenza opzionale, serve solo in questa modalità
+        self._redis = redis.Redis.from_url(url)
+
+    def hset(self, name, key, value):
+        self._redis.hset(name, str(key), json.dumps(value))
+
+    def hget(self, name, key):
+        raw = self._redis.hget(name, str(key))
+        return None if raw is None else json.loads(raw)
+
+    def hgetall(self, name):
+        return {k.decode(): json.loads(v) for k, v in self._redis.hgetall(name).items()}
+
+    def hdel(self, name, key):
+        self._redis.hdel(name, str(key))
+
+    def hincrby(self, name, key, amount=1):
+        return self._redis.hincrby(name, str(key), amount)
+
+
+def open_store(url):
+    """Crea lo store a partire da un URL: memory://, sqlite:///percorso, redis://..."""
+    if url in ('memory', 'memory://'):
+        return MemoryStore()
+    if url.startswith('sqlite://'):
+        return SqliteStore(url[len('sqlite://'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStore(url)
+    raise ValueError(f"Store non supportato: {url}")
@@ -1,4 +1,5 @@
 
+import sys
 import threading
 import random
 import time
@@ -11,13 +12,15 @@ from mininet.node import RemoteController
 from mininet.util import dumpNodeConnections
 
 class Environment(object):
-    def __init__(self):
+    def __init__(self, controller_ports=(6653,)):
 
         info("[NET-DEF] Starting controller\n")
     
         self.net = Mininet(controller=RemoteController, link=TCLink)
-        c1 = self.net.addController( 'c1', controller=RemoteController, port=6653, ip='127.0.0.1') #Controller
-        c1.start()
+        # più porte = più istanze del controller in modalità cluster (master/slave per switch)
+        for i, port in enumerate(controller_ports, start=1):
+            c = self.net.addController( f'c{i}', controller=RemoteController, port=port, ip='127.0.0.1') #Controller
+            c.start()
 
         info("[NET-DEF] Adding hosts and switches\n")
 
@@ -63,7 +66,9 @@ if __name__ == '__main__':
     setLogLevel('info')
     info('[MAIN] Starting the environment\n')
     
-    env = Environment()
+    # es. sudo python3 topology.py 6653 6654 6655 per un cluster di tre controller
+    ports = [int(p) for p in sys.argv[1:]] or [6653]
+    env = Environment(controller_ports=ports)
 
     info("[MAIN] Running CLI\n")
     CLI(env.net)
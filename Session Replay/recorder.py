@@ -0,0 +1,173 @@
+"""Registrazione dei messaggi OpenFlow scambiati da un controller.
+
+App Ryu da avviare insieme al controller da registrare:
+
+    ryu-manager controller_dynamic.py "../Session Replay/recorder.py"
+
+Salva in RECORD_PATH (nella cartella da cui si avvia ryu-manager) ogni
+messaggio ricevuto dagli switch (packet-in, risposte alle statistiche, echo
+reply, ...), ogni messaggio inviato e ogni cambio di stato della connessione,
+con il suo istante. I messaggi sono salvati così come arrivano sul socket
+(msg.buf), senza ricodifica: replay.py li rianalizza con il parser di Ryu.
+Se il controller usa il collector sFlow (sflow_collector.py) si registrano
+anche i datagrammi ricevuti, gli aggiornamenti periodici delle stime e le
+letture della tabella ifIndex -> (dpid, porta), che al replay non esiste.
+
+Ryu non offre un punto di aggancio per tutti i messaggi di tutte le app, per
+cui il recorder sostituisce all'avvio tre metodi di Datapath (parse dei
+messaggi ricevuti, invio, cambio di stato). La registrazione avviene nel
+thread di ricezione dello switch, prima di qualsiasi handler: l'ordine nel
+file è quello reale.
+"""
+import itertools
+import json
+import struct
+import sys
+import time
+
+from ryu.base import app_manager
+from ryu.controller import controller
+from ryu.lib import hub
+from ryu.ofproto import ofproto_parser
+
+RECORD_PATH = 'session.ofrec'
+RECORD_FLUSH_INTERVAL = 1  # secondi tra due scritture su disco
+
+MAGIC = b'OFREC\x00\x00\x01'
+HEADER = struct.Struct('<8sd')       # magic, istante di inizio
+RECORD = struct.Struct('<dBHI')      # istante, tipo, connessione, lunghezza del contenuto
+KIND_IN, KIND_OUT, KIND_STATE = 0, 1, 2
+KIND_SFLOW, KIND_SFLOW_TICK, KIND_IFMAP = 3, 4, 5
+SFLOW_CONN = 0                       # connessione dei record sFlow (non legati a uno switch)
+TICK = struct.Struct('<d')           # istante passato a SFlowCollector.tick
+
+
+class SessionWriter(object):
+    """Scrittura bufferizzata dei record: una write per intervallo di flush"""
+
+    def __init__(self, path, clock=time.time):
+        self.clock = clock
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, clock()))
+        self.chunks = []
+        self.count = 0
+
+    def append(self, kind, conn, payload):
+        self.chunks.append(RECORD.pack(self.clock(), kind, conn, len(payload)))
+        self.chunks.append(bytes(payload))
+        self.count += 1
+
+    def flush(self):
+        if self.chunks:
+            self.file.write(b''.join(self.chunks))
+            self.chunks = []
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_session(path):
+    """(inizio, [(istante, tipo, connessione, contenuto)]) da un file registrato"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path}: file troppo corto")
+    magic, started = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: non è una sessione registrata")
+    records = []
+    offset = HEADER.size
+    while offset + RECORD.size <= len(data):
+        t, kind, conn, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if offset + length > len(data):
+            break  # record incompleto in coda: registrazione interrotta
+        records.append((t, kind, conn, data[offset:offset + length]))
+        offset += length
+    return started, records
+
+
+class SessionRecorder(app_manager.RyuApp):
+
+    def __init__(self, *args, **kwargs):
+        super(SessionRecorder, self).__init__(*args, **kwargs)
+        self.writer = SessionWriter(RECORD_PATH)
+        self._install_hooks()
+        self.flush_thread = hub.spawn(self._flush_loop)
+        self.logger.info(f"[RECORDER] Registrazione in {RECORD_PATH}")
+
+    def _install_hooks(self):
+        writer = self.writer
+        conns = itertools.count(1)
+        parse = ofproto_parser.msg
+        send = controller.Datapath.send
+        set_state = controller.Datapath.set_state
+
+        def conn_of(datapath):
+            # numero progressivo della connessione: il dpid non è ancora noto
+            # durante l'handshake e uno switch può riconnettersi
+            conn = getattr(datapath, '_recorder_conn', None)
+            if conn is None:
+                conn = datapath._recorder_conn = next(conns)
+            return conn
+
+        def recorded_parse(datapath, version, msg_type, msg_len, xid, buf):
+            writer.append(KIND_IN, conn_of(datapath), buf)
+            return parse(datapath, version, msg_type, msg_len, xid, buf)
+
+        def recorded_send(datapath, buf, close_socket=False):
+            writer.append(KIND_OUT, conn_of(datapath), buf)
+            return send(datapath, buf, close_socket)
+
+        def recorded_set_state(datapath, state):
+            if datapath.state != state:
+                writer.append(KIND_STATE, conn_of(datapath), state.encode())
+            set_state(datapath, state)
+
+        ofproto_parser.msg = recorded_parse
+        controller.Datapath.send = recorded_send
+        controller.Datapath.set_state = recorded_set_state
+
+        # il collector sFlow è importato dal controller come modulo della sua cartella
+        sflow = sys.modules.get('sflow_collector')
+        if sflow is not None:
+            self._install_sflow_hooks(sflow)
+
+    def _install_sflow_hooks(self, sflow):
+        writer = self.writer
+        feed = sflow.SFlowCollector.feed
+        tick = sflow.SFlowCollector.tick
+        load = sflow.InterfaceMap.load
+
+        def recorded_feed(collector, data):
+            writer.append(KIND_SFLOW, SFLOW_CONN, data)
+            return feed(collector, data)
+
+        def recorded_tick(collector, now=None):
+            now = collector.clock() if now is None else now
+            writer.append(KIND_SFLOW_TICK, SFLOW_CONN, TICK.pack(now))
+            return tick(collector, now)
+
+        def recorded_load(interfaces):
+            load(interfaces)
+            ports = sorted([i, dpid, port] for i, (dpid, port) in interfaces.ports.items())
+            writer.append(KIND_IFMAP, SFLOW_CONN, json.dumps(ports).encode())
+
+        sflow.SFlowCollector.feed = recorded_feed
+        sflow.SFlowCollector.tick = recorded_tick
+        sflow.InterfaceMap.load = recorded_load
+        self.logger.info("[RECORDER] Registrazione anche dei datagrammi sFlow")
+
+    def _flush_loop(self):
+        while True:
+            hub.sleep(RECORD_FLUSH_INTERVAL)
+            try:
+                self.writer.flush()
+            except OSError as e:
+                self.logger.warning(f"[RECORDER] Scrittura fallita: {e}")
+
+    def close(self):
+        self.writer.close()
+        self.logger.info(f"[RECORDER] {self.writer.count} record salvati in {RECORD_PATH}")
@@ -0,0 +1,430 @@
+"""Riproduzione di una sessione registrata su un controller, senza switch.
+
+Carica il controller (controller_serv.py, controller_dynamic.py o
+ws_monitor.py) come app Ryu, crea un datapath finto per ogni connessione
+registrata e gli fa ricevere i messaggi del file nell'ordine originale. Gli
+handler vengono chiamati direttamente e cronometrati uno per uno; i messaggi
+che il controller invia vengono raccolti invece di andare su un socket.
+
+    python3 replay.py session.ofrec "../Dynamic Slicing/controller_dynamic.py"
+    python3 replay.py session.ofrec <controller> --save-baseline base.json
+    python3 replay.py session.ofrec <controller> --baseline base.json --speed 10
+
+Senza --baseline le FlowMod e PacketOut emesse sono confrontate con quelle
+inviate dal controller durante la registrazione; con --baseline si confrontano
+messaggi e latenze degli handler con una riproduzione precedente. Il processo
+termina con codice 1 se i messaggi differiscono o un handler è più lento
+della baseline oltre la tolleranza.
+
+Durante la riproduzione time.time e time.monotonic restituiscono l'istante
+registrato del messaggio in corso: banda, latenze e limiti di packet-in sono
+calcolati come dal vivo anche a velocità accelerata. I thread periodici del
+controller non vengono avviati: quando la registrazione contiene una
+richiesta partita da un thread (statistiche, echo), si chiama il metodo che
+la invia (TICKS) e le risposte registrate vengono associate alla richiesta
+riemessa, anche se lo xid è diverso. Allo stesso modo i datagrammi sFlow
+registrati vengono passati al collector del controller, con gli aggiornamenti
+periodici delle stime e la tabella delle interfacce letta dal vivo.
+"""
+import argparse
+import collections
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import statistics
+import struct
+import sys
+import tempfile
+import time
+
+from ryu.base import app_manager
+from ryu.controller import ofp_event
+from ryu.controller.handler import register_instance
+from ryu.lib import hub
+from ryu.ofproto import ofproto_parser, ofproto_protocol
+from ryu.ofproto import ofproto_v1_3
+
+from recorder import read_session, KIND_IN, KIND_OUT, KIND_STATE
+from recorder import KIND_SFLOW, KIND_SFLOW_TICK, KIND_IFMAP, TICK
+
+OFP_HEADER_SIZE = 8
+
+# messaggi emessi dal controller che si confrontano con la baseline
+COMPARED_TYPES = {
+    ofproto_v1_3.OFPT_FLOW_MOD: 'FlowMod',
+    ofproto_v1_3.OFPT_PACKET_OUT: 'PacketOut',
+}
+# richieste a cui lo switch risponde con lo stesso xid
+REQUEST_TYPES = {
+    ofproto_v1_3.OFPT_ECHO_REQUEST,
+    ofproto_v1_3.OFPT_MULTIPART_REQUEST,
+    ofproto_v1_3.OFPT_BARRIER_REQUEST,
+    ofproto_v1_3.OFPT_ROLE_REQUEST,
+}
+LATENCY_TOLERANCE = 1.5  # rapporto oltre il quale un handler è considerato più lento
+LATENCY_FLOOR_US = 20    # differenze sotto questa soglia sono rumore di misura
+
+
+# le richieste inviate non hanno un parser in Ryu (solo i messaggi dagli switch):
+# i criteri leggono direttamente i campi del messaggio registrato
+_MULTIPART = struct.Struct('!H')  # tipo della richiesta multipart, dopo l'header
+_COOKIE = struct.Struct('!Q')     # cookie di OFPFlowStatsRequest
+_COOKIE_OFFSET = 32
+
+
+def _multipart_type(buf):
+    if buf[1] != ofproto_v1_3.OFPT_MULTIPART_REQUEST:
+        return None
+    return _MULTIPART.unpack_from(buf, OFP_HEADER_SIZE)[0]
+
+
+def _is_port_stats(buf):
+    return _multipart_type(buf) == ofproto_v1_3.OFPMP_PORT_STATS
+
+
+def _is_echo_ping(buf):
+    return buf[1] == ofproto_v1_3.OFPT_ECHO_REQUEST and bytes(buf[OFP_HEADER_SIZE:]) == b'ping'
+
+
+def _is_flow_rates(module):
+    def match(buf):
+        return (_multipart_type(buf) == ofproto_v1_3.OFPMP_FLOW
+                and _COOKIE.unpack_from(buf, _COOKIE_OFFSET)[0] == module.COOKIE_BEST_EFFORT)
+    return match
+
+
+# nome del modulo -> [(messaggio registrato -> bool, metodo che la invia a un datapath)]
+TICKS = {
+    'controller_dynamic': lambda module: [
+        (_is_port_stats, '_request_port_stats'),
+        (_is_flow_rates(module), '_request_flow_rates'),
+    ],
+    'ws_monitor': lambda module: [
+        (_is_port_stats, '_request_port_stats'),
+        (_is_echo_ping, '_send_echo'),
+    ],
+}
+
+
+def _normalized(buf):
+    """Messaggio con lo xid azzerato: due messaggi uguali a meno dello xid coincidono"""
+    return bytes(buf[:4]) + b'\x00\x00\x00\x00' + bytes(buf[OFP_HEADER_SIZE:])
+
+
+def _digest(buf):
+    return hashlib.blake2b(_normalized(buf), digest_size=8).hexdigest()
+
+
+class VirtualClock(object):
+    """Sostituisce time.time e time.monotonic con l'istante registrato"""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def __enter__(self):
+        self._saved = time.time, time.monotonic
+        time.time = time.monotonic = lambda: self.now
+        return self
+
+    def __exit__(self, *exc):
+        time.time, time.monotonic = self._saved
+
+
+class ReplayDatapath(ofproto_protocol.ProtocolDesc):
+    """Datapath senza socket: i messaggi inviati vengono passati al Replayer"""
+
+    def __init__(self, conn, replayer):
+        super(ReplayDatapath, self).__init__(ofproto_v1_3.OFP_VERSION)
+        self.conn = conn
+        self.replayer = replayer
+        self.id = None
+        self.xid = 0
+        self.state = None
+        self.address = ('replay', conn)
+
+    def set_xid(self, msg):
+        self.xid += 1
+        self.xid &= self.ofproto.MAX_XID
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send_msg(self, msg, close_socket=False):
+        if msg.xid is None:
+            self.set_xid(msg)
+        msg.serialize()
+        return self.send(msg.buf, close_socket)
+
+    def send(self, buf, close_socket=False):
+        self.replayer.emitted(self, buf)
+        return True
+
+
+def _replay_interfaces(sflow, maps):
+    """InterfaceMap che a ogni lettura restituisce la tabella registrata al posto di /sys"""
+
+    class ReplayInterfaceMap(sflow.InterfaceMap):
+        def load(self):
+            self.ports = next(maps, self.ports)
+            self._loaded = self.clock()
+
+    return ReplayInterfaceMap()
+
+
+def load_app(path):
+    """(modulo, classe RyuApp) dal file del controller; la sua cartella va nel path"""
+    path = os.path.abspath(path)
+    sys.path.insert(0, os.path.dirname(path))
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for _, cls in inspect.getmembers(module, inspect.isclass):
+        if issubclass(cls, app_manager.RyuApp) and cls.__module__ == name:
+            return module, cls
+    raise ValueError(f"Nessuna app Ryu in {path}")
+
+
+class Replayer(object):
+
+    def __init__(self, module, app_cls, speed=0, interface_maps=()):
+        self.module = module
+        self.speed = speed
+        self.datapaths = {}
+        self.messages = collections.defaultdict(list)  # connessione -> [(tipo, digest)] emessi
+        self.live = collections.defaultdict(list)      # connessione -> [(tipo, digest)] registrati
+        self.latency = collections.defaultdict(list)   # handler -> [durata in s]
+        self.pending = collections.defaultdict(collections.deque)  # (conn, richiesta) -> xid riemessi
+        self.xids = {}  # (conn, xid registrato) -> xid della richiesta riemessa
+        self.unmatched = 0
+        self.app = self._create_app(app_cls)
+        self.ticks = [(match, getattr(self.app, method))
+                      for match, method in TICKS.get(module.__name__, lambda m: [])(module)]
+        self.sflow = self._collectors(iter(interface_maps))
+
+    @staticmethod
+    def _create_app(app_cls):
+        contexts = {name: cls() for name, cls in app_cls.context_iteritems()}
+        spawn = hub.spawn
+        hub.spawn = lambda *args, **kwargs: None  # niente thread periodici né server
+        try:
+            app = app_cls(**contexts)
+        finally:
+            hub.spawn = spawn
+        register_instance(app)
+        return app
+
+    def _collectors(self, maps):
+        """Collector sFlow del controller, con le letture delle interfacce registrate"""
+        sflow = sys.modules.get('sflow_collector')
+        if sflow is None:
+            return []
+        collectors = [c for c in vars(self.app).values() if isinstance(c, sflow.SFlowCollector)]
+        interfaces = _replay_interfaces(sflow, maps)
+        for collector in collectors:
+            collector.interfaces = interfaces
+        return collectors
+
+    def emitted(self, datapath, buf):
+        _, msg_type, _, xid = ofproto_parser.header(buf)
+        if msg_type in COMPARED_TYPES:
+            self.messages[datapath.conn].append((COMPARED_TYPES[msg_type], _digest(buf)))
+        elif msg_type in REQUEST_TYPES:
+            self.pending[(datapath.conn, _normalized(buf))].append(xid)
+
+    def _datapath(self, conn):
+        dp = self.datapaths.get(conn)
+        if dp is None:
+            dp = self.datapaths[conn] = ReplayDatapath(conn, self)
+        return dp
+
+    def _dispatch(self, ev, state):
+        for handler in self.app.get_handlers(ev, state):
+            start = time.perf_counter()
+            handler(ev)
+            self.latency[handler.__name__].append(time.perf_counter() - start)
+
+    def _receive(self, dp, buf):
+        version, msg_type, msg_len, xid = ofproto_parser.header(buf)
+        if version != dp.ofproto.OFP_VERSION:
+            dp.set_version(version)
+        msg = ofproto_parser.msg(dp, version, msg_type, msg_len, xid, buf)
+        if msg is None:
+            return
+        msg.xid = self.xids.pop((dp.conn, xid), xid)
+        if msg_type == dp.ofproto.OFPT_FEATURES_REPLY:
+            dp.id = msg.datapath_id  # come ofp_handler prima degli handler dell'app
+        self._dispatch(ofp_event.ofp_msg_to_ev(msg), dp.state)
+
+    def _sent_live(self, dp, buf):
+        _, msg_type, _, xid = ofproto_parser.header(buf)
+        if msg_type in COMPARED_TYPES:
+            self.live[dp.conn].append((COMPARED_TYPES[msg_type], _digest(buf)))
+            return
+        if msg_type not in REQUEST_TYPES:
+            return
+        key = (dp.conn, _normalized(buf))
+        if not self.pending[key] and dp.id is not None:
+            # richiesta partita da un thread periodico: la si fa riemettere al controller
+            for match, tick in self.ticks:
+                if match(buf):
+                    tick(dp)
+                    break
+        if self.pending[key]:
+            self.xids[(dp.conn, xid)] = self.pending[key].popleft()
+        else:
+            self.unmatched += 1
+
+    def _dispatch_sflow(self, method, arg):
+        for collector in self.sflow:
+            start = time.perf_counter()
+            getattr(collector, method)(arg)
+            self.latency[f"sflow.{method}"].append(time.perf_counter() - start)
+
+    def _change_state(self, dp, state):
+        dp.state = state
+        ev = ofp_event.EventOFPStateChange(dp)
+        ev.state = state
+        self._dispatch(ev, state)
+
+    def run(self, records, clock):
+        if not records:
+            return 0.0
+        first = records[0][0]
+        started = time.perf_counter()
+        for t, kind, conn, payload in records:
+            if self.speed > 0:
+                delay = (t - first) / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            clock.now = t
+            if kind == KIND_SFLOW:
+                self._dispatch_sflow('feed', payload)
+            elif kind == KIND_SFLOW_TICK:
+                self._dispatch_sflow('tick', TICK.unpack(payload)[0])
+            elif kind == KIND_IN:
+                self._receive(self._datapath(conn), payload)
+            elif kind == KIND_OUT:
+                self._sent_live(self._datapath(conn), payload)
+            elif kind == KIND_STATE:
+                self._change_state(self._datapath(conn), payload.decode())
+        return time.perf_counter() - started
+
+    def latency_stats(self):
+        """{handler: statistiche in µs}"""
+        result = {}
+        for name, samples in sorted(self.latency.items()):
+            us = sorted(s * 1e6 for s in samples)
+            result[name] = {
+                'count': len(us),
+                'mean': statistics.mean(us),
+                'p50': us[len(us) // 2],
+                'p99': us[min(len(us) - 1, int(len(us) * 0.99))],
+                'max': us[-1],
+            }
+        return result
+
+    def result(self, elapsed):
+        return {
+            'controller': self.module.__name__,
+            'replay_s': elapsed,
+            'unmatched_requests': self.unmatched,
+            'messages': {str(conn): [list(m) for m in msgs] for conn, msgs in sorted(self.messages.items())},
+            'latency_us': self.latency_stats(),
+        }
+
+
+def compare_messages(expected, actual):
+    """Righe di differenza tra due {connessione: [(tipo, digest)]}; vuoto se coincidono"""
+    diffs = []
+    for conn in sorted(set(expected) | set(actual), key=int):
+        exp, act = expected.get(conn, []), actual.get(conn, [])
+        for i, (e, a) in enumerate(zip(exp, act)):
+            if list(e) != list(a):
+                diffs.append(f"connessione {conn}: primo messaggio diverso al n. {i} "
+                             f"(atteso {e[0]}, emesso {a[0]})")
+                break
+        else:
+            if len(exp) != len(act):
+                diffs.append(f"connessione {conn}: {len(exp)} messaggi attesi, {len(act)} emessi")
+    return diffs
+
+
+def compare_latency(baseline, current, tolerance):
+    """Righe della tabella delle latenze e handler più lenti della baseline"""
+    rows, slower = [], []
+    for name, stats in current.items():
+        base = baseline.get(name)
+        row = f"{name:<32} {stats['count']:>7} {stats['p50']:>9.1f} {stats['p99']:>9.1f}"
+        if base is not None:
+            ratio = stats['p50'] / base['p50'] if base['p50'] else 0.0
+            regressed = any(stats[k] > base[k] * tolerance and stats[k] - base[k] > LATENCY_FLOOR_US
+                            for k in ('p50', 'p99'))
+            row += f" {base['p50']:>9.1f} {base['p99']:>9.1f} {ratio:>6.2f}x{' !' if regressed else ''}"
+            if regressed:
+                slower.append(name)
+        rows.append(row)
+    return rows, slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Riproduzione di una sessione OpenFlow registrata")
+    parser.add_argument('session', help="file registrato da recorder.py")
+    parser.add_argument('controller', help="file del controller da riprodurre")
+    parser.add_argument('--speed', type=float, default=0,
+                        help="1 = tempi originali, 10 = dieci volte più veloce, 0 = senza attese")
+    parser.add_argument('--baseline', help="JSON di una riproduzione precedente")
+    parser.add_argument('--save-baseline', help="salva messaggi e latenze di questa riproduzione")
+    parser.add_argument('--tolerance', type=float, default=LATENCY_TOLERANCE)
+    args = parser.parse_args()
+
+    _, records = read_session(args.session)
+    controller = os.path.abspath(args.controller)
+    for name in ('baseline', 'save_baseline'):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    os.chdir(tempfile.mkdtemp(prefix='replay-'))  # niente snapshot o registri di altre esecuzioni
+    with VirtualClock() as clock:
+        # il controller va caricato con l'orologio già sostituito: i suoi moduli
+        # catturano time.monotonic come valore predefinito dei parametri
+        clock.now = records[0][0] if records else time.time()
+        module, app_cls = load_app(controller)
+        interface_maps = [{i: (dpid, port) for i, dpid, port in json.loads(payload)}
+                          for _, kind, _, payload in records if kind == KIND_IFMAP]
+        replayer = Replayer(module, app_cls, speed=args.speed, interface_maps=interface_maps)
+        if not replayer.sflow and any(r[1] == KIND_SFLOW for r in records):
+            sys.exit(f"{args.session} contiene datagrammi sFlow ma {module.__name__} "
+                     f"non ha un collector sFlow a cui riprodurli")
+        elapsed = replayer.run(records, clock)
+    result = replayer.result(elapsed)
+
+    print(f"{len(records)} record riprodotti in {elapsed:.3f} s, "
+          f"{sum(map(len, replayer.messages.values()))} FlowMod/PacketOut emesse, "
+          f"{replayer.unmatched} richieste registrate senza corrispondente")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        expected = baseline['messages']
+    else:
+        baseline = {'latency_us': {}}
+        expected = {str(conn): msgs for conn, msgs in replayer.live.items()}
+    diffs = compare_messages(expected, result['messages'])
+    rows, slower = compare_latency(baseline['latency_us'], result['latency_us'], args.tolerance)
+
+    print(f"\n{'handler':<32} {'chiamate':>7} {'p50 µs':>9} {'p99 µs':>9}"
+          + (f" {'base p50':>9} {'base p99':>9}" if args.baseline else ''))
+    print("\n".join(rows))
+    print("\nMessaggi " + ("identici alla baseline" if args.baseline else "identici alla registrazione")
+          if not diffs else "\nMessaggi diversi:\n  " + "\n  ".join(diffs))
+    if slower:
+        print(f"Handler più lenti della baseline (x{args.tolerance}): {', '.join(slower)}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+    sys.exit(1 if diffs or slower else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Costo di una riconfigurazione incrementale rispetto alla riprogrammazione completa.
+
+Genera reti con un numero crescente di slice (ognuno con il proprio percorso
+di switch e HOSTS_PER_SLICE host agli estremi) e sposta un host da uno slice
+a un altro. Confronta il ricalcolo dei soli slice modificati con diff
+limitato alle loro regole (come SliceSwitch.reconfigure) con il ricalcolo e
+il confronto di tutte le regole della rete.
+
+    python3 benchmark_reconfig.py [numero_slice ...]
+"""
+import sys
+import time
+
+from slice_model import SliceModel
+
+HOSTS_PER_SLICE = 8
+
+
+def build(n_slices):
+    """Due switch di bordo condivisi (1, 2) e uno switch core per slice"""
+    hosts, links, slice_switches, slices = {}, {}, {}, {}
+    for s in range(n_slices):
+        core = 3 + s
+        links[(1, core)] = (100 + s, 1)
+        links[(core, 2)] = (2, 100 + s)
+        name = f"slice{s}"
+        slice_switches[name] = (1, core, 2)
+        members = []
+        for i in range(HOSTS_PER_SLICE):
+            host = f"h{s}_{i}"
+            n = s * HOSTS_PER_SLICE + i + 1
+            edge = 1 if i % 2 == 0 else 2
+            hosts[host] = (f"00:00:00:00:{n >> 8:02x}:{n & 0xff:02x}", edge, 1000 + n)
+            members.append(host)
+        slices[name] = members
+    return SliceModel(hosts, links, slice_switches, slices)
+
+
+def diff(desired, installed):
+    add = sum(1 for k in desired if k not in installed)
+    modify = sum(1 for k in desired if k in installed and installed[k] != desired[k])
+    delete = sum(1 for k in installed if k not in desired)
+    return add + modify + delete
+
+
+def merge(flows_by_slice, names):
+    merged = {}
+    for name in names:
+        for dpid, rules in flows_by_slice[name].items():
+            merged.update({(dpid,) + k: v for k, v in rules.items()})
+    return merged
+
+
+def run(n_slices):
+    model = build(n_slices)
+    cache = {name: model.flows(name) for name in model.slice_switches}
+    total_rules = len(merge(cache, cache))
+
+    # incrementale: solo gli slice toccati dallo spostamento
+    start = time.perf_counter()
+    changed = model.move('h0_0', 'slice1')
+    old = merge(cache, changed)
+    for name in changed:
+        cache[name] = model.flows(name)
+    incremental = diff(merge(cache, changed), old)
+    t_incremental = time.perf_counter() - start
+
+    # completo: ricalcolo di tutti gli slice e diff dell'intera rete
+    model.move('h0_0', 'slice0')
+    before = merge({n: model.flows(n) for n in model.slice_switches}, model.slice_switches)
+    start = time.perf_counter()
+    model.move('h0_0', 'slice1')
+    after = merge({n: model.flows(n) for n in model.slice_switches}, model.slice_switches)
+    full = diff(after, before)
+    t_full = time.perf_counter() - start
+    return total_rules, incremental, t_incremental, full, t_full
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [2, 8, 32, 128]
+    print(f"{'slice':>6} {'regole rete':>12} {'flow_mod':>9} {'incr. ms':>9} {'completo ms':>12} {'speedup':>8}")
+    for n in sizes:
+        rules, flow_mods, t_inc, full, t_full = run(n)
+        assert flow_mods == full
+        print(f"{n:>6} {rules:>12} {flow_mods:>9} {t_inc * 1e3:>9.2f} {t_full * 1e3:>12.2f} {t_full / t_inc:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,53 +1,61 @@
 from ryu.base import app_manager
 from ryu.controller import ofp_event
-from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
+from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller.handler import set_ev_cls
-from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
 from ryu.lib.packet import packet, ethernet, arp, ether_types
+from ryu.lib import hub
+from ryu.app.wsgi import WSGIApplication
+from flow_sync import FlowEntry, flow_key, entries_from_stats, diff_flows, send_flow_mods
+from slice_model import SliceModel
+from slice_api import SliceRestController, SLICE_API_INSTANCE
+import time
+
+# le modifiche a uno switch vengono applicate in un unico bundle atomico
+# (estensione ONF per OpenFlow 1.3); se lo switch non lo supporta si usa la
+# sequenza make-before-break: aggiunte, modifiche e infine cancellazioni,
+# separate da barrier su tutti gli switch coinvolti
+USE_BUNDLES = True
+BARRIER_TIMEOUT = 2  # secondi
 
 class SliceSwitch(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+    _CONTEXTS = {'wsgi': WSGIApplication}
 
     def __init__(self, *args, **kwargs):
         super(SliceSwitch, self).__init__(*args, **kwargs)
-        # MAC degli host
-        self.h1 = '00:00:00:00:00:01'
-        self.h2 = '00:00:00:00:00:02'
-        self.h3 = '00:00:00:00:00:03'
-        self.h4 = '00:00:00:00:00:04'
+        # appartenenza degli host agli slice (vedi slice_model.SLICES)
+        self.model = SliceModel()
+        self.slice_flows = {}      # slice -> {dpid: {chiave: FlowEntry}}, ricalcolato solo se cambia
+        self.installed = {}        # dpid -> {chiave: FlowEntry} presenti sullo switch
+        self.flow_stats_body = {}  # dpid -> risposte multipart ancora incomplete
+        self.datapaths = {}
+        self.bundles = {}          # dpid -> False se lo switch ha rifiutato un bundle
+        self.bundle_xids = {}      # (dpid, xid) -> bundle_id dei messaggi di bundle non ancora confermati
+        self.barriers = {}         # (dpid, xid) -> evento di risposta
+        self._bundle_id = 0
+        for slice_name in self.model.slice_switches:
+            self.slice_flows[slice_name] = self._build_slice(slice_name)
+        kwargs['wsgi'].register(SliceRestController, {SLICE_API_INSTANCE: self})
 
-    def add_flow(self, datapath, priority, match, actions, idle_timeout=0, flags=0):
-        parser = datapath.ofproto_parser
-        ofproto = datapath.ofproto
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
-        mod = parser.OFPFlowMod(
-            datapath=datapath,
-            priority=priority,
-            match=match,
-            instructions=inst,
-            idle_timeout=idle_timeout,
-            flags=flags
-        )
-        datapath.send_msg(mod)
-
-    def add_mac_flow(self, datapath, src, dst, out_port, priority=10):
-        parser = datapath.ofproto_parser
-        match = parser.OFPMatch(eth_src=src, eth_dst=dst)
-        actions = [parser.OFPActionOutput(out_port)]
-        self.add_flow(datapath, priority, match, actions)
+    def _build_slice(self, slice_name):
+        parser = ofproto_v1_3_parser
+        flows = {}
+        for dpid, rules in self.model.flows(slice_name).items():
+            flows[dpid] = {}
+            for key, ports in rules.items():
+                table_id, priority, fields = key
+                actions = [parser.OFPActionOutput(p) for p in ports]
+                inst = [parser.OFPInstructionActions(ofproto_v1_3.OFPIT_APPLY_ACTIONS, actions)]
+                flows[dpid][key] = FlowEntry(table_id, priority, parser.OFPMatch(**dict(fields)), inst)
+        return flows
 
-    def add_arp_flow(self, datapath, src_mac, out_port, priority=20):
-        parser = datapath.ofproto_parser
-        match = parser.OFPMatch(
-            eth_src=src_mac,
-            eth_dst='ff:ff:ff:ff:ff:ff',
-            eth_type=0x0806
-        )
-        if isinstance(out_port, int):
-            actions = [parser.OFPActionOutput(out_port)]
-        else:
-            actions = [parser.OFPActionOutput(p) for p in out_port]
-        self.add_flow(datapath, priority, match, actions)
+    def _desired(self, dpid, slices=None):
+        """Regole attese sullo switch per gli slice indicati (tutti se None)"""
+        desired = {}
+        for slice_name in slices if slices is not None else self.slice_flows:
+            desired.update(self.slice_flows[slice_name].get(dpid, {}))
+        return desired
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
@@ -55,47 +63,187 @@ class SliceSwitch(app_manager.RyuApp):
         dpid = datapath.id
         self.logger.info(f"[FEATURES] Configuring switch {dpid}")
 
-        # s1
-        if dpid == 1:
-            # h1->h3 slice
-            self.add_mac_flow(datapath, self.h1, self.h3, out_port=3)
-            self.add_mac_flow(datapath, self.h3, self.h1, out_port=1)
-            self.add_arp_flow(datapath, self.h1, 3)
-            self.add_arp_flow(datapath, self.h3, 1)
-
-            # h2->h4 slice
-            self.add_mac_flow(datapath, self.h2, self.h4, out_port=4)
-            self.add_mac_flow(datapath, self.h4, self.h2, out_port=2)
-            self.add_arp_flow(datapath, self.h2, 4)
-            self.add_arp_flow(datapath, self.h4, 2)
-
-        # s2 (Up slice)
-        elif dpid == 2:
-            self.add_mac_flow(datapath, self.h1, self.h3, out_port=2)  # verso s4
-            self.add_mac_flow(datapath, self.h3, self.h1, out_port=1)  # verso s1
-            self.add_arp_flow(datapath, self.h1, 2)
-            self.add_arp_flow(datapath, self.h3, 1)
-
-        # s3 (Down slice)
-        elif dpid == 3:
-            self.add_mac_flow(datapath, self.h2, self.h4, out_port=2)  # verso s4
-            self.add_mac_flow(datapath, self.h4, self.h2, out_port=1)  # verso s1
-            self.add_arp_flow(datapath, self.h2, 2)
-            self.add_arp_flow(datapath, self.h4, 1)
-
-        # s4
-        elif dpid == 4:
-            # h1->h3 slice
-            self.add_mac_flow(datapath, self.h1, self.h3, out_port=3)  # verso h3
-            self.add_mac_flow(datapath, self.h3, self.h1, out_port=1)  # verso s2
-            self.add_arp_flow(datapath, self.h1, 3)
-            self.add_arp_flow(datapath, self.h3, 1)
-
-            # h2->h4 slice
-            self.add_mac_flow(datapath, self.h2, self.h4, out_port=4)  # verso h4
-            self.add_mac_flow(datapath, self.h4, self.h2, out_port=2)  # verso s3
-            self.add_arp_flow(datapath, self.h2, 4)
-            self.add_arp_flow(datapath, self.h4, 2)
+        self.datapaths[dpid] = datapath
+        self.bundles[dpid] = USE_BUNDLES
+        self._forget_bundle(dpid)
+        self._request_flow_table(datapath)
+
+    def _request_flow_table(self, datapath):
+        # si legge la flow table e si installano solo le differenze (vedi _reconcile)
+        self.flow_stats_body[datapath.id] = []
+        datapath.send_msg(datapath.ofproto_parser.OFPFlowStatsRequest(datapath))
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def flow_stats_reply_handler(self, ev):
+        msg = ev.msg
+        dpid = msg.datapath.id
+        if dpid not in self.flow_stats_body:
+            return
+        self.flow_stats_body[dpid].extend(msg.body)
+        if msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE:
+            return
+        self._reconcile(msg.datapath, self.flow_stats_body.pop(dpid))
+
+    def _reconcile(self, datapath, body):
+        """Allinea l'intera flow table dello switch agli slice correnti"""
+        dpid = datapath.id
+        desired = self._desired(dpid)
+        installed = entries_from_stats(body)
+        add, modify, delete = diff_flows(desired, installed)
+        send_flow_mods(datapath, add, modify, delete)
+        self.installed[dpid] = desired
+        self.logger.info(f"[RECONCILE] dpid={dpid}: installati={len(installed)} "
+                         f"add={len(add)} modify={len(modify)} delete={len(delete)}")
+
+    @set_ev_cls(ofp_event.EventOFPStateChange, DEAD_DISPATCHER)
+    def state_change_handler(self, ev):
+        dpid = ev.datapath.id
+        if dpid is not None:
+            self.datapaths.pop(dpid, None)
+            self.installed.pop(dpid, None)
+            self._forget_bundle(dpid)
+
+    # ---- Riconfigurazione a runtime ----
+    def reconfigure(self, changes):
+        """Applica gli spostamenti {host: slice o None} con il minimo numero di FlowMod.
+
+        Si ricalcolano solo gli slice modificati e il diff riguarda solo le
+        loro regole, quindi il costo dipende dalla modifica e non dalla rete.
+        """
+        start = time.perf_counter()
+        # si valida tutto prima di modificare qualcosa
+        for host, slice_name in changes.items():
+            self.model.validate(host, slice_name)
+        changed = set()
+        for host, slice_name in changes.items():
+            changed |= self.model.move(host, slice_name)
+        return self._rebuild(changed, start)
+
+    def reroute(self, flows):
+        """Sposta i flussi {(src, dst): slice o None} sul percorso di un altro slice.
+
+        L'appartenenza degli host non cambia: si riscrivono solo le regole
+        unicast del flusso, con lo stesso diff di reconfigure.
+        """
+        start = time.perf_counter()
+        for (src, dst), slice_name in flows.items():
+            self.model.validate_flow(src, dst, slice_name)
+        changed = set()
+        for (src, dst), slice_name in flows.items():
+            changed |= self.model.route_flow(src, dst, slice_name)
+        return self._rebuild(changed, start)
+
+    def _rebuild(self, changed, start):
+        """Ricalcola gli slice modificati nel modello e invia solo le differenze"""
+        old = {name: self.slice_flows[name] for name in changed}
+        for name in changed:
+            self.slice_flows[name] = self._build_slice(name)
+
+        ops = {}
+        dpids = {d for name in changed for flows in (old[name], self.slice_flows[name]) for d in flows}
+        for dpid in dpids:
+            desired = self._desired(dpid, changed)
+            keys = set(desired)
+            for name in changed:
+                keys.update(old[name].get(dpid, {}))
+            known = self.installed.get(dpid, {})
+            installed = {k: known[k] for k in keys if k in known}
+            add, modify, delete = diff_flows(desired, installed)
+            if add or modify or delete:
+                ops[dpid] = (add, modify, delete)
+        self._apply(ops)
+
+        flow_mods = sum(len(a) + len(m) + len(d) for a, m, d in ops.values())
+        elapsed = time.perf_counter() - start
+        self.logger.info(f"[RECONFIG] slice={sorted(changed)} switch={len(ops)} "
+                         f"flow_mod={flow_mods} in {elapsed * 1000:.1f} ms")
+        return {'slices': sorted(changed), 'switches': len(ops),
+                'flow_mods': flow_mods, 'elapsed_ms': elapsed * 1000}
+
+    def _apply(self, ops):
+        """Invia le FlowMod e aggiorna lo stato noto degli switch"""
+        sequential = {}
+        for dpid, (add, modify, delete) in ops.items():
+            datapath = self.datapaths.get(dpid)
+            if datapath is None:
+                continue  # verrà allineato da _reconcile alla connessione
+            if self.bundles.get(dpid):
+                self._send_bundle(datapath, add, modify, delete)
+            else:
+                sequential[dpid] = (datapath, {'add': add, 'modify': modify, 'delete': delete})
+            installed = self.installed.setdefault(dpid, {})
+            for e in delete:
+                installed.pop(flow_key(e), None)
+            for e in add + modify:
+                installed[flow_key(e)] = e
+
+        # make-before-break: il nuovo percorso è attivo ovunque prima di togliere il vecchio
+        if not sequential:
+            return
+        for phase in ('add', 'modify', 'delete'):
+            targets = [(dp, entries[phase]) for dp, entries in sequential.values() if entries[phase]]
+            for datapath, entries in targets:
+                send_flow_mods(datapath, **{phase: entries})
+            self._barrier([datapath for datapath, _ in targets])
+
+    def _send_bundle(self, datapath, add, modify, delete):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        flags = ofproto.ONF_BF_ATOMIC | ofproto.ONF_BF_ORDERED
+        self._bundle_id += 1
+        bundle_id = self._bundle_id
+        # ogni messaggio del bundle ha un xid noto: solo gli errori con quegli xid sono un rifiuto
+        bundle = _BundleDatapath(datapath, bundle_id, flags)
+        bundle.send(parser.ONFBundleCtrlMsg(datapath, bundle_id, ofproto.ONF_BCT_OPEN_REQUEST, flags, []))
+        send_flow_mods(bundle, add, modify, delete)
+        bundle.send(parser.ONFBundleCtrlMsg(datapath, bundle_id, ofproto.ONF_BCT_COMMIT_REQUEST, flags, []))
+        for xid in bundle.xids:
+            self.bundle_xids[(datapath.id, xid)] = bundle_id
+
+    def _forget_bundle(self, dpid, bundle_id=None):
+        """Dimentica gli xid dei bundle di uno switch (di tutti se bundle_id è None)"""
+        self.bundle_xids = {k: b for k, b in self.bundle_xids.items()
+                            if k[0] != dpid or (bundle_id is not None and b != bundle_id)}
+
+    @set_ev_cls(ofp_event.EventONFBundleCtrlMsg, MAIN_DISPATCHER)
+    def bundle_ctrl_handler(self, ev):
+        msg = ev.msg
+        if msg.type == msg.datapath.ofproto.ONF_BCT_COMMIT_REPLY:
+            self._forget_bundle(msg.datapath.id, msg.bundle_id)
+
+    def _barrier(self, datapaths):
+        events = []
+        for datapath in datapaths:
+            msg = datapath.ofproto_parser.OFPBarrierRequest(datapath)
+            datapath.set_xid(msg)
+            event = hub.Event()
+            self.barriers[(datapath.id, msg.xid)] = event
+            datapath.send_msg(msg)
+            events.append(((datapath.id, msg.xid), event))
+        for key, event in events:
+            event.wait(timeout=BARRIER_TIMEOUT)
+            self.barriers.pop(key, None)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    def barrier_reply_handler(self, ev):
+        event = self.barriers.get((ev.msg.datapath.id, ev.msg.xid))
+        if event is not None:
+            event.set()
+
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, MAIN_DISPATCHER)
+    def error_msg_handler(self, ev):
+        msg = ev.msg
+        datapath = msg.datapath
+        self.logger.warning(f"[ERROR] dpid={datapath.id} type={msg.type} code={msg.code}")
+        bundle_id = self.bundle_xids.get((datapath.id, msg.xid))
+        if bundle_id is None:
+            return
+        self._forget_bundle(datapath.id, bundle_id)
+        if self.bundles.get(datapath.id):
+            # bundle rifiutato: niente bundle per questo switch, si rilegge la flow table
+            self.logger.warning(f"[BUNDLE] dpid={datapath.id}: bundle {bundle_id} rifiutato, uso make-before-break")
+            self.bundles[datapath.id] = False
+            self._request_flow_table(datapath)
 
 #Evita che il controller gestisca ARP, perchè già configurati staticamente
 
@@ -112,3 +260,25 @@ class SliceSwitch(app_manager.RyuApp):
         if arp_pkt:
             self.logger.info(f"[DROP ARP] {eth.src} -> {eth.dst}")
 
+
+class _BundleDatapath(object):
+    """Datapath che incapsula ogni messaggio in un ONFBundleAddMsg"""
+
+    def __init__(self, datapath, bundle_id, flags):
+        self.datapath = datapath
+        self.bundle_id = bundle_id
+        self.flags = flags
+        self.id = datapath.id
+        self.ofproto = datapath.ofproto
+        self.ofproto_parser = datapath.ofproto_parser
+        self.xids = []
+
+    def send(self, msg):
+        """Invia un messaggio del bundle allo switch ricordandone lo xid"""
+        self.datapath.set_xid(msg)
+        self.xids.append(msg.xid)
+        self.datapath.send_msg(msg)
+
+    def send_msg(self, msg):
+        self.send(self.ofproto_parser.ONFBundleAddMsg(
+            self.datapath, self.bundle_id, self.flags, msg, []))
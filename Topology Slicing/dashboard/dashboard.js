@@ -1,15 +1,28 @@
 let ws = new WebSocket("ws://localhost:8765/");
 let barChart, latencyChart;
 let latencyHistory = {};
+let latencyTimes = {};     // istante (s) di ogni punto di latencyHistory
 let timeLabels = [];
 const MAX_POINTS = 20;
+const HISTORY_POINTS = 300;   // punti richiesti al server per il grafico storico
+let historyChart;
+let historyLoaded = false;
+let queryId = 0;
+let pendingQueries = {};
 
 // filtri
 const filterDPID = document.getElementById("filter-dpid");
 const filterPort = document.getElementById("filter-port");
+const historyRange = document.getElementById("history-range");
 
 ws.onmessage = function(event) {
     let data = JSON.parse(event.data);
+    if (data.type === "history") {
+        let callback = pendingQueries[data.id];
+        delete pendingQueries[data.id];
+        if (callback && !data.error) callback(data);
+        return;
+    }
     if (data.type !== "bandwidth_stats") return;
 
     let labels = [], values = [], tableHTML = `<tr>
@@ -47,17 +60,121 @@ ws.onmessage = function(event) {
         </tr>`;
 
         if (s.latency_ms != null) {
-            if (!latencyHistory[s.dpid]) latencyHistory[s.dpid] = [];
-            if (latencyHistory[s.dpid].length >= MAX_POINTS) latencyHistory[s.dpid].shift();
+            if (!latencyHistory[s.dpid]) {
+                latencyHistory[s.dpid] = [];
+                latencyTimes[s.dpid] = [];
+            }
+            if (latencyHistory[s.dpid].length >= MAX_POINTS) {
+                latencyHistory[s.dpid].shift();
+                latencyTimes[s.dpid].shift();
+            }
             latencyHistory[s.dpid].push(s.latency_ms);
+            latencyTimes[s.dpid].push(Date.now() / 1000);
         }
     });
 
     document.getElementById("port-stats").innerHTML = tableHTML;
     updateBarChart(labels, values);
+    updateFlowTable(data.slices || {}, data.flows || []);
     updateLatencyChart();
+
+    // al primo aggiornamento (switch noti) si recupera lo storico dal server
+    if (!historyLoaded) {
+        historyLoaded = true;
+        loadRecentLatency(dpids);
+        loadHistory();
+    }
 };
 
+// ---- Flussi campionati via sFlow ----
+function updateFlowTable(slices, flows) {
+    let names = Object.keys(slices);
+    if (names.length) {
+        document.getElementById("slice-rates").textContent =
+            names.map(n => `slice ${n}: ${slices[n].toFixed(2)} Mbps`).join(" · ");
+    }
+    let html = `<tr>
+        <th>Slice</th><th>Sorgente</th><th>Destinazione</th><th>Proto</th><th>Porte</th><th>Mbps</th>
+    </tr>`;
+    flows.forEach(f => {
+        let ports = f.sport != null ? `${f.sport} → ${f.dport}` : "-";
+        html += `<tr>
+            <td>${f.slice || "-"}</td><td>${f.src}</td><td>${f.dst}</td><td>${f.proto ?? "-"}</td><td>${ports}</td><td>${f.mbps.toFixed(2)}</td>
+        </tr>`;
+    });
+    document.getElementById("flow-stats").innerHTML = html;
+}
+
+// ---- Storico (interrogazioni al server) ----
+function queryHistory(request, callback) {
+    request.type = "history_query";
+    request.id = ++queryId;
+    pendingQueries[request.id] = callback;
+    ws.send(JSON.stringify(request));
+}
+
+// riempie il grafico della latenza con gli ultimi MAX_POINTS campioni
+function loadRecentLatency(dpids) {
+    let start = Date.now() / 1000 - MAX_POINTS;
+    dpids.forEach(dpid => {
+        queryHistory({series: "latency", dpid: dpid, start: start, points: MAX_POINTS, method: "lttb"}, h => {
+            // i punti locali già presenti nella risposta del server non si ripetono
+            let last = h.t.length ? h.t[h.t.length - 1] : -Infinity;
+            let times = latencyTimes[dpid] || [];
+            let first = times.findIndex(t => t > last);
+            if (first < 0) first = times.length;
+            latencyHistory[dpid] = h.v.concat((latencyHistory[dpid] || []).slice(first)).slice(-MAX_POINTS);
+            latencyTimes[dpid] = h.t.concat(times.slice(first)).slice(-MAX_POINTS);
+            if (timeLabels.length <= latencyTimes[dpid].length) {
+                timeLabels = latencyTimes[dpid].map(t => new Date(t * 1000).toLocaleTimeString());
+            }
+            updateLatencyChart();
+        });
+    });
+}
+
+function loadHistory() {
+    let start = Date.now() / 1000 - parseInt(historyRange.value);
+    if (filterDPID.value !== "all" && filterPort.value !== "all") {
+        let request = {series: "port", dpid: parseInt(filterDPID.value), port_no: parseInt(filterPort.value),
+                       field: "bandwidth_mbps", start: start, points: HISTORY_POINTS, method: "minmax"};
+        queryHistory(request, h => updateHistoryChart(h.t, [
+            {label: "Media (Mbps)", data: h.avg, borderColor: getColor(2), fill: false},
+            {label: "Max", data: h.max, borderColor: 'rgba(52,152,219,0.3)', fill: '+1', pointRadius: 0},
+            {label: "Min", data: h.min, borderColor: 'rgba(52,152,219,0.3)', fill: false, pointRadius: 0}
+        ], 'Mbps'));
+        return;
+    }
+    let dpids = Array.from(filterDPID.options).map(o => o.value).filter(v => v !== "all");
+    let datasets = [], times = [];
+    dpids.forEach(dpid => {
+        queryHistory({series: "latency", dpid: parseInt(dpid), start: start, points: HISTORY_POINTS, method: "lttb"}, h => {
+            datasets.push({label: `Switch ${dpid}`, data: h.t.map((t, i) => ({x: t, y: h.v[i]})),
+                           borderColor: getColor(dpid), fill: false, pointRadius: 0});
+            if (h.t.length > times.length) times = h.t;
+            updateHistoryChart(times, datasets, 'ms');
+        });
+    });
+}
+
+function updateHistoryChart(times, datasets, unit) {
+    let labels = times.map(t => new Date(t * 1000).toLocaleTimeString());
+    // le serie di latenza hanno tempi propri: asse x lineare sui secondi
+    let linear = datasets.length && datasets[0].data.length && typeof datasets[0].data[0] === "object";
+    let xScale = linear
+        ? {type: 'linear', ticks: {callback: v => new Date(v * 1000).toLocaleTimeString()}, title: {display: true, text: 'Tempo'}}
+        : {title: {display: true, text: 'Tempo'}};
+    if (historyChart) historyChart.destroy();
+    let ctx = document.getElementById("history-line").getContext("2d");
+    historyChart = new Chart(ctx, {type: 'line', data: {labels: linear ? undefined : labels, datasets: datasets},
+        options: {responsive: true, animation: false,
+                  scales: {y: {beginAtZero: true, title: {display: true, text: unit}}, x: xScale}}});
+}
+
+historyRange.addEventListener("change", loadHistory);
+filterDPID.addEventListener("change", loadHistory);
+filterPort.addEventListener("change", loadHistory);
+
 function updateFilterOptions(select, valuesSet) {
     let existing = Array.from(select.options).map(o => o.value);
     valuesSet.forEach(val => {
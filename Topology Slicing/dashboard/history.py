@@ -0,0 +1,119 @@
+"""Storico limitato delle statistiche con interrogazioni per intervallo.
+
+Ogni serie (porta di uno switch o latenza di uno switch) è un buffer
+circolare numpy di HISTORY_SIZE campioni: la memoria è fissa e l'inserimento
+O(1). Le interrogazioni restituiscono al più `points` punti, ridotti lato
+server con bucket min/max/media (vettorizzati con reduceat) oppure con LTTB
+(Largest-Triangle-Three-Buckets), che conserva la forma della curva.
+"""
+import numpy as np
+
+HISTORY_SIZE = 86400     # un giorno di campioni a 1 secondo
+DEFAULT_POINTS = 300
+MAX_POINTS = 2000
+
+
+class RingBuffer(object):
+    """Campioni (tempo, valori) in ordine di arrivo, al più `capacity`"""
+
+    def __init__(self, columns, capacity=HISTORY_SIZE):
+        self.columns = tuple(columns)
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, len(self.columns)), dtype=np.float32)
+        self.start = 0
+        self.size = 0
+
+    def append(self, t, values):
+        i = (self.start + self.size) % self.capacity
+        self.times[i] = t
+        self.values[i] = values
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def range(self, start=None, end=None):
+        """(tempi, valori) con start <= t <= end, in ordine cronologico"""
+        idx = (self.start + np.arange(self.size)) % self.capacity if self.start else slice(0, self.size)
+        times, values = self.times[idx], self.values[idx]
+        lo = 0 if start is None else np.searchsorted(times, start, 'left')
+        hi = self.size if end is None else np.searchsorted(times, end, 'right')
+        return times[lo:hi], values[lo:hi]
+
+    def __len__(self):
+        return self.size
+
+
+def bucket_stats(times, values, points):
+    """Min, max e media su `points` bucket di uguale durata.
+
+    Ritorna (tempi, min, max, media): il tempo è quello medio dei campioni del
+    bucket; i bucket vuoti sono omessi.
+    """
+    if len(times) <= points:
+        return times, values, values, values
+    edges = np.linspace(times[0], times[-1], points + 1)[:-1]
+    starts = np.unique(np.searchsorted(times, edges, 'left'))
+    counts = np.diff(np.append(starts, len(times)))
+    t = np.add.reduceat(times, starts) / counts
+    return (t, np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts),
+            np.add.reduceat(values.astype(np.float64), starts) / counts)
+
+
+def lttb(times, values, points):
+    """Largest-Triangle-Three-Buckets: `points` campioni originali che conservano la forma"""
+    n = len(times)
+    if n <= points or points < 3:
+        return times, values
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    selected = np.empty(points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # vertice successivo: media del bucket seguente (o l'ultimo punto)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        if nlo >= nhi:
+            nlo, nhi = n - 1, n
+        cx, cy = times[nlo:nhi].mean(), values[nlo:nhi].mean()
+        ax, ay = times[a], values[a]
+        tx, ty = times[lo:hi], values[lo:hi]
+        area = np.abs((ax - cx) * (ty - ay) - (ax - tx) * (cy - ay))
+        a = lo + int(np.argmax(area)) if hi > lo else lo
+        selected[i + 1] = a
+    return times[selected], values[selected]
+
+
+class History(object):
+    """Serie storiche per chiave, con interrogazioni ridotte lato server"""
+
+    def __init__(self, capacity=HISTORY_SIZE):
+        self.capacity = capacity
+        self.series = {}
+
+    def append(self, key, columns, t, values):
+        ring = self.series.get(key)
+        if ring is None:
+            ring = self.series[key] = RingBuffer(columns, self.capacity)
+        ring.append(t, values)
+
+    def query(self, key, column, start=None, end=None, points=DEFAULT_POINTS, method='minmax'):
+        """Campioni di `column` nell'intervallo, ridotti a `points` punti.
+
+        `column` può essere una colonna della serie o "+"-separata (somma,
+        es. "rx_mbps+tx_mbps"). Con method="minmax" ritorna t/min/max/avg,
+        con method="lttb" t/v. KeyError se la serie o la colonna non esiste.
+        """
+        ring = self.series[key]
+        points = max(3, min(int(points), MAX_POINTS))
+        times, values = ring.range(start, end)
+        cols = [ring.columns.index(c) for c in column.split('+')]
+        v = values[:, cols].sum(axis=1)
+        if method == 'lttb':
+            t, v = lttb(times, v, points)
+            return {'t': t.tolist(), 'v': v.tolist()}
+        if method != 'minmax':
+            raise ValueError(f"Metodo sconosciuto: {method}")
+        t, vmin, vmax, avg = bucket_stats(times, v, points)
+        return {'t': t.tolist(), 'min': vmin.tolist(), 'max': vmax.tolist(), 'avg': avg.tolist()}
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Registro su disco del traffico per porta e per slice e delle latenze.
+
+I campioni sono record binari a dimensione fissa (RECORD, numpy structured)
+accodati a segmenti `traffic-<inizio>.log`. Si passa a un nuovo segmento
+quando quello corrente supera SEGMENT_BYTES o SEGMENT_SECONDS, e si tengono
+al più MAX_SEGMENTS segmenti. Il monitor accumula i record in un buffer
+preallocato e li scrive con una sola write per ciclo (flush), quindi il costo
+per campione è un'assegnazione in un array.
+
+Il lettore mappa in memoria un segmento alla volta (np.memmap) e aggrega con
+operazioni vettoriali: la memoria usata dipende dal segmento, non dallo
+storico. Eseguito come script stampa il traffico per slice e per ora:
+
+    python3 traffic_log.py [cartella] [--hours 24]
+"""
+import argparse
+import os
+import re
+import struct
+import time
+
+import numpy as np
+
+LOG_DIR = 'traffic_log'
+SEGMENT_BYTES = 16 * 1024 * 1024
+SEGMENT_SECONDS = 3600
+MAX_SEGMENTS = 64
+BUFFER_RECORDS = 4096
+
+KIND_PORT, KIND_LATENCY, KIND_SLICE = 0, 1, 2
+NO_SLICE = 255
+
+# rx/tx: byte nell'intervallo (porta: contatori della porta, slice: traffico
+# entrante/uscente dalle porte dei suoi host); value: durata dell'intervallo
+# in secondi, o la latenza in ms per i record KIND_LATENCY
+RECORD = np.dtype([
+    ('t', '<f8'), ('kind', 'u1'), ('slice', 'u1'), ('dpid', '<u2'), ('port', '<u4'),
+    ('rx', '<u8'), ('tx', '<u8'), ('value', '<f4'),
+])
+MAGIC = b'SDNTLOG\x01'
+HEADER = struct.Struct('<8sII')  # magic, dimensione del record, riservato
+_SEGMENT = re.compile(r'^traffic-(\d+(?:\.\d+)?)\.log$')
+
+
+def _segment_name(start):
+    return f"traffic-{start:.3f}.log"
+
+
+def list_segments(directory):
+    """[(inizio, percorso)] dei segmenti in ordine cronologico"""
+    segments = []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return segments
+    for name in names:
+        m = _SEGMENT.match(name)
+        if m is not None:
+            segments.append((float(m.group(1)), os.path.join(directory, name)))
+    return sorted(segments)
+
+
+class TrafficLog(object):
+    """Scrittore append-only con rotazione dei segmenti"""
+
+    def __init__(self, directory=LOG_DIR, slices=(), segment_bytes=SEGMENT_BYTES,
+                 segment_seconds=SEGMENT_SECONDS, max_segments=MAX_SEGMENTS,
+                 buffer_records=BUFFER_RECORDS):
+        self.directory = directory
+        self.slices = {name: i for i, name in enumerate(slices)}
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.max_segments = max_segments
+        self.buffer = np.zeros(buffer_records, dtype=RECORD)
+        self.count = 0
+        self.dropped = 0
+        self._file = None
+        self._started = 0.0
+        self._size = 0
+
+    def _append(self, t, kind, slice_id, dpid, port, rx, tx, value):
+        if self.count == len(self.buffer):
+            self.dropped += 1  # flush mancato per troppo tempo: si perde il campione, non il monitor
+            return
+        self.buffer[self.count] = (t, kind, slice_id, dpid, port, rx, tx, value)
+        self.count += 1
+
+    def port(self, t, dpid, port_no, rx, tx, interval):
+        self._append(t, KIND_PORT, NO_SLICE, dpid, port_no, rx, tx, interval)
+
+    def latency(self, t, dpid, latency_ms):
+        self._append(t, KIND_LATENCY, NO_SLICE, dpid, 0, 0, 0, latency_ms)
+
+    def slice(self, t, name, rx, tx, interval):
+        self._append(t, KIND_SLICE, self.slices.get(name, NO_SLICE), 0, 0, rx, tx, interval)
+
+    def _open_segment(self, started):
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(os.path.join(self.directory, _segment_name(started)), 'ab')
+        self._file.write(HEADER.pack(MAGIC, RECORD.itemsize, 0))
+        self._started = started
+        self._size = HEADER.size
+        for _, path in list_segments(self.directory)[:-self.max_segments]:
+            os.remove(path)
+
+    def flush(self):
+        """Scrive i record accumulati (una write) ruotando il segmento se necessario"""
+        if not self.count:
+            return
+        # il nome del segmento è l'istante del suo primo campione, non quello della scrittura
+        first = float(self.buffer[0]['t'])
+        if (self._file is None or self._size >= self.segment_bytes
+                or first - self._started >= self.segment_seconds):
+            self._open_segment(first)
+        data = self.buffer[:self.count].tobytes()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        self.count = 0
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class TrafficLogReader(object):
+    """Interrogazioni aggregate sui segmenti, mappati in memoria uno alla volta"""
+
+    def __init__(self, directory=LOG_DIR, slices=()):
+        self.directory = directory
+        self.slices = tuple(slices)
+
+    def segments(self, start=None, end=None):
+        """Percorsi dei segmenti che possono contenere campioni in [start, end]"""
+        segments = list_segments(self.directory)
+        selected = []
+        for i, (seg_start, path) in enumerate(segments):
+            seg_end = segments[i + 1][0] if i + 1 < len(segments) else float('inf')
+            if (end is None or seg_start <= end) and (start is None or seg_end >= start):
+                selected.append(path)
+        return selected
+
+    @staticmethod
+    def records(path):
+        """Record di un segmento come np.memmap (vuoto se il segmento è illeggibile)"""
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return np.zeros(0, dtype=RECORD)
+        magic, itemsize, _ = HEADER.unpack(header)
+        if magic != MAGIC or itemsize != RECORD.itemsize:
+            return np.zeros(0, dtype=RECORD)
+        # un record incompleto in coda (scrittura interrotta) viene ignorato
+        count = (size - HEADER.size) // RECORD.itemsize
+        if count == 0:
+            return np.zeros(0, dtype=RECORD)
+        return np.memmap(path, dtype=RECORD, mode='r', offset=HEADER.size, shape=(count,))
+
+    def _select(self, kind, start, end):
+        """Record del tipo e dell'intervallo richiesti, un segmento alla volta"""
+        for path in self.segments(start, end):
+            records = self.records(path)
+            mask = records['kind'] == kind
+            if start is not None:
+                mask &= records['t'] >= start
+            if end is not None:
+                mask &= records['t'] <= end
+            if mask.any():
+                yield records[mask]
+
+    def _hourly(self, kind, key_fields, start, end, value_fields):
+        """Somma di value_fields per (ora, key_fields...)"""
+        totals = {}
+        for r in self._select(kind, start, end):
+            hours = (r['t'] // 3600).astype(np.int64)
+            columns = [hours] + [r[f].astype(np.int64) for f in key_fields]
+            keys, inverse = np.unique(np.stack(columns, axis=1), axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            sums = [np.bincount(inverse, weights=r[f].astype(np.float64), minlength=len(keys))
+                    for f in value_fields]
+            for i, key in enumerate(map(tuple, keys.tolist())):
+                acc = totals.setdefault(key, [0.0] * len(value_fields))
+                for j, s in enumerate(sums):
+                    acc[j] += s[i]
+        return totals
+
+    def slice_hourly(self, start=None, end=None):
+        """{(ora, slice): {'rx_bytes', 'tx_bytes'}}; ora = inizio dell'ora in secondi epoch"""
+        result = {}
+        for (hour, slice_id), (rx, tx) in sorted(
+                self._hourly(KIND_SLICE, ('slice',), start, end, ('rx', 'tx')).items()):
+            name = self.slices[slice_id] if slice_id < len(self.slices) else None
+            result[(hour * 3600, name)] = {'rx_bytes': int(rx), 'tx_bytes': int(tx)}
+        return result
+
+    def port_hourly(self, start=None, end=None):
+        """{(ora, dpid, porta): {'rx_bytes', 'tx_bytes'}}"""
+        return {(hour * 3600, dpid, port): {'rx_bytes': int(rx), 'tx_bytes': int(tx)}
+                for (hour, dpid, port), (rx, tx) in sorted(
+                    self._hourly(KIND_PORT, ('dpid', 'port'), start, end, ('rx', 'tx')).items())}
+
+    def latency_hourly(self, start=None, end=None):
+        """{(ora, dpid): {'avg_ms', 'max_ms', 'samples'}}"""
+        result = {}
+        for r in self._select(KIND_LATENCY, start, end):
+            keys = (r['t'] // 3600).astype(np.int64) * 65536 + r['dpid']
+            order = np.argsort(keys, kind='stable')
+            keys, values = keys[order], r['value'][order].astype(np.float64)
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            sums = np.add.reduceat(values, starts)
+            maxs = np.maximum.reduceat(values, starts)
+            counts = np.diff(np.r_[starts, len(keys)])
+            for k, s, mx, n in zip(keys[starts].tolist(), sums, maxs, counts):
+                acc = result.setdefault((k // 65536 * 3600, k % 65536), [0.0, 0.0, 0])
+                acc[0] += s
+                acc[1] = max(acc[1], mx)
+                acc[2] += int(n)
+        return {key: {'avg_ms': float(s / n), 'max_ms': float(mx), 'samples': n}
+                for key, (s, mx, n) in sorted(result.items())}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Traffico per slice e per ora dal registro su disco")
+    parser.add_argument('directory', nargs='?', default=LOG_DIR)
+    parser.add_argument('--hours', type=float, default=24, help="ore da considerare")
+    parser.add_argument('--slices', default='up,down', help="nomi degli slice nell'ordine del registro")
+    args = parser.parse_args()
+
+    reader = TrafficLogReader(args.directory, args.slices.split(','))
+    start = time.time() - args.hours * 3600
+    print(f"{'ora':<17} {'slice':<8} {'entrante MB':>12} {'uscente MB':>12}")
+    for (hour, name), totals in reader.slice_hourly(start).items():
+        label = time.strftime('%Y-%m-%d %H:00', time.localtime(hour))
+        print(f"{label:<17} {name or '-':<8} {totals['rx_bytes'] / 1e6:>12.2f} {totals['tx_bytes'] / 1e6:>12.2f}")
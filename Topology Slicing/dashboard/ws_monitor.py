@@ -7,8 +7,31 @@ from ryu.ofproto import ofproto_v1_3
 from ryu.lib import hub
 from ryu.lib.packet import packet, ethernet, arp, ether_types
 from websocket_server import WebsocketServer
+from history import History, DEFAULT_POINTS
+from sflow_collector import SFlowCollector, SFLOW_PORT
+from traffic_log import TrafficLog, LOG_DIR
 
 WS_PORT = 8765
+PORT_COLUMNS = ('rx_mbps', 'tx_mbps')
+LATENCY_COLUMNS = ('latency_ms',)
+
+# campionamento sFlow (vedi sflow_collector.py e Environment.enable_sflow): i
+# contatori inviati dagli switch sostituiscono le OFPPortStatsRequest finché
+# arrivano; i campioni di flusso danno il rate per flusso e per slice
+SFLOW_COLLECTOR = True
+SFLOW_STALE = 3        # secondi senza contatori dopo cui lo switch torna a essere interrogato
+SFLOW_TOP_FLOWS = 10
+HOST_PORT_SLICE = {(1, 1): 'up', (1, 2): 'down', (4, 3): 'up', (4, 4): 'down'}
+EDGE_PORTS = set(HOST_PORT_SLICE)
+SLICE_OF_MAC = {
+    '00:00:00:00:00:01': 'up', '00:00:00:00:00:03': 'up',
+    '00:00:00:00:00:02': 'down', '00:00:00:00:00:04': 'down',
+}
+
+# registro su disco (vedi traffic_log.py): porte, latenze e traffico per slice,
+# scritto una volta per ciclo del monitor
+TRAFFIC_LOG = True
+SLICES = ('up', 'down')
 
 class BandwidthLatencyController(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
@@ -20,9 +43,17 @@ class BandwidthLatencyController(app_manager.RyuApp):
         self.prev_port_stats = {}
         self.switch_latency = {}
         self.echo_sent_time = {}
+        self.history = History()  # storico limitato per porta e per latenza
+        self.sflow = SFlowCollector(classify=lambda key: SLICE_OF_MAC.get(key.eth_src),
+                                    edge_ports=EDGE_PORTS, on_counters=self._update_port)
+        self.traffic_log = TrafficLog(LOG_DIR, SLICES) if TRAFFIC_LOG else None
+        self.slice_bytes = {name: [0, 0] for name in SLICES}  # byte entranti/uscenti dall'ultimo ciclo
+        self.slice_logged_at = time.time()
         self.clients = set()
         self.monitor_thread = hub.spawn(self._monitor)
         self.ws_thread = hub.spawn(self._start_ws_server)
+        if SFLOW_COLLECTOR:
+            self.sflow_thread = hub.spawn(self._sflow_loop)
 
         # MAC degli host
         self.h1 = '00:00:00:00:00:01'
@@ -113,21 +144,32 @@ class BandwidthLatencyController(app_manager.RyuApp):
         dp = ev.msg.datapath
         now = time.time()
         for stat in ev.msg.body:
-            port_no = stat.port_no
-            if port_no < 1 or port_no > 65534:
-                continue
-            key = (dp.id, port_no)
-            rx = stat.rx_bytes
-            tx = stat.tx_bytes
-            prev = self.prev_port_stats.get(key)
-            if prev:
-                dt = now - prev["time"]
-                rx_mbps = (rx - prev["rx_bytes"]) * 8 / dt / 1_000_000
-                tx_mbps = (tx - prev["tx_bytes"]) * 8 / dt / 1_000_000
-            else:
-                rx_mbps = tx_mbps = 0
-            self.port_stats[key] = {"rx_mbps": rx_mbps, "tx_mbps": tx_mbps}
-            self.prev_port_stats[key] = {"rx_bytes": rx, "tx_bytes": tx, "time": now}
+            self._update_port(dp.id, stat.port_no, stat.rx_bytes, stat.tx_bytes, now)
+
+    def _update_port(self, dpid, port_no, rx, tx, now):
+        """Contatori di una porta, da OFPPortStatsReply o dal collector sFlow"""
+        if port_no < 1 or port_no > 65534:
+            return
+        key = (dpid, port_no)
+        prev = self.prev_port_stats.get(key)
+        if prev and now > prev["time"]:
+            dt = now - prev["time"]
+            rx_mbps = (rx - prev["rx_bytes"]) * 8 / dt / 1_000_000
+            tx_mbps = (tx - prev["tx_bytes"]) * 8 / dt / 1_000_000
+        else:
+            rx_mbps = tx_mbps = 0
+        self.port_stats[key] = {"rx_mbps": rx_mbps, "tx_mbps": tx_mbps}
+        self.history.append(('port',) + key, PORT_COLUMNS, now, (rx_mbps, tx_mbps))
+        if prev and now > prev["time"] and rx >= prev["rx_bytes"] and tx >= prev["tx_bytes"]:
+            rx_bytes, tx_bytes = rx - prev["rx_bytes"], tx - prev["tx_bytes"]
+            if self.traffic_log is not None:
+                self.traffic_log.port(now, dpid, port_no, rx_bytes, tx_bytes, now - prev["time"])
+            slice_name = HOST_PORT_SLICE.get(key)
+            if slice_name is not None:
+                # rx della porta di un host = traffico che l'host immette nello slice
+                self.slice_bytes[slice_name][0] += rx_bytes
+                self.slice_bytes[slice_name][1] += tx_bytes
+        self.prev_port_stats[key] = {"rx_bytes": rx, "tx_bytes": tx, "time": now}
 
     # ---- Echo reply per latenza ----
     @set_ev_cls(ofp_event.EventOFPEchoReply, MAIN_DISPATCHER)
@@ -138,16 +180,34 @@ class BandwidthLatencyController(app_manager.RyuApp):
         if sent_time:
             latency = (now - sent_time) * 1000  # ms
             self.switch_latency[dpid] = latency
+            self.history.append(('latency', dpid), LATENCY_COLUMNS, now, (latency,))
+            if self.traffic_log is not None:
+                self.traffic_log.latency(now, dpid, latency)
             self.logger.info(f"Latenza Switch {dpid}: {latency:.2f} ms")
 
     # ---- Monitor ----
     def _monitor(self):
         while True:
             for dp in self.datapaths.values():
-                self._request_port_stats(dp)
+                if not self.sflow.fresh(dp.id, SFLOW_STALE):
+                    self._request_port_stats(dp)
                 self._send_echo(dp)
             hub.sleep(1)
             self._send_stats_to_ws()
+            self._write_traffic_log()
+
+    def _write_traffic_log(self):
+        if self.traffic_log is None:
+            return
+        now = time.time()
+        for name, (rx, tx) in self.slice_bytes.items():
+            self.traffic_log.slice(now, name, rx, tx, now - self.slice_logged_at)
+            self.slice_bytes[name] = [0, 0]
+        self.slice_logged_at = now
+        try:
+            self.traffic_log.flush()
+        except OSError as e:
+            self.logger.warning(f"Registro del traffico non scritto: {e}")
 
     def _request_port_stats(self, dp):
         dp.send_msg(dp.ofproto_parser.OFPPortStatsRequest(dp, 0, dp.ofproto.OFPP_ANY))
@@ -157,12 +217,21 @@ class BandwidthLatencyController(app_manager.RyuApp):
         req = dp.ofproto_parser.OFPEchoRequest(dp, data=b'ping')
         dp.send_msg(req)
 
+    # ---- sFlow ----
+    def _sflow_loop(self):
+        self.logger.info(f"Avvio collector sFlow udp/{SFLOW_PORT}")
+        try:
+            self.sflow.serve(port=SFLOW_PORT)
+        except OSError as e:
+            self.logger.warning(f"Collector sFlow non avviato, resta il polling: {e}")
+
     # ---- WebSocket ----
     def _start_ws_server(self):
         self.logger.info(f"Avvio WebSocket server ws://0.0.0.0:{WS_PORT}")
         self.server = WebsocketServer(port=WS_PORT, host='0.0.0.0')
         self.server.set_fn_new_client(self.new_client)
         self.server.set_fn_client_left(self.client_left)
+        self.server.set_fn_message_received(self.message_received)
         self.server.run_forever()
 
     def new_client(self, client, server):
@@ -173,6 +242,39 @@ class BandwidthLatencyController(app_manager.RyuApp):
         self.logger.info(f"Client disconnesso: {client['id']}")
         self.clients.discard(client['id'])
 
+    def message_received(self, client, server, message):
+        """Richieste dei client: per ora solo interrogazioni sullo storico"""
+        try:
+            request = json.loads(message)
+        except ValueError:
+            return
+        if request.get("type") == "history_query":
+            server.send_message(client, json.dumps(self._history_query(request)))
+
+    def _history_query(self, request):
+        """Serie storica richiesta, ridotta lato server.
+
+        {"type": "history_query", "id": 1, "series": "port", "dpid": 1, "port_no": 3,
+         "field": "bandwidth_mbps", "start": ..., "end": ..., "points": 300, "method": "minmax"}
+        {"type": "history_query", "id": 2, "series": "latency", "dpid": 1}
+        """
+        reply = {"type": "history", "id": request.get("id"), "series": request.get("series"),
+                 "dpid": request.get("dpid"), "port_no": request.get("port_no")}
+        if request.get("series") == "latency":
+            key, field = ('latency', request.get("dpid")), "latency_ms"
+        else:
+            key = ('port', request.get("dpid"), request.get("port_no"))
+            field = request.get("field", "bandwidth_mbps")
+            if field == "bandwidth_mbps":
+                field = "rx_mbps+tx_mbps"
+        try:
+            reply.update(self.history.query(key, field, request.get("start"), request.get("end"),
+                                            request.get("points", DEFAULT_POINTS),
+                                            request.get("method", "minmax")))
+        except (KeyError, ValueError, TypeError) as e:
+            reply["error"] = f"Serie non disponibile: {e}"
+        return reply
+
     def _send_stats_to_ws(self):
         if not self.clients:
             return
@@ -182,7 +284,13 @@ class BandwidthLatencyController(app_manager.RyuApp):
              "bandwidth_mbps": stats["rx_mbps"] + stats["tx_mbps"],
              "latency_ms": self.switch_latency.get(dpid, None)}   # aggiunto
             for (dpid, p), stats in self.port_stats.items()]
-        msg = json.dumps({"type": "bandwidth_stats", "stats": msg_data})
+        flows = [{"src": key.ip_src or key.eth_src, "dst": key.ip_dst or key.eth_dst,
+                  "proto": key.ip_proto, "sport": key.src_port, "dport": key.dst_port,
+                  "slice": SLICE_OF_MAC.get(key.eth_src), "mbps": bps / 1_000_000}
+                 for key, bps in self.sflow.flow_rates(SFLOW_TOP_FLOWS)]
+        slices = {name: bps / 1_000_000 for name, bps in self.sflow.slice_rates().items()}
+        msg = json.dumps({"type": "bandwidth_stats", "stats": msg_data,
+                          "slices": slices, "flows": flows})
         for client_id in list(self.clients):
             try:
                 client_obj = next((c for c in self.server.clients if c['id'] == client_id), None)
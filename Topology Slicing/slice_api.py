@@ -0,0 +1,88 @@
+import json
+
+from ryu.app.wsgi import ControllerBase, Response, route
+
+SLICE_API_INSTANCE = 'slice_switch_app'
+
+
+def _json(body, status=200):
+    return Response(content_type='application/json', text=json.dumps(body), status=status)
+
+
+class SliceRestController(ControllerBase):
+    """REST API per modificare a runtime l'appartenenza degli host agli slice.
+
+    GET    /slices                       appartenenza corrente
+    PUT    /slices/<slice>/hosts/<host>  sposta l'host nello slice
+    DELETE /slices/<slice>/hosts/<host>  toglie l'host dallo slice
+    POST   /slices                       {"h1": "down", "h2": null}: più spostamenti insieme
+    GET    /slices/flows                 flussi spostati su un altro slice
+    PUT    /slices/<slice>/flows/<src>/<dst>  sposta il flusso src -> dst sul percorso dello slice
+    DELETE /slices/<slice>/flows/<src>/<dst>  riporta il flusso sul percorso dei due host
+    """
+
+    def __init__(self, req, link, data, **config):
+        super(SliceRestController, self).__init__(req, link, data, **config)
+        self.app = data[SLICE_API_INSTANCE]
+
+    def _members(self):
+        return {name: sorted(members) for name, members in self.app.model.members.items()}
+
+    def _flows(self):
+        return [{'src': src, 'dst': dst, 'slice': name}
+                for (src, dst), name in sorted(self.app.model.routes.items())]
+
+    def _reconfigure(self, changes):
+        try:
+            result = self.app.reconfigure(changes)
+        except ValueError as e:
+            return _json({'error': str(e)}, status=400)
+        result['members'] = self._members()
+        return _json(result)
+
+    def _reroute(self, flows):
+        try:
+            result = self.app.reroute(flows)
+        except ValueError as e:
+            return _json({'error': str(e)}, status=400)
+        result['flows'] = self._flows()
+        return _json(result)
+
+    @route('slices', '/slices', methods=['GET'])
+    def list_slices(self, req, **kwargs):
+        return _json(self._members())
+
+    @route('slices', '/slices', methods=['POST'])
+    def move_hosts(self, req, **kwargs):
+        try:
+            changes = req.json if req.body else {}
+        except ValueError:
+            return _json({'error': "JSON non valido"}, status=400)
+        if not isinstance(changes, dict):
+            return _json({'error': "Atteso un oggetto {host: slice}"}, status=400)
+        return self._reconfigure(changes)
+
+    @route('slices', '/slices/{slice_name}/hosts/{host}', methods=['PUT'])
+    def add_host(self, req, slice_name, host, **kwargs):
+        return self._reconfigure({host: slice_name})
+
+    @route('slices', '/slices/{slice_name}/hosts/{host}', methods=['DELETE'])
+    def remove_host(self, req, slice_name, host, **kwargs):
+        if self.app.model.slice_of(host) != slice_name:
+            return _json({'error': f"{host} non appartiene allo slice {slice_name}"}, status=404)
+        return self._reconfigure({host: None})
+
+    @route('slices', '/slices/flows', methods=['GET'])
+    def list_flows(self, req, **kwargs):
+        return _json(self._flows())
+
+    @route('slices', '/slices/{slice_name}/flows/{src}/{dst}', methods=['PUT'])
+    def move_flow(self, req, slice_name, src, dst, **kwargs):
+        return self._reroute({(src, dst): slice_name})
+
+    @route('slices', '/slices/{slice_name}/flows/{src}/{dst}', methods=['DELETE'])
+    def reset_flow(self, req, slice_name, src, dst, **kwargs):
+        if self.app.model.routes.get((src, dst)) != slice_name:
+            return _json({'error': f"Il flusso {src} -> {dst} non è spostato sullo slice {slice_name}"},
+                         status=404)
+        return self._reroute({(src, dst): None})
@@ -0,0 +1,182 @@
+"""Appartenenza degli host agli slice e regole che ne derivano su ogni switch.
+
+Ogni slice è una sequenza di switch (un percorso); due host dello stesso slice
+comunicano lungo quel percorso con una regola eth_src/eth_dst per switch, e le
+richieste ARP di un host sono inoltrate solo verso gli altri host dello slice.
+Il flusso tra due host dello stesso slice può essere spostato sul percorso di
+un altro slice (route_flow): cambiano solo le sue regole, non l'appartenenza.
+
+Le regole sono descritte senza Ryu: chiave come flow_sync.flow_key
+(tabella, priorità, campi del match ordinati) e valore la tupla delle porte
+di uscita, così da poter confrontare direttamente lo stato calcolato con
+quello letto dagli switch.
+"""
+
+# host -> (MAC, switch, porta)
+HOSTS = {
+    'h1': ('00:00:00:00:00:01', 1, 1),
+    'h2': ('00:00:00:00:00:02', 1, 2),
+    'h3': ('00:00:00:00:00:03', 4, 3),
+    'h4': ('00:00:00:00:00:04', 4, 4),
+}
+
+# (switch a, switch b) -> (porta su a, porta su b)
+LINKS = {
+    (1, 2): (3, 1),
+    (2, 4): (2, 1),
+    (1, 3): (4, 1),
+    (3, 4): (2, 2),
+}
+
+# percorso di ogni slice
+SLICE_SWITCHES = {
+    'up': (1, 2, 4),     # s1 - s2 - s4
+    'down': (1, 3, 4),   # s1 - s3 - s4
+}
+
+# appartenenza iniziale
+SLICES = {
+    'up': ('h1', 'h3'),
+    'down': ('h2', 'h4'),
+}
+
+PRIORITY_MAC = 10
+PRIORITY_ARP = 20
+BROADCAST = 'ff:ff:ff:ff:ff:ff'
+
+
+def _key(priority, fields):
+    return (0, priority, tuple(sorted(fields.items())))
+
+
+class SliceModel(object):
+    """Appartenenza corrente degli host e calcolo delle regole per slice"""
+
+    def __init__(self, hosts=HOSTS, links=LINKS, slice_switches=SLICE_SWITCHES, slices=SLICES):
+        self.hosts = hosts
+        self.slice_switches = slice_switches
+        self.ports = {}  # (switch, switch vicino) -> porta
+        for (a, b), (port_a, port_b) in links.items():
+            self.ports[(a, b)] = port_a
+            self.ports[(b, a)] = port_b
+        self.members = {name: set() for name in slice_switches}
+        self.routes = {}  # (src, dst) -> slice il cui percorso è usato al posto di quello dei due host
+        for name, members in slices.items():
+            for host in members:
+                self.move(host, name)
+
+    def slice_of(self, host):
+        for name, members in self.members.items():
+            if host in members:
+                return name
+        return None
+
+    def _check_host(self, host):
+        if not isinstance(host, str) or host not in self.hosts:
+            raise ValueError(f"Host sconosciuto: {host}")
+
+    def _check_slice(self, host, slice_name):
+        if not isinstance(slice_name, str) or slice_name not in self.slice_switches:
+            raise ValueError(f"Slice sconosciuto: {slice_name}")
+        if self.hosts[host][1] not in self.slice_switches[slice_name]:
+            raise ValueError(f"{host} non è collegato a uno switch dello slice {slice_name}")
+
+    def validate(self, host, slice_name):
+        """ValueError se l'host non può far parte dello slice"""
+        self._check_host(host)
+        if slice_name is not None:
+            self._check_slice(host, slice_name)
+
+    def validate_flow(self, src, dst, slice_name):
+        """ValueError se il flusso src -> dst non può passare per lo slice"""
+        self._check_host(src)
+        self._check_host(dst)
+        if src == dst:
+            raise ValueError("Sorgente e destinazione coincidono")
+        current = self.slice_of(src)
+        if current is None or self.slice_of(dst) != current:
+            raise ValueError(f"{src} e {dst} non sono nello stesso slice")
+        if slice_name is not None:
+            self._check_slice(src, slice_name)
+            self._check_slice(dst, slice_name)
+
+    def route_of(self, src, dst):
+        """Slice il cui percorso è usato dal flusso src -> dst"""
+        return self.routes.get((src, dst), self.slice_of(src))
+
+    def move(self, host, slice_name):
+        """Sposta un host nello slice (None = nessuno); ritorna gli slice modificati"""
+        self.validate(host, slice_name)
+        current = self.slice_of(host)
+        if current == slice_name:
+            return set()
+        if current is not None:
+            self.members[current].discard(host)
+        if slice_name is not None:
+            self.members[slice_name].add(host)
+        changed = {s for s in (current, slice_name) if s is not None}
+        # i flussi spostati dell'host non esistono più: l'host ha cambiato slice
+        for pair in [p for p in self.routes if host in p]:
+            changed.add(self.routes.pop(pair))
+        return changed
+
+    def route_flow(self, src, dst, slice_name):
+        """Sposta il flusso src -> dst sul percorso dello slice (None = quello dei due host).
+
+        Ritorna gli slice le cui regole cambiano.
+        """
+        self.validate_flow(src, dst, slice_name)
+        default = self.slice_of(src)
+        current = self.route_of(src, dst)
+        target = default if slice_name is None else slice_name
+        if target == current:
+            return set()
+        if target == default:
+            del self.routes[(src, dst)]
+        else:
+            self.routes[(src, dst)] = target
+        return {current, target}
+
+    def _route(self, slice_name, src, dst):
+        """Switch attraversati da src a dst lungo il percorso dello slice"""
+        path = self.slice_switches[slice_name]
+        i, j = path.index(self.hosts[src][1]), path.index(self.hosts[dst][1])
+        return path[i:j + 1] if i <= j else path[j:i + 1][::-1]
+
+    def _next_hop(self, slice_name, dpid, host):
+        """Porta di dpid verso host all'interno dello slice"""
+        _, host_dpid, host_port = self.hosts[host]
+        if host_dpid == dpid:
+            return host_port
+        path = self.slice_switches[slice_name]
+        i, j = path.index(dpid), path.index(host_dpid)
+        return self.ports[(dpid, path[i + 1 if j > i else i - 1])]
+
+    def flows(self, slice_name):
+        """Regole dello slice: {dpid: {chiave: porte di uscita}}"""
+        flows = {}
+        members = sorted(self.members[slice_name])
+        # flussi unicast: quelli tra i membri non spostati altrove, più quelli spostati qui
+        pairs = [(src, dst) for src in members for dst in members
+                 if src != dst and self.route_of(src, dst) == slice_name]
+        pairs += sorted(p for p, name in self.routes.items() if name == slice_name)
+        for src, dst in pairs:
+            for dpid in self._route(slice_name, src, dst):
+                out = self._next_hop(slice_name, dpid, dst)
+                key = _key(PRIORITY_MAC, {'eth_src': self.hosts[src][0], 'eth_dst': self.hosts[dst][0]})
+                flows.setdefault(dpid, {})[key] = (out,)
+        for src in members:
+            # ARP broadcast di src: verso tutti gli altri membri, mai indietro
+            arp_ports = {}
+            for dst in members:
+                if dst == src:
+                    continue
+                for dpid in self._route(slice_name, src, dst):
+                    arp_ports.setdefault(dpid, set()).add(self._next_hop(slice_name, dpid, dst))
+            for dpid, ports in arp_ports.items():
+                ports.discard(self._next_hop(slice_name, dpid, src))
+                if ports:
+                    key = _key(PRIORITY_ARP, {'eth_src': self.hosts[src][0], 'eth_dst': BROADCAST,
+                                              'eth_type': 0x0806})
+                    flows.setdefault(dpid, {})[key] = tuple(sorted(ports))
+        return flows
@@ -1,46 +1,78 @@
 #!/usr/bin/env python3
+import argparse
+import re
+import sys
+import time
 from mininet.log import setLogLevel, info
 from topology import Environment  # importa la classe Environment dalla topologia
 
-def run_tests():
+# Lista test: (host_sorgente, host_destinazione, True=deve funzionare, False=deve FALLIRE)
+TESTS = [
+    ('h1', 'h3', True),
+    ('h3', 'h1', True),
+    ('h2', 'h4', True),
+    ('h4', 'h2', True),
+    ('h1', 'h2', False),
+    ('h1', 'h4', False),
+    ('h2', 'h3', False),
+    ('h3', 'h4', False)
+]
+
+
+def ping(net, src, dst):
+    """True se almeno un echo request riceve risposta"""
+    result = net.get(src).cmd(f'ping -c 2 -W 1 {net.get(dst).IP()}')
+    info(result)
+    received = re.search(r'(\d+) received', result)
+    return received is not None and int(received.group(1)) > 0
+
+
+def run_tests(repeat=1):
+    if repeat < 1:
+        raise ValueError("repeat deve essere almeno 1")
     setLogLevel('info')
 
-    # Avvio ambiente
+    # Avvio ambiente: la rete viene costruita una sola volta per tutti i test
     info("[TEST] Avvio rete dalla topologia\n")
-    env = Environment()
-    net = env.net
-
-    # Prendo gli host
-    h1 = net.get('h1')
-    h2 = net.get('h2')
-    h3 = net.get('h3')
-    h4 = net.get('h4')
-
-    # Lista test: (host_sorgente, host_destinazione, True=deve funzionare, False=deve FALLIRE)
-    tests = [
-        (h1, h3, True),
-        (h3, h1, True),
-        (h2, h4, True),
-        (h4, h2, True),
-        (h1, h2, False),
-        (h1, h4, False),
-        (h2, h3, False),
-        (h3, h4, False)
-    ]
-    
-    info('Pingall della rete:\n')
-    net.pingAll()
-
-    for src, dst, should_work in tests:
-        info(f"\n[TEST] Ping da {src.name} a {dst.name} (deve {'funzionare' if should_work else 'FALLIRE'}):\n")
-        result = src.cmd(f'ping -c 2 {dst.IP()}')
-        info(result)
-
-    # Ferma rete
-    env.stop()
+    failures = []
+    reset_times = []
+    with Environment() as env:
+        net = env.net
+        setup_time = env.timings['total']
+        if not env.wait_connected():
+            raise RuntimeError("Switch non collegati al controller")
+
+        info('Pingall della rete:\n')
+        net.pingAll()
+
+        for run in range(repeat):
+            for src, dst, should_work in TESTS:
+                # ogni test parte da flow table e cache ARP pulite, senza ricostruire la rete
+                if not env.reset():
+                    raise RuntimeError(f"Switch non ricollegati al controller prima del test {src} -> {dst}")
+                reset_times.append(env.timings['total'])
+                info(f"\n[TEST] Ping da {src} a {dst} (deve {'funzionare' if should_work else 'FALLIRE'}):\n")
+                if ping(net, src, dst) != should_work:
+                    failures.append((run, src, dst))
+
+        # Ferma rete
+        started = time.perf_counter()
+    teardown_time = time.perf_counter() - started
     info("[TEST] Rete fermata e pulita\n")
 
+    total = repeat * len(TESTS)
+    info(f"[TEST] {total - len(failures)}/{total} test superati\n")
+    for run, src, dst in failures:
+        info(f"[TEST] FALLITO (giro {run + 1}): {src} -> {dst}\n")
+    info(f"[TEST] Tempi: avvio {setup_time:.2f} s, reset medio "
+         f"{sum(reset_times) / len(reset_times):.2f} s, arresto {teardown_time:.2f} s\n")
+    return not failures
 
-if __name__ == '__main__':
-    run_tests()
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Test di isolamento degli slice sulla topologia")
+    parser.add_argument('--repeat', type=int, default=1, help="giri della matrice di test sulla stessa rete")
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat deve essere almeno 1")
+    sys.exit(0 if run_tests(args.repeat) else 1)
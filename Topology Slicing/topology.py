@@ -1,62 +1,228 @@
 
+import os
 import threading
 import random
+import re
 import time
-from mininet.log import setLogLevel, info
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from mininet.log import setLogLevel, info, warn
 from mininet.topo import Topo
 from mininet.net import Mininet, CLI
 from mininet.node import OVSKernelSwitch, Host, Controller
 from mininet.link import TCLink, Link
 from mininet.node import RemoteController
-from mininet.util import dumpNodeConnections
+from mininet.util import dumpNodeConnections, quietRun
+
+CONTROLLER_PORT = 6653
+CONNECT_TIMEOUT = 10  # secondi di attesa per la (ri)connessione degli switch al controller
+CONNECT_POLL = 0.05   # secondi tra due controlli dello stato degli switch
+
+HOSTS = (
+    ('h1', '00:00:00:00:00:01', '10.0.0.1'),
+    ('h2', '00:00:00:00:00:02', '10.0.0.2'),
+    ('h3', '00:00:00:00:00:03', '10.0.0.3'),
+    ('h4', '00:00:00:00:00:04', '10.0.0.4'),
+)
+SWITCHES = ('s1', 's2', 's3', 's4')
+
+# (nodo1, nodo2, porta1, porta2, parametri del TCLink)
+LINKS = (
+    ('h1', 's1', 1, 1, {'delay': '0.01ms'}),
+    ('h2', 's1', 1, 2, {'delay': '0.01ms'}),
+    ('h3', 's4', 1, 3, {'delay': '0.01ms'}),
+    ('h4', 's4', 1, 4, {'delay': '0.01ms'}),
+    ('s1', 's2', 3, 1, {'bw': 10, 'delay': '0.025ms'}),
+    ('s2', 's4', 2, 1, {'bw': 10, 'delay': '0.025ms'}),
+    ('s1', 's3', 4, 1, {'bw': 1, 'delay': '0.025ms'}),
+    ('s3', 's4', 2, 2, {'bw': 1, 'delay': '0.025ms'}),
+)
+
+
+def _disjoint_rounds(links):
+    """Raggruppa i link in turni in cui nessun nodo compare due volte.
+
+    La creazione di un link esegue comandi nelle shell dei suoi due nodi, che
+    non si possono usare da due thread insieme: i link di uno stesso turno si
+    possono invece creare in parallelo.
+    """
+    rounds = []
+    for link in links:
+        for nodes, members in rounds:
+            if link[0] not in nodes and link[1] not in nodes:
+                break
+        else:
+            nodes, members = set(), []
+            rounds.append((nodes, members))
+        nodes.update(link[:2])
+        members.append(link)
+    return [members for _, members in rounds]
+
+
+def _parallel(function, items):
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=len(items)) as pool:
+        return list(pool.map(function, items))
+
+
+class ParallelMininet(Mininet):
+    """Mininet che configura gli host in parallelo (ognuno ha la sua shell)"""
+
+    def configHosts(self):
+        def config(host):
+            if host.defaultIntf():
+                host.configDefault()
+            else:
+                host.configDefault(ip=None, mac=None)
+        _parallel(config, self.hosts)
+
 
 class Environment(object):
     def __init__(self):
+        self.timings = {}
+        started = time.perf_counter()
+        with self._timed('cleanup'):
+            self.cleanup()
 
         info("[NET-DEF] Starting controller\n")
-    
-        self.net = Mininet(controller=RemoteController, link=TCLink)
-        c1 = self.net.addController( 'c1', controller=RemoteController, port=6653, ip='127.0.0.1') #Controller
-        c1.start()
+
+        self.net = ParallelMininet(controller=RemoteController, link=TCLink)
+        with self._timed('controller'):
+            c1 = self.net.addController( 'c1', controller=RemoteController, port=CONTROLLER_PORT, ip='127.0.0.1') #Controller
+            c1.start()
 
         info("[NET-DEF] Adding hosts and switches\n")
 
-        self.h1 = self.net.addHost('h1', mac= '00:00:00:00:00:01', ip= '10.0.0.1')
-        self.h2 = self.net.addHost('h2', mac= '00:00:00:00:00:02', ip= '10.0.0.2')
-        self.h3 = self.net.addHost('h3', mac= '00:00:00:00:00:03', ip= '10.0.0.3')
-        self.h4 = self.net.addHost('h4', mac= '00:00:00:00:00:04', ip= '10.0.0.4')
-
-        self.s1 = self.net.addSwitch('s1')
-        self.s2 = self.net.addSwitch('s2')
-        self.s3 = self.net.addSwitch('s3')
-        self.s4 = self.net.addSwitch('s4')
-        
-        
-        info("[NET-DEF] Connecting hosts\n")  
-        
-        self.net.addLink(self.h1, self.s1, delay='0.01ms', port1=1, port2=1)
-        self.net.addLink(self.h2, self.s1, delay='0.01ms', port1=1, port2=2)
-        self.net.addLink(self.h3, self.s4, delay='0.01ms', port1=1, port2=3)
-        self.net.addLink(self.h4, self.s4, delay='0.01ms', port1=1, port2=4)
-
-        self.net.addLink(self.s1, self.s2, bw=10, delay='0.025ms', port1=3, port2=1)
-        self.net.addLink(self.s2, self.s4, bw=10, delay='0.025ms', port1=2, port2=1)
-
-        self.net.addLink(self.s1, self.s3, bw=1, delay='0.025ms', port1=4, port2=1)
-        self.net.addLink(self.s3, self.s4, bw=1, delay='0.025ms', port1=2, port2=2)
+        # ogni nodo avvia la sua shell: si creano tutti insieme e si rimette l'ordine di dichiarazione
+        with self._timed('nodes'):
+            _parallel(lambda h: self.net.addHost(h[0], mac=h[1], ip=h[2]), HOSTS)
+            _parallel(self.net.addSwitch, SWITCHES)
+            names = tuple(h[0] for h in HOSTS) + SWITCHES
+            self.net.hosts.sort(key=lambda n: names.index(n.name))
+            self.net.switches.sort(key=lambda n: names.index(n.name))
+        for name in names:
+            setattr(self, name, self.net.get(name))
+
+        info("[NET-DEF] Connecting hosts\n")
+
+        with self._timed('links'):
+            for links in _disjoint_rounds(LINKS):
+                _parallel(lambda l: self.net.addLink(self.net.get(l[0]), self.net.get(l[1]),
+                                                     port1=l[2], port2=l[3], **l[4]), links)
+            order = {(l[0], l[1]): i for i, l in enumerate(LINKS)}
+            self.net.links.sort(key=lambda link: order[(link.intf1.node.name, link.intf2.node.name)])
 
         info("[NET-DEF] Starting network\n")
-        self.net.build()
-        self.net.start()
-        
+        with self._timed('start'):
+            self.net.build()
+            self.net.start()
+        self.timings['total'] = time.perf_counter() - started
+        self._report('Rete pronta')
+
+    @contextmanager
+    def _timed(self, phase):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0.0) + time.perf_counter() - started
+
+    def _report(self, what):
+        phases = ', '.join(f"{k} {v:.2f} s" for k, v in self.timings.items() if k != 'total')
+        info(f"[NET-DEF] {what} in {self.timings['total']:.2f} s ({phases})\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _controller_targets(self):
+        return ','.join(f"{c.protocol}:{c.IP()}:{c.port}" for c in self.net.controllers)
+
+    def wait_connected(self, timeout=CONNECT_TIMEOUT):
+        """Attende che tutti gli switch siano connessi e abbiano ricevuto le loro regole.
+
+        Il controller installa le regole in più messaggi dopo aver letto la flow
+        table: uno switch è pronto quando ha almeno una regola e il loro numero
+        non cambia tra due controlli consecutivi.
+        """
+        deadline = time.monotonic() + timeout
+        remaining = list(self.net.switches)
+        counts = {}
+        while remaining and time.monotonic() < deadline:
+            pending = []
+            for switch in remaining:
+                count = self._flow_count(switch) if switch.connected() else 0
+                if not count or counts.get(switch.name) != count:
+                    pending.append(switch)
+                counts[switch.name] = count
+            remaining = pending
+            if remaining:
+                time.sleep(CONNECT_POLL)
+        for switch in remaining:
+            warn(f"[NET-DEF] {switch.name} non connesso o con regole ancora in installazione dopo {timeout} s\n")
+        return not remaining
+
+    @staticmethod
+    def _flow_count(switch):
+        m = re.search(r'flow_count=(\d+)', switch.cmd(f"ovs-ofctl -O OpenFlow13 dump-aggregate {switch.name}"))
+        return int(m.group(1)) if m is not None else 0
+
+    def reset(self, timeout=CONNECT_TIMEOUT):
+        """Riporta rete e host allo stato iniziale senza ricostruire la rete.
+
+        Gli switch vengono scollegati, svuotati e ricollegati al controller,
+        che reinstalla da zero le sue regole come a un primo avvio; sugli host
+        si svuota la cache ARP e si terminano i processi lasciati in background.
+        """
+        self.timings = {}
+        started = time.perf_counter()
+        switches = [s.name for s in self.net.switches]
+        with self._timed('flows'):
+            quietRun('ovs-vsctl ' + ' -- '.join(f"del-controller {s}" for s in switches))
+            _parallel(lambda s: s.cmd(f"ovs-ofctl -O OpenFlow13 del-flows {s.name}"), self.net.switches)
+        with self._timed('hosts'):
+            _parallel(lambda h: h.cmd('kill -9 $(jobs -p) 2>/dev/null; wait 2>/dev/null; ip neigh flush all'),
+                      self.net.hosts)
+        with self._timed('reconnect'):
+            targets = self._controller_targets()
+            quietRun('ovs-vsctl ' + ' -- '.join(f"set-controller {s} {targets}" for s in switches))
+            for switch in self.net.switches:
+                switch.controllerUUIDs(update=True)  # i record Controller sono stati ricreati
+            connected = self.wait_connected(timeout)
+        self.timings['total'] = time.perf_counter() - started
+        self._report('Rete reimpostata')
+        return connected
+
+    @staticmethod
+    def cleanup():
+        """Rimuove i residui di questa topologia lasciati da un'esecuzione interrotta.
+
+        Al posto di `mn -c`, che ripulisce tutta Mininet e richiede secondi, si
+        toccano solo i nodi e i link di questa topologia: shell degli host e
+        degli switch, bridge OVS e coppie veth nel namespace principale.
+        """
+        names = [h[0] for h in HOSTS] + list(SWITCHES)
+        quietRun(['pkill', '-9', '-f', 'mininet:(%s)$' % '|'.join(names)])
+        quietRun('ovs-vsctl ' + ' -- '.join(f"--if-exists del-br {s}" for s in SWITCHES))
+        # i link tra switch restano nel namespace principale anche senza bridge
+        stale = [f"{n1}-eth{p1}" for n1, n2, p1, p2, _ in LINKS if n1 in SWITCHES]
+        for intf in stale:
+            if os.path.exists(f"/sys/class/net/{intf}"):
+                quietRun(f"ip link del {intf}")
+
     def stop(self):
         """Ferma la rete e pulisce eventuali residui"""
         if hasattr(self, 'net'):
-            from mininet.log import info
-            import os
             info("[MAIN] Arresto rete\n")
+            started = time.perf_counter()
             self.net.stop()
-            os.system("mn -c")
+            self.cleanup()
+            info(f"[MAIN] Rete arrestata in {time.perf_counter() - started:.2f} s\n")
+            del self.net
 
 if __name__ == '__main__':
     
@@ -0,0 +1,214 @@
+"""Confronto tra Topology, Service e Dynamic Slicing sugli stessi carichi.
+
+Per ogni controller: si avvia ryu-manager dalla sua cartella, si costruisce
+l'Environment (topology.py) della stessa cartella, si esegue lo scenario
+scelto e si raccolgono goodput per slice, jitter/perdita del video e CPU del
+controller. Alla fine viene scritto un report Markdown e i dati grezzi in JSON.
+
+    sudo python3 run_suite.py --scenario mixed --duration 60 --repeat 3
+"""
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from mininet.log import setLogLevel, info
+
+from workloads import SCENARIOS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# nome -> (cartella, controller)
+CONTROLLERS = {
+    'topology': ('Topology Slicing', 'controller_topo.py'),
+    'service': ('Service Slicing', 'controller_serv.py'),
+    'dynamic': ('Dynamic Slicing', 'controller_dynamic.py'),
+}
+CONNECT_TIMEOUT = 30  # secondi di attesa perché tutti gli switch si colleghino
+WARMUP_PINGS = (('h1', 'h3'), ('h2', 'h4'))
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+
+METRICS = (
+    ('video_goodput_mbps', "Goodput video (Mbps)"),
+    ('video_loss_pct', "Perdita video (%)"),
+    ('video_jitter_ms', "Jitter video (ms)"),
+    ('best_effort_goodput_mbps', "Goodput best-effort (Mbps)"),
+    ('controller_cpu_pct', "CPU controller (%)"),
+)
+
+
+def cpu_seconds(pid):
+    """Tempo di CPU (utente + sistema) consumato finora dal processo"""
+    with open(f"/proc/{pid}/stat") as f:
+        # il nome del processo può contenere spazi: si riparte dopo la ')'
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK
+
+
+def load_environment(folder):
+    """Classe Environment dal topology.py della cartella (ogni cartella ha il suo)"""
+    path = os.path.join(ROOT, folder, 'topology.py')
+    spec = importlib.util.spec_from_file_location(f"topology_{folder.split()[0].lower()}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Environment
+
+
+def start_controller(folder, script, log_path):
+    cwd = os.path.join(ROOT, folder)
+    # niente stato salvato da una prova precedente: ogni esecuzione parte da zero
+    for path in glob.glob(os.path.join(cwd, '*.snapshot')):
+        os.remove(path)
+    log = open(log_path, 'w')
+    proc = subprocess.Popen(['ryu-manager', script], cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+    log.close()  # il figlio ha la sua copia del descrittore
+    time.sleep(3)
+    if proc.poll() is not None:
+        raise RuntimeError(f"ryu-manager {script} terminato subito, vedi {log_path}")
+    return proc
+
+
+def stop_controller(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def summarize(results, duration, cpu, elapsed):
+    """Metriche aggregate per slice dai risultati dei singoli carichi.
+
+    Il goodput è riferito alla durata dello scenario, la CPU del controller al
+    tempo effettivamente misurato (avvio e chiusura dei carichi compresi).
+    """
+    video = [r for r in results if r['slice'] == 'video']
+    best_effort = [r for r in results if r['slice'] == 'best-effort']
+    losses = [r['loss_pct'] for r in video if r['loss_pct'] is not None]
+    jitters = [r['jitter_ms'] for r in video if r['jitter_ms'] is not None]
+    return {
+        'video_goodput_mbps': sum(r['bytes'] for r in video) * 8 / duration / 1e6,
+        'video_loss_pct': max(losses) if losses else None,
+        'video_jitter_ms': max(jitters) if jitters else None,
+        'best_effort_goodput_mbps': sum(r['bytes'] for r in best_effort) * 8 / duration / 1e6,
+        'controller_cpu_pct': 100.0 * cpu / elapsed,
+    }
+
+
+def run_once(name, scenario_factory, args, run):
+    folder, script = CONTROLLERS[name]
+    scenario = scenario_factory(duration=args.duration, seed=args.seed + run)
+    log_path = os.path.join(args.output_dir, f"{name}_{scenario.name}_{run}.log")
+    info(f"[SUITE] {name}: scenario {scenario.name}, prova {run + 1}/{args.repeat}\n")
+
+    proc = start_controller(folder, script, log_path)
+    env = None
+    try:
+        env = load_environment(folder)()
+        if not env.net.waitConnected(timeout=CONNECT_TIMEOUT):
+            raise RuntimeError(f"Switch non collegati a {script} entro {CONNECT_TIMEOUT} s")
+        for src, dst in WARMUP_PINGS:
+            env.net.get(src).cmd(f"ping -c 2 -W 1 {env.net.get(dst).IP()}")
+
+        cpu_start, t_start = cpu_seconds(proc.pid), time.time()
+        results = scenario.run(env.net)
+        cpu = cpu_seconds(proc.pid) - cpu_start
+        elapsed = time.time() - t_start
+    finally:
+        if env is not None:
+            env.stop()
+        stop_controller(proc)
+
+    summary = summarize(results, scenario.duration, cpu, elapsed)
+    summary['elapsed_s'] = elapsed
+    info(f"[SUITE] {name}: {summary}\n")
+    return {'controller': name, 'scenario': scenario.name, 'run': run,
+            'summary': summary, 'workloads': results}
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return statistics.mean(values) if values else None
+
+
+def _cell(values):
+    mean = _mean(values)
+    if mean is None:
+        return '-'
+    values = [v for v in values if v is not None]
+    if len(values) > 1:
+        return f"{mean:.2f} ± {statistics.stdev(values):.2f}"
+    return f"{mean:.2f}"
+
+
+def write_report(runs, args):
+    names = [n for n in CONTROLLERS if any(r['controller'] == n for r in runs)]
+    lines = [f"# Workload suite: scenario `{args.scenario}`", "",
+             f"Durata {args.duration} s, {args.repeat} prove per controller "
+             f"(media ± deviazione standard).", "",
+             "| Metrica | " + " | ".join(names) + " |",
+             "|---|" + "---|" * len(names)]
+    for key, label in METRICS:
+        cells = [_cell([r['summary'][key] for r in runs if r['controller'] == n]) for n in names]
+        lines.append(f"| {label} | " + " | ".join(cells) + " |")
+
+    lines += ["", "## Dettaglio per carico", "",
+              "| Controller | Carico | Slice | Goodput (Mbps) | Perdita (%) | Jitter (ms) |",
+              "|---|---|---|---|---|---|"]
+    for n in names:
+        per_workload = {}
+        for r in runs:
+            if r['controller'] == n:
+                for w in r['workloads']:
+                    per_workload.setdefault(w['workload'], []).append(w)
+        for workload, results in per_workload.items():
+            lines.append(f"| {n} | {workload} | {results[0]['slice']} | "
+                         f"{_cell([w['goodput_mbps'] for w in results])} | "
+                         f"{_cell([w.get('loss_pct') for w in results])} | "
+                         f"{_cell([w.get('jitter_ms') for w in results])} |")
+
+    report = os.path.join(args.output_dir, f"report_{args.scenario}.md")
+    with open(report, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    with open(os.path.join(args.output_dir, f"results_{args.scenario}.json"), 'w') as f:
+        json.dump(runs, f, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confronto degli approcci di slicing su carichi comuni")
+    parser.add_argument('--controllers', default=','.join(CONTROLLERS),
+                        help="controller da provare, separati da virgola")
+    parser.add_argument('--scenario', default='mixed', choices=sorted(SCENARIOS))
+    parser.add_argument('--duration', type=int, default=60, help="durata dello scenario (s)")
+    parser.add_argument('--repeat', type=int, default=1, help="prove per controller")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output-dir', default='results')
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.controllers.split(',') if n.strip()]
+    unknown = [n for n in names if n not in CONTROLLERS]
+    if unknown:
+        parser.error(f"Controller sconosciuti: {', '.join(unknown)}")
+    if os.geteuid() != 0:
+        sys.exit("Mininet richiede i permessi di root (sudo)")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    setLogLevel('info')
+    runs = []
+    for run in range(args.repeat):
+        # controller alternati a ogni prova, per non favorire chi viene eseguito per primo
+        for name in names if run % 2 == 0 else reversed(names):
+            runs.append(run_once(name, SCENARIOS[args.scenario], args, run))
+    report = write_report(runs, args)
+    info(f"[SUITE] Report scritto in {report}\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""Carichi di traffico riproducibili da eseguire sugli host di un Environment.
+
+Ogni carico avvia un server iperf (v2) sull'host di destinazione e un client
+sull'host sorgente; i risultati sono letti dal report CSV (-y C) del server,
+che misura ciò che è effettivamente arrivato: byte ricevuti e, per l'UDP,
+jitter e perdita.
+
+- CBRVideo: flusso UDP a bitrate costante verso la porta 9999 (slice video)
+- VideoRamp: come CBRVideo, con bitrate diverso per ogni fase
+- BurstyTCP: raffiche TCP di dimensione e distanza casuali (best-effort)
+- OnOffElephant: flussi TCP lunghi alternati a pause (best-effort)
+"""
+import abc
+import random
+import shlex
+import subprocess
+import threading
+import time
+
+UDP_PORT_STREAMING = 9999
+VIDEO_PACKET_SIZE = 1316  # 7 pacchetti MPEG-TS per datagramma
+TIMEOUT_EXPIRED = 124  # uscita di timeout(1) allo scadere della durata: fine normale del carico
+
+
+class Workload(abc.ABC):
+    slice = 'best-effort'
+    udp = False
+
+    def __init__(self, src, dst, port, start=0, duration=30):
+        self.src = src
+        self.dst = dst
+        self.port = port
+        self.start = start
+        self.duration = duration
+        self.server = None
+        self.output = ''
+        self.returncode = None
+        self.error = ''
+
+    @property
+    def name(self):
+        return f"{type(self).__name__}({self.src}->{self.dst}:{self.port})"
+
+    def server_cmd(self):
+        return f"iperf -s {'-u ' if self.udp else ''}-p {self.port} -y C"
+
+    @abc.abstractmethod
+    def client_cmd(self, dst_ip):
+        """Comando iperf da eseguire sull'host sorgente"""
+
+    def start_server(self, net):
+        # stdbuf: il report CSV deve arrivare anche se il server viene terminato
+        cmd = ['stdbuf', '-oL'] + shlex.split(self.server_cmd())
+        self.server = net.get(self.dst).popen(cmd, stdout=subprocess.PIPE,
+                                              stderr=subprocess.DEVNULL, text=True)
+
+    def run_client(self, net):
+        # popen e non cmd: più client sullo stesso host devono poter girare insieme
+        time.sleep(self.start)
+        cmd = ['bash', '-c', self.client_cmd(net.get(self.dst).IP())]
+        client = net.get(self.src).popen(cmd, stdout=subprocess.DEVNULL,
+                                         stderr=subprocess.PIPE, text=True)
+        _, self.error = client.communicate()
+        self.returncode = client.returncode
+
+    @property
+    def failed(self):
+        return self.returncode not in (0, TIMEOUT_EXPIRED)
+
+    def stop_server(self):
+        self.server.terminate()
+        self.output, _ = self.server.communicate(timeout=10)
+
+    def results(self):
+        """Byte ricevuti (e jitter/perdita per l'UDP) dal report del server"""
+        received = lost = total = 0
+        jitter = []
+        for line in self.output.splitlines():
+            fields = line.strip().split(',')
+            if len(fields) < 9:
+                continue
+            received += int(fields[7])
+            if self.udp and len(fields) >= 13:
+                jitter.append(float(fields[9]))
+                lost += int(fields[10])
+                total += int(fields[11])
+        result = {'workload': self.name, 'slice': self.slice, 'bytes': received,
+                  'goodput_mbps': received * 8 / self.duration / 1e6}
+        if self.udp:
+            result['jitter_ms'] = max(jitter) if jitter else None
+            result['loss_pct'] = 100.0 * lost / total if total else None
+        return result
+
+
+class CBRVideo(Workload):
+    """Video a bitrate costante su UDP 9999"""
+    slice = 'video'
+    udp = True
+
+    def __init__(self, src, dst, rate_mbps=4, start=0, duration=30):
+        super(CBRVideo, self).__init__(src, dst, UDP_PORT_STREAMING, start, duration)
+        self.rate_mbps = rate_mbps
+
+    def client_cmd(self, dst_ip):
+        return (f"iperf -c {dst_ip} -u -p {self.port} -b {self.rate_mbps}M "
+                f"-l {VIDEO_PACKET_SIZE} -t {self.duration}")
+
+
+class VideoRamp(CBRVideo):
+    """Video CBR che cambia bitrate a ogni fase: rates = ((secondi, Mbps), ...)"""
+
+    def __init__(self, src, dst, rates, start=0):
+        super(VideoRamp, self).__init__(src, dst, rates[0][1], start, sum(s for s, _ in rates))
+        self.rates = rates
+
+    def client_cmd(self, dst_ip):
+        # un client per fase sullo stesso server: il report ha una riga per fase
+        return ' && '.join(f"iperf -c {dst_ip} -u -p {self.port} -b {rate}M -l {VIDEO_PACKET_SIZE} -t {seconds}"
+                         for seconds, rate in self.rates)
+
+
+class BurstyTCP(Workload):
+    """Raffiche TCP: dimensione esponenziale (media burst_kb), pause esponenziali (media gap)"""
+
+    def __init__(self, src, dst, port=5001, burst_kb=500, gap=0.5, start=0, duration=30, seed=1):
+        super(BurstyTCP, self).__init__(src, dst, port, start, duration)
+        self.burst_kb = burst_kb
+        self.gap = gap
+        self.seed = seed
+
+    def client_cmd(self, dst_ip):
+        # sequenza generata in anticipo: a parità di seed ogni controller riceve le stesse raffiche
+        rnd = random.Random(self.seed)
+        steps, elapsed = [], 0.0
+        while elapsed < self.duration:
+            size = max(1, int(rnd.expovariate(1 / self.burst_kb)))
+            pause = rnd.expovariate(1 / self.gap)
+            steps.append(f"iperf -c {dst_ip} -p {self.port} -n {size}K > /dev/null && sleep {pause:.3f}")
+            elapsed += pause
+        return f"timeout {self.duration} bash -c {shlex.quote(' && '.join(steps))}"
+
+
+class OnOffElephant(Workload):
+    """Flusso TCP lungo per `on` secondi, poi fermo per `off` secondi"""
+
+    def __init__(self, src, dst, port=5002, on=10, off=10, start=0, duration=30):
+        super(OnOffElephant, self).__init__(src, dst, port, start, duration)
+        self.on = on
+        self.off = off
+
+    def client_cmd(self, dst_ip):
+        steps, elapsed = [], 0
+        while elapsed < self.duration:
+            on = min(self.on, self.duration - elapsed)
+            steps.append(f"iperf -c {dst_ip} -p {self.port} -t {on} > /dev/null && sleep {self.off}")
+            elapsed += on + self.off
+        return f"timeout {self.duration} bash -c {shlex.quote(' && '.join(steps))}"
+
+
+class Scenario(object):
+    """Insieme di carichi eseguiti in parallelo con i rispettivi ritardi di avvio"""
+
+    def __init__(self, name, workloads):
+        self.name = name
+        self.workloads = workloads
+
+    @property
+    def duration(self):
+        return max(w.start + w.duration for w in self.workloads)
+
+    def run(self, net):
+        for w in self.workloads:
+            w.start_server(net)
+        time.sleep(1)
+        threads = [threading.Thread(target=w.run_client, args=(net,)) for w in self.workloads]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        time.sleep(2)  # ultimi report dei server
+        for w in self.workloads:
+            w.stop_server()
+        failed = [w for w in self.workloads if w.failed]
+        if failed:
+            raise RuntimeError("Client terminati con errore: " + "; ".join(
+                f"{w.name} uscita {w.returncode} {w.error.strip()[-200:]}".strip() for w in failed))
+        return [w.results() for w in self.workloads]
+
+
+def mixed_scenario(duration=60, video_mbps=4, seed=1):
+    """Video h1->h3 sempre attivo, best-effort h2->h4 a raffiche e con elefanti on/off"""
+    return Scenario('mixed', [
+        CBRVideo('h1', 'h3', rate_mbps=video_mbps, duration=duration),
+        BurstyTCP('h2', 'h4', port=5001, duration=duration, seed=seed),
+        OnOffElephant('h2', 'h4', port=5002, on=10, off=10, start=5, duration=duration - 5),
+    ])
+
+
+def video_ramp_scenario(duration=60, seed=1):
+    """Il video sale di bitrate a metà prova mentre gli elefanti best-effort restano attivi"""
+    half = duration // 2
+    return Scenario('video_ramp', [
+        VideoRamp('h1', 'h3', rates=((half, 2), (duration - half, 7))),
+        OnOffElephant('h2', 'h4', port=5002, on=15, off=5, duration=duration),
+        BurstyTCP('h2', 'h4', port=5001, duration=duration, seed=seed),
+    ])
+
+
+SCENARIOS = {
+    'mixed': mixed_scenario,
+    'video_ramp': video_ramp_scenario,
+}
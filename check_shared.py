@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Verifica che le copie dei moduli condivisi tra le cartelle siano identiche.
+
+Ogni cartella si avvia da sola con ryu-manager, per cui i moduli usati da più
+controller sono copiati in ognuna invece di essere importati da una cartella
+comune. Chi modifica uno di questi moduli deve aggiornare tutte le copie:
+
+    python3 check_shared.py
+"""
+import difflib
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# modulo -> cartelle che ne contengono una copia
+SHARED = {
+    'flow_sync.py': ('Dynamic Slicing', 'Service Slicing', 'Topology Slicing'),
+    'flow_setup.py': ('Dynamic Slicing', 'Service Slicing'),
+    'snapshot.py': ('Dynamic Slicing', 'Service Slicing'),
+    'sflow_collector.py': ('Dynamic Slicing', 'Topology Slicing/dashboard'),
+}
+
+
+def check(name, folders):
+    """Differenze rispetto alla prima copia (lista vuota se sono tutte uguali)"""
+    paths = [os.path.join(folder, name) for folder in folders]
+    sources = {}
+    for path in paths:
+        with open(os.path.join(ROOT, path)) as f:
+            sources[path] = f.readlines()
+    reference = paths[0]
+    diffs = []
+    for path in paths[1:]:
+        if sources[path] != sources[reference]:
+            diffs.append(''.join(difflib.unified_diff(sources[reference], sources[path],
+                                                      reference, path)))
+    return diffs
+
+
+def main():
+    failed = False
+    for name, folders in SHARED.items():
+        diffs = check(name, folders)
+        if diffs:
+            failed = True
+            print(f"[SHARED] {name}: copie diverse")
+            for diff in diffs:
+                print(diff)
+        else:
+            print(f"[SHARED] {name}: {len(folders)} copie identiche")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()